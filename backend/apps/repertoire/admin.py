@@ -1,8 +1,9 @@
 from django.contrib import admin
 
-from .models import Setlist, SetlistItem, Song
+from .models import Setlist, SetlistItem, Song, SyncTombstone
 
 
 admin.site.register(Song)
 admin.site.register(Setlist)
 admin.site.register(SetlistItem)
+admin.site.register(SyncTombstone)
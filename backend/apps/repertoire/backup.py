@@ -0,0 +1,270 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from config.renderers import FastJSONRenderer
+
+from .importers import normalize_song_key
+from .models import AudienceRequest, Setlist, SetlistItem, Song
+
+BACKUP_FORMAT = "setlive-library"
+BACKUP_VERSION = 1
+BACKUP_CHUNK_SIZE = 1000
+
+# Record type -> (model, exported fields). Records only refer to records of the
+# types listed before them, so an import can resolve ids in a single pass.
+_SOURCES = (
+    ("song", Song, ("id", "title", "artist", "chord_url", "duration_ms", "spotify_track_id", "created_at")),
+    ("setlist", Setlist, ("id", "name", "created_at")),
+    ("item", SetlistItem, ("id", "setlist_id", "song_id", "position")),
+    (
+        "audience_request",
+        AudienceRequest,
+        ("id", "setlist_id", "song_id", "requested_song_name", "requester_name", "created_at"),
+    ),
+)
+
+_RECORD_TYPES = {record_type for record_type, _, _ in _SOURCES}
+_CREATED_COUNTERS = {
+    Song: "songs_created",
+    Setlist: "setlists_created",
+    SetlistItem: "items_created",
+    AudienceRequest: "audience_requests_created",
+}
+
+
+class BackupFormatError(Exception):
+    pass
+
+
+def _owned(model, user):
+    if model in (Song, Setlist):
+        return model.objects.filter(user=user)
+    return model.objects.filter(setlist__user=user)
+
+
+def iter_library_export(user):
+    """Yield the user's library as NDJSON, one chunk of lines at a time, from a single snapshot."""
+    renderer = FastJSONRenderer()
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost and connection.vendor == "postgresql":
+            # Every query of the export then sees the same snapshot, even
+            # though the rows are read in several server-side cursor passes.
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+
+        yield renderer.render({"type": "header", "format": BACKUP_FORMAT, "version": BACKUP_VERSION}) + b"\n"
+        counts = {}
+        for record_type, model, fields in _SOURCES:
+            counts[record_type] = 0
+            lines = []
+            rows = _owned(model, user).order_by("id").values(*fields).iterator(chunk_size=BACKUP_CHUNK_SIZE)
+            for row in rows:
+                lines.append(renderer.render({"type": record_type, **row}))
+                if len(lines) >= BACKUP_CHUNK_SIZE:
+                    counts[record_type] += len(lines)
+                    yield b"\n".join(lines) + b"\n"
+                    lines = []
+            if lines:
+                counts[record_type] += len(lines)
+                yield b"\n".join(lines) + b"\n"
+        # The trailer lets an import tell a complete file from a truncated one.
+        yield renderer.render({"type": "end", "counts": counts}) + b"\n"
+
+
+async def aiter_library_export(user):
+    """iter_library_export for ASGI servers, which would otherwise buffer a sync iterator whole.
+
+    Chunks are produced with thread-sensitive sync_to_async, so the export's
+    transaction and connection stay on one thread for the whole response.
+    """
+    chunks = iter_library_export(user)
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close, thread_sensitive=True)()
+
+
+def _text(record, field, max_length, required=False):
+    value = record.get(field) or ""
+    if not isinstance(value, str):
+        raise BackupFormatError(f"Campo {field} invalido.")
+    value = value.strip()[:max_length]
+    if required and not value:
+        raise BackupFormatError(f"Campo {field} e obrigatorio.")
+    return value
+
+
+def _source_id(record, field, required=True):
+    value = record.get(field)
+    if value is None and not required:
+        return None
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise BackupFormatError(f"Campo {field} invalido.")
+    return value
+
+
+class LibraryImport:
+    """Ingests an NDJSON export into a user's library, `BACKUP_CHUNK_SIZE` records per write.
+
+    Records are buffered until a chunk is full or the record type changes, then
+    written with bulk_create. Only the source-id -> new-id maps grow with the
+    file. Songs that already exist in the library (same title and artist) are
+    reused instead of duplicated; setlists are always created.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.ids = {"song": {}, "setlist": {}}
+        self.pending = []
+        self.pending_type = None
+        self.aliases = []
+        self.created_at = []
+        self.counts = {
+            "songs_created": 0,
+            "songs_reused": 0,
+            "setlists_created": 0,
+            "items_created": 0,
+            "audience_requests_created": 0,
+        }
+
+    def run(self, lines):
+        self.library = {
+            normalize_song_key(title, artist): song_id
+            for song_id, title, artist in Song.objects.filter(user=self.user).values_list("id", "title", "artist")
+        }
+        header_seen = end_seen = False
+        with transaction.atomic():
+            for number, line in enumerate(lines, start=1):
+                if not line.strip():
+                    continue
+                if end_seen:
+                    raise BackupFormatError(f"Linha {number}: conteudo apos o fim do backup.")
+                try:
+                    record = json.loads(line)
+                    if not isinstance(record, dict):
+                        raise BackupFormatError("Registro invalido.")
+                    record_type = record.get("type")
+                    if not header_seen:
+                        if record_type != "header" or record.get("format") != BACKUP_FORMAT:
+                            raise BackupFormatError("Arquivo nao e um backup de biblioteca.")
+                        if record.get("version") != BACKUP_VERSION:
+                            raise BackupFormatError("Versao de backup nao suportada.")
+                        header_seen = True
+                    elif record_type == "end":
+                        end_seen = True
+                    else:
+                        self._add(record_type, record)
+                except ValueError:
+                    raise BackupFormatError(f"Linha {number}: JSON invalido.")
+                except BackupFormatError as exc:
+                    raise BackupFormatError(f"Linha {number}: {exc}")
+            if not end_seen:
+                raise BackupFormatError("Backup incompleto.")
+            self._flush()
+        return self.counts
+
+    def _add(self, record_type, record):
+        if record_type not in _RECORD_TYPES:
+            raise BackupFormatError("Tipo de registro invalido.")
+        if record_type != self.pending_type or len(self.pending) >= BACKUP_CHUNK_SIZE:
+            self._flush()
+            self.pending_type = record_type
+        getattr(self, f"_{record_type}")(record)
+
+    def _resolve(self, kind, record, field, required=True):
+        source_id = _source_id(record, field, required)
+        if source_id is None:
+            return None
+        if source_id not in self.ids[kind]:
+            raise BackupFormatError(f"Campo {field} referencia registro inexistente.")
+        return self.ids[kind][source_id]
+
+    def _keep_created_at(self, obj, record):
+        value = record.get("created_at")
+        created_at = parse_datetime(value) if isinstance(value, str) else None
+        if created_at:
+            self.created_at.append((obj, created_at))
+
+    def _song(self, record):
+        source_id = _source_id(record, "id")
+        title = _text(record, "title", 255, required=True)
+        artist = _text(record, "artist", 255)
+        key = normalize_song_key(title, artist)
+        if key in self.library:
+            existing = self.library[key]
+            if isinstance(existing, Song):
+                # Same song twice in this chunk: resolved once the chunk is written.
+                self.aliases.append((source_id, key))
+            else:
+                self.ids["song"][source_id] = existing
+            self.counts["songs_reused"] += 1
+            return
+        duration_ms = record.get("duration_ms")
+        song = Song(
+            user=self.user,
+            title=title,
+            artist=artist,
+            chord_url=_text(record, "chord_url", 200),
+            duration_ms=duration_ms if isinstance(duration_ms, int) and duration_ms >= 0 else None,
+            spotify_track_id=_text(record, "spotify_track_id", 64),
+        )
+        self.library[key] = song
+        self.pending.append((source_id, key, song))
+        self._keep_created_at(song, record)
+
+    def _setlist(self, record):
+        setlist = Setlist(user=self.user, name=_text(record, "name", 255, required=True))
+        self.pending.append((_source_id(record, "id"), None, setlist))
+        self._keep_created_at(setlist, record)
+
+    def _item(self, record):
+        position = record.get("position")
+        if not isinstance(position, int) or position < 1:
+            raise BackupFormatError("Campo position invalido.")
+        item = SetlistItem(
+            setlist_id=self._resolve("setlist", record, "setlist_id"),
+            song_id=self._resolve("song", record, "song_id"),
+            position=position,
+        )
+        self.pending.append((None, None, item))
+
+    def _audience_request(self, record):
+        audience_request = AudienceRequest(
+            setlist_id=self._resolve("setlist", record, "setlist_id"),
+            song_id=self._resolve("song", record, "song_id", required=False),
+            requested_song_name=_text(record, "requested_song_name", 255),
+            requester_name=_text(record, "requester_name", 80),
+        )
+        self.pending.append((None, None, audience_request))
+        self._keep_created_at(audience_request, record)
+
+    def _flush(self):
+        if not self.pending:
+            return
+        model = type(self.pending[0][2])
+        objs = model.objects.bulk_create([obj for _, _, obj in self.pending])
+        self.counts[_CREATED_COUNTERS[model]] += len(objs)
+        if model is Song:
+            for (source_id, key, _), song in zip(self.pending, objs):
+                self.library[key] = song.id
+                self.ids["song"][source_id] = song.id
+            for source_id, key in self.aliases:
+                self.ids["song"][source_id] = self.library[key]
+            self.aliases = []
+        elif model is Setlist:
+            for (source_id, _, _), setlist in zip(self.pending, objs):
+                self.ids["setlist"][source_id] = setlist.id
+
+        # auto_now_add overwrites timestamps on insert, so the originals are restored afterwards.
+        if self.created_at:
+            for obj, created_at in self.created_at:
+                obj.created_at = created_at
+            model.objects.bulk_update([obj for obj, _ in self.created_at], ["created_at"])
+        self.pending = []
+        self.created_at = []
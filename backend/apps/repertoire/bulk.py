@@ -0,0 +1,81 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Song, SyncTombstone
+from .serializers import SongSerializer
+
+
+def apply_song_operations(user, operations):
+    """Applies create/update/delete song operations and returns one result per operation.
+
+    Ownership of every referenced song is checked with a single query, the
+    operations are applied in order to in-memory rows, and the outcome is
+    written with one bulk_create, one bulk_update and one DELETE ... IN.
+    Invalid operations are reported in their result and do not stop the rest.
+    """
+    referenced = {operation["id"] for operation in operations if operation.get("id") is not None}
+    songs = {song.id: song for song in Song.objects.filter(user=user, id__in=referenced)} if referenced else {}
+
+    results = []
+    created, updated, deleted = [], {}, []
+    update_results = {}
+    updated_fields = set()
+    for index, operation in enumerate(operations):
+        op = operation["op"]
+        result = {"index": index, "op": op}
+        results.append(result)
+
+        if op == "create":
+            serializer = SongSerializer(data=operation.get("data") or {})
+            if not serializer.is_valid():
+                result.update(status="error", errors=serializer.errors)
+                continue
+            song = Song(user=user, **serializer.validated_data)
+            created.append((result, song))
+            continue
+
+        song = songs.get(operation.get("id"))
+        if song is None:
+            result.update(status="error", detail="Musica nao encontrada.")
+            continue
+
+        if op == "delete":
+            del songs[song.id]
+            updated.pop(song.id, None)
+            for superseded in update_results.pop(song.id, []):
+                superseded.update(status="skipped", detail="Musica removida por operacao posterior.")
+            deleted.append(song.id)
+            result.update(status="deleted", id=song.id)
+            continue
+
+        serializer = SongSerializer(song, data=operation.get("data") or {}, partial=True)
+        if not serializer.is_valid():
+            result.update(status="error", errors=serializer.errors)
+            continue
+        for field, value in serializer.validated_data.items():
+            setattr(song, field, value)
+        updated_fields.update(serializer.validated_data)
+        updated[song.id] = song
+        update_results.setdefault(song.id, []).append(result)
+
+    with transaction.atomic():
+        if created:
+            Song.objects.bulk_create([song for _, song in created])
+        if updated:
+            now = timezone.now()
+            for song in updated.values():
+                song.updated_at = now
+            Song.objects.bulk_update(list(updated.values()), [*sorted(updated_fields), "updated_at"])
+        if deleted:
+            SyncTombstone.objects.bulk_create(
+                [SyncTombstone(user=user, kind=SyncTombstone.KIND_SONG, object_id=song_id) for song_id in deleted]
+            )
+            Song.objects.filter(user=user, id__in=deleted).delete()
+
+    for result, song in created:
+        result.update(status="created", song=SongSerializer(song).data)
+    for song_id, song in updated.items():
+        data = SongSerializer(song).data
+        for result in update_results[song_id]:
+            result.update(status="updated", song=data)
+    return results
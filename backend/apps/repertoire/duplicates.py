@@ -0,0 +1,136 @@
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import POSITION_SHIFT_OFFSET, AudienceRequest, Setlist, SetlistItem, Song, SyncTombstone
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+# Blank fields of the kept song are filled from the merged ones.
+_MERGED_FIELDS = ("artist", "chord_url", "duration_ms", "spotify_track_id")
+
+
+def _unaccented(value):
+    decomposed = unicodedata.normalize("NFKD", (value or "").casefold())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(" ", stripped).strip()
+
+
+def song_match_key(title, artist):
+    """Looser than importers.normalize_song_key: also ignores accents and punctuation."""
+    return _unaccented(title), _unaccented(artist)
+
+
+def suggested_merge_target(songs):
+    """Prefers the song already linked to Spotify, then the one with chords, then the oldest."""
+    return min(songs, key=lambda song: (not song.spotify_track_id, not song.chord_url, song.id))
+
+
+def find_duplicate_groups(user):
+    """Groups the user's songs sharing a match key or a Spotify track, in one pass over the library."""
+    parent = {}
+
+    def root(song_id):
+        while parent[song_id] != song_id:
+            parent[song_id] = parent[parent[song_id]]
+            song_id = parent[song_id]
+        return song_id
+
+    songs = {}
+    first_by_key = {}
+    for song in Song.objects.filter(user=user).order_by("id"):
+        songs[song.id] = song
+        parent[song.id] = song.id
+        keys = [("text", song_match_key(song.title, song.artist))]
+        if song.spotify_track_id:
+            keys.append(("spotify", song.spotify_track_id))
+        for key in keys:
+            first = first_by_key.setdefault(key, song.id)
+            if first != song.id:
+                parent[root(song.id)] = root(first)
+
+    groups = {}
+    for song_id in songs:
+        groups.setdefault(root(song_id), []).append(songs[song_id])
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def merge_songs(user, target, sources):
+    """Folds `sources` into `target`: setlist items and audience requests are repointed, then the sources are deleted.
+
+    A setlist that held more than one of the merged songs keeps only the
+    first of them and is renumbered, so positions stay contiguous and
+    uniq_setlist_position holds throughout.
+    """
+    source_ids = [song.id for song in sources]
+    merged_ids = [target.id, *source_ids]
+    now = timezone.now()
+
+    for field in _MERGED_FIELDS:
+        if getattr(target, field) in ("", None):
+            value = next((getattr(song, field) for song in sources if getattr(song, field) not in ("", None)), None)
+            if value is not None:
+                setattr(target, field, value)
+
+    with transaction.atomic():
+        # Same lock the item writers take (see _locked_setlist), acquired in id
+        # order so two merges sharing setlists cannot deadlock.
+        list(
+            Setlist.objects.select_for_update()
+            .filter(id__in=SetlistItem.objects.filter(song_id__in=merged_ids).values("setlist_id"))
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        kept, removed = {}, []
+        for item_id, setlist_id, song_id in (
+            SetlistItem.objects.filter(song_id__in=merged_ids)
+            .order_by("setlist_id", "position")
+            .values_list("id", "setlist_id", "song_id")
+        ):
+            if setlist_id in kept:
+                removed.append((item_id, setlist_id))
+            else:
+                kept[setlist_id] = (item_id, song_id)
+
+        repointed = [item_id for item_id, song_id in kept.values() if song_id != target.id]
+        touched = {setlist_id for setlist_id, (_, song_id) in kept.items() if song_id != target.id}
+        touched.update(setlist_id for _, setlist_id in removed)
+        if repointed:
+            SetlistItem.objects.filter(id__in=repointed).update(song_id=target.id, updated_at=now)
+        if removed:
+            SyncTombstone.objects.bulk_create(
+                [SyncTombstone(user=user, kind=SyncTombstone.KIND_ITEM, object_id=item_id) for item_id, _ in removed]
+            )
+            SetlistItem.objects.filter(id__in=[item_id for item_id, _ in removed]).delete()
+            _renumber({setlist_id for _, setlist_id in removed}, now)
+        if touched:
+            Setlist.objects.filter(id__in=touched).update(updated_at=now)
+
+        audience_requests = AudienceRequest.objects.filter(song_id__in=source_ids).update(song_id=target.id)
+
+        SyncTombstone.objects.bulk_create(
+            [SyncTombstone(user=user, kind=SyncTombstone.KIND_SONG, object_id=song_id) for song_id in source_ids]
+        )
+        Song.objects.filter(id__in=source_ids).delete()
+        target.save()
+
+    return {
+        "merged": len(source_ids),
+        "items_repointed": len(repointed),
+        "items_removed": len(removed),
+        "audience_requests_repointed": audience_requests,
+    }
+
+
+def _renumber(setlist_ids, now):
+    items = list(SetlistItem.objects.filter(setlist_id__in=setlist_ids).order_by("setlist_id", "position", "id"))
+    SetlistItem.objects.filter(setlist_id__in=setlist_ids).update(position=F("position") + POSITION_SHIFT_OFFSET)
+    position, current = 0, None
+    for item in items:
+        position = position + 1 if item.setlist_id == current else 1
+        current = item.setlist_id
+        item.position = position
+        item.updated_at = now
+    SetlistItem.objects.bulk_update(items, ["position", "updated_at"])
@@ -0,0 +1,63 @@
+from rest_framework import serializers
+
+from .models import SetlistItem
+from .serializers import AudienceRequestSerializer, SetlistItemSerializer, SetlistSerializer, SongSerializer
+
+# values() already returns these as the exact Python types DRF would emit.
+_PASSTHROUGH_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+
+
+class ValuesSerializer:
+    """Builds the same dicts as a read-only ModelSerializer from `.values_list()` rows.
+
+    The serializer's fields are inspected once: plain columns are copied
+    as-is, others keep the bound `to_representation` of the DRF field (so
+    datetimes format exactly like the ModelSerializer path), and nested
+    serializers become a join prefix. Nested relations must be to-one and
+    include `id`, which is used to tell a null relation apart.
+    """
+
+    def __init__(self, serializer_class, prefix=""):
+        self.plan = []
+        self.columns = []
+        for name, field in serializer_class().fields.items():
+            if isinstance(field, serializers.BaseSerializer):
+                nested = ValuesSerializer(type(field), f"{prefix}{field.source}__")
+                self.plan.append((name, len(self.columns), nested))
+                self.columns.extend(nested.columns)
+            else:
+                mapper = None if isinstance(field, _PASSTHROUGH_FIELDS) else field.to_representation
+                self.plan.append((name, len(self.columns), mapper))
+                self.columns.append(f"{prefix}{field.source}")
+        self.null_column = self.columns.index(f"{prefix}id")
+
+    def to_representation(self, row, offset=0, nested=False):
+        if nested and row[offset + self.null_column] is None:
+            return None
+        data = {}
+        for name, index, mapper in self.plan:
+            if isinstance(mapper, ValuesSerializer):
+                data[name] = mapper.to_representation(row, offset + index, nested=True)
+                continue
+            value = row[offset + index]
+            data[name] = value if value is None or mapper is None else mapper(value)
+        return data
+
+    def many(self, queryset):
+        return [self.to_representation(row) for row in queryset.values_list(*self.columns)]
+
+
+song_values = ValuesSerializer(SongSerializer)
+setlist_values = ValuesSerializer(SetlistSerializer)
+setlist_item_values = ValuesSerializer(SetlistItemSerializer)
+audience_request_values = ValuesSerializer(AudienceRequestSerializer)
+
+
+def setlist_detail_data(setlist_queryset):
+    """SetlistDetailSerializer output for the setlist in `setlist_queryset` (or None), in two queries."""
+    row = setlist_queryset.values_list(*setlist_values.columns).first()
+    if row is None:
+        return None
+    data = setlist_values.to_representation(row)
+    data["items"] = setlist_item_values.many(SetlistItem.objects.filter(setlist_id=data["id"]).order_by("position", "id"))
+    return data
@@ -0,0 +1,64 @@
+import csv
+import io
+import re
+
+HEADER_TITLES = {"title", "titulo", "título", "musica", "música", "song", "nome", "name"}
+PLAIN_TEXT_SEPARATORS = (" - ", " – ", " — ", " | ")
+_LEADING_NUMBER = re.compile(r"^\s*\d{1,4}[.)]\s+")
+
+
+def normalize_song_key(title, artist):
+    return (" ".join((title or "").casefold().split()), " ".join((artist or "").casefold().split()))
+
+
+def _split_plain_line(line):
+    if "\t" in line:
+        cells = line.split("\t")
+        return cells[0], cells[1] if len(cells) > 1 else ""
+
+    line = _LEADING_NUMBER.sub("", line)
+    for separator in PLAIN_TEXT_SEPARATORS:
+        if separator in line:
+            title, artist = line.split(separator, 1)
+            return title, artist
+    return line, ""
+
+
+def _csv_dialect(filename, first_line):
+    if filename.endswith(".tsv") or "\t" in first_line:
+        return "\t"
+    if filename.endswith(".csv"):
+        return ";" if first_line.count(";") > first_line.count(",") else ","
+    return None
+
+
+def iter_song_rows(stream, filename=""):
+    """Yield `(title, artist)` pairs from a CSV/TSV/plain-text stream, one line at a time."""
+    filename = (filename or "").lower()
+    first_line = stream.readline()
+    if not first_line:
+        return
+    delimiter = _csv_dialect(filename, first_line)
+
+    if delimiter:
+        rows = csv.reader(_chain_line(first_line, stream), delimiter=delimiter)
+    else:
+        rows = (_split_plain_line(line.rstrip("\r\n")) for line in _chain_line(first_line, stream))
+
+    for index, row in enumerate(rows):
+        if not row:
+            continue
+        title = (row[0] or "").strip()
+        artist = (row[1] if len(row) > 1 else "").strip()
+        if index == 0 and title.casefold() in HEADER_TITLES:
+            continue
+        yield title[:255], artist[:255]
+
+
+def _chain_line(first_line, stream):
+    yield first_line
+    yield from stream
+
+
+def open_text_upload(uploaded_file):
+    return io.TextIOWrapper(uploaded_file.file, encoding="utf-8-sig", errors="replace", newline="")
@@ -0,0 +1,69 @@
+import gzip
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from apps.repertoire.management.timing import best_time_ms
+from config.renderers import FastJSONRenderer, orjson
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+
+def _setlist_detail_payload(size):
+    timestamp = datetime(2026, 1, 1, tzinfo=timezone.utc).isoformat().replace("+00:00", "Z")
+    return {
+        "id": 1,
+        "name": "Show de sexta",
+        "created_at": timestamp,
+        "updated_at": timestamp,
+        "items": [
+            {
+                "id": index,
+                "position": index,
+                "song": {
+                    "id": index,
+                    "title": f"Musica numero {index} com um titulo realista",
+                    "artist": f"Banda {index % 17}",
+                    "chord_url": f"https://www.cifraclub.com.br/banda-{index % 17}/musica-{index}/",
+                    "duration_ms": 180000 + index * 137,
+                    "spotify_track_id": f"{index:022d}",
+                    "created_at": timestamp,
+                },
+            }
+            for index in range(1, size + 1)
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = "Mede tempo de encode JSON e bytes trafegados (cru/gzip/brotli) para payloads de repertorio."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10,50,200", help="Quantidades de itens no repertorio.")
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",") if size.strip()]
+        repeat = max(options["repeat"], 1)
+        stdlib_renderer = JSONRenderer()
+        fast_renderer = FastJSONRenderer()
+
+        self.stdout.write(f"renderer rapido: {'orjson' if orjson else 'indisponivel (fallback stdlib)'}")
+        self.stdout.write(
+            f"{'itens':>6}{'stdlib ms':>11}{'fast ms':>9}{'ganho':>7}{'bytes':>9}{'gzip':>8}{'br':>8}"
+        )
+        for size in sizes:
+            payload = _setlist_detail_payload(size)
+            body = stdlib_renderer.render(payload)
+            stdlib_ms = best_time_ms(lambda: stdlib_renderer.render(payload), repeat)
+            fast_ms = best_time_ms(lambda: fast_renderer.render(payload), repeat)
+            gzip_bytes = len(gzip.compress(body, compresslevel=6))
+            br_bytes = len(brotli.compress(body, quality=5)) if brotli else "-"
+            self.stdout.write(
+                f"{size:>6}{stdlib_ms:>11.3f}{fast_ms:>9.3f}{stdlib_ms / fast_ms if fast_ms else 0:>6.1f}x"
+                f"{len(body):>9}{gzip_bytes:>8}{br_bytes:>8}"
+            )
@@ -0,0 +1,82 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.repertoire.fast_serializers import audience_request_values, setlist_detail_data
+from apps.repertoire.management.timing import best_time_ms
+from apps.repertoire.models import AudienceRequest, Setlist, SetlistItem, Song
+from apps.repertoire.serializers import AudienceRequestSerializer, SetlistDetailSerializer
+from apps.users.models import User
+from config.renderers import FastJSONRenderer
+
+
+def _build_fixture(size):
+    user = User.objects.create(email=f"benchmark-{size}-{time.time_ns()}@example.com")
+    songs = Song.objects.bulk_create(
+        [
+            Song(
+                user=user,
+                title=f"Musica numero {index} com um titulo realista",
+                artist=f"Banda {index % 17}",
+                chord_url=f"https://www.cifraclub.com.br/banda-{index % 17}/musica-{index}/",
+                duration_ms=180000 + index * 137,
+            )
+            for index in range(size)
+        ]
+    )
+    setlist = Setlist.objects.create(user=user, name="Show de sexta")
+    SetlistItem.objects.bulk_create(
+        [SetlistItem(setlist=setlist, song=song, position=index) for index, song in enumerate(songs, start=1)]
+    )
+    AudienceRequest.objects.bulk_create(
+        [
+            AudienceRequest(setlist=setlist, song=song if index % 2 else None, requested_song_name=song.title)
+            for index, song in enumerate(songs)
+        ]
+    )
+    return setlist
+
+
+class Command(BaseCommand):
+    help = "Compara ModelSerializer e o caminho values() nos GETs de repertorio e fila (dados temporarios)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="50,200,1000", help="Quantidades de itens no repertorio e na fila.")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",") if size.strip()]
+        repeat = max(options["repeat"], 1)
+        renderer = FastJSONRenderer()
+
+        self.stdout.write(f"{'endpoint':<16}{'itens':>6}{'model ms':>10}{'values ms':>11}{'ganho':>7}")
+        with transaction.atomic():
+            for size in sizes:
+                setlist = _build_fixture(size)
+                queue = AudienceRequest.objects.filter(setlist=setlist)
+                cases = (
+                    (
+                        "setlist-detail",
+                        lambda: SetlistDetailSerializer(
+                            Setlist.objects.prefetch_related("items__song").get(id=setlist.id)
+                        ).data,
+                        lambda: setlist_detail_data(Setlist.objects.filter(id=setlist.id)),
+                    ),
+                    (
+                        "audience-queue",
+                        lambda: AudienceRequestSerializer(queue.select_related("song"), many=True).data,
+                        lambda: audience_request_values.many(queue),
+                    ),
+                )
+                for name, model_path, values_path in cases:
+                    if renderer.render(model_path()) != renderer.render(values_path()):
+                        self.stderr.write(f"{name}: saidas diferentes para {size} itens")
+                    model_ms = best_time_ms(model_path, repeat)
+                    values_ms = best_time_ms(values_path, repeat)
+                    self.stdout.write(
+                        f"{name:<16}{size:>6}{model_ms:>10.2f}{values_ms:>11.2f}"
+                        f"{model_ms / values_ms if values_ms else 0:>6.1f}x"
+                    )
+            # Nothing the benchmark created is kept.
+            transaction.set_rollback(True)
@@ -0,0 +1,275 @@
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from apps.repertoire.models import Setlist, SetlistItem, SetlistPublicLink, Song
+from apps.repertoire.views import SHORT_RATE_WINDOW_SECONDS
+from apps.users.models import User
+from apps.users.serializers import get_tokens_for_user
+
+_QUERIES_IN_SERVER_TIMING = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(percent / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class InProcessTransport:
+    """Drives the WSGI app directly through Django's test client (no network)."""
+
+    def __init__(self):
+        host = next((host for host in settings.ALLOWED_HOSTS if host not in ("*",) and not host.startswith(".")), "localhost")
+        self.client = Client(HTTP_HOST=host)
+
+    def request(self, method, path, headers, body=None):
+        if method == "GET":
+            response = self.client.get(path, headers=headers)
+        else:
+            response = self.client.post(path, data=body, content_type="application/json", headers=headers)
+        return response.status_code, response.headers
+
+    def close(self):
+        connection.close()
+
+
+class HttpTransport:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def request(self, method, path, headers, body=None):
+        response = self.session.request(method, f"{self.base_url}{path}", headers=headers, json=body, timeout=30)
+        return response.status_code, response.headers
+
+    def close(self):
+        self.session.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula um show: N celulares do publico abrem o link publico e enviam pedidos enquanto "
+        "M dispositivos do musico consultam a fila com ETag. Reporta vazao, p50/p95/p99 e queries por request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--audience", type=int, default=50, help="Clientes simulados do publico.")
+        parser.add_argument("--musicians", type=int, default=2, help="Dispositivos do musico consultando a fila.")
+        parser.add_argument("--duration", type=float, default=20.0, help="Duracao da simulacao em segundos.")
+        parser.add_argument("--songs", type=int, default=40, help="Musicas no repertorio simulado.")
+        parser.add_argument("--think-time", type=float, default=1.0, help="Pausa media entre acoes do publico (s).")
+        parser.add_argument(
+            "--post-every",
+            type=float,
+            default=SHORT_RATE_WINDOW_SECONDS,
+            help="Intervalo minimo entre pedidos de uma mesma pessoa (s).",
+        )
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Intervalo de polling do musico (s).")
+        parser.add_argument("--base-url", default="", help="Servidor ja em execucao; vazio roda o app em processo.")
+        parser.add_argument("--output", default="", help="Grava o resultado em JSON para comparar branches.")
+        parser.add_argument("--compare", default="", help="JSON de uma execucao anterior para comparar.")
+        parser.add_argument("--keep-data", action="store_true", help="Nao remove os dados criados.")
+
+    def handle(self, *args, **options):
+        if options["audience"] < 1 or options["musicians"] < 0 or options["duration"] <= 0:
+            raise CommandError("Parametros invalidos.")
+
+        fixture = self._create_fixture(options["songs"])
+        self.samples = []
+        self.samples_lock = threading.Lock()
+        self.stop_at = time.monotonic() + options["duration"]
+        base_url = options["base_url"]
+
+        def transport_factory():
+            return HttpTransport(base_url) if base_url else InProcessTransport()
+
+        threads = [
+            threading.Thread(
+                target=self._audience_member,
+                args=(transport_factory, fixture, index, options["think_time"], options["post_every"]),
+                daemon=True,
+            )
+            for index in range(options["audience"])
+        ]
+        threads += [
+            threading.Thread(
+                target=self._musician_device,
+                args=(transport_factory, fixture, options["poll_interval"]),
+                daemon=True,
+            )
+            for _ in range(options["musicians"])
+        ]
+
+        self.stdout.write(
+            f"Simulando {options['audience']} pessoas do publico e {options['musicians']} dispositivos "
+            f"por {options['duration']:.0f}s ({'HTTP ' + base_url if base_url else 'em processo'})..."
+        )
+        started_at = time.monotonic()
+        if not base_url:
+            # Request warnings (429s) would drown the report when the app runs in this process.
+            logging.disable(logging.WARNING)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            logging.disable(logging.NOTSET)
+            if not options["keep_data"]:
+                User.objects.filter(id=fixture["user_id"]).delete()
+
+        report = self._build_report(time.monotonic() - started_at)
+        self._print_report(report)
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as baseline_file:
+                self._print_comparison(report, json.load(baseline_file))
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output_file:
+                json.dump(report, output_file, indent=2)
+            self.stdout.write(f"Resultado gravado em {options['output']}.")
+
+    def _create_fixture(self, song_count):
+        suffix = uuid.uuid4().hex[:10]
+        user = User.objects.create_user(email=f"gig-sim-{suffix}@example.com", password=uuid.uuid4().hex)
+        songs = Song.objects.bulk_create(
+            [Song(user=user, title=f"Musica {index}", artist=f"Banda {index % 9}") for index in range(1, song_count + 1)]
+        )
+        setlist = Setlist.objects.create(user=user, name=f"Show simulado {suffix}")
+        SetlistItem.objects.bulk_create(
+            [SetlistItem(setlist=setlist, song=song, position=position) for position, song in enumerate(songs, start=1)]
+        )
+        public_link = SetlistPublicLink.objects.create(setlist=setlist)
+        return {
+            "user_id": user.id,
+            "setlist_id": setlist.id,
+            "token": public_link.token,
+            "song_titles": [song.title for song in songs],
+            "access": get_tokens_for_user(user)["access"],
+        }
+
+    def _record(self, endpoint, started_at, status_code, headers):
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        match = _QUERIES_IN_SERVER_TIMING.search(headers.get("Server-Timing", ""))
+        with self.samples_lock:
+            self.samples.append((endpoint, status_code, elapsed_ms, int(match.group(1)) if match else None))
+
+    def _timed(self, transport, endpoint, method, path, headers, body=None):
+        started_at = time.perf_counter()
+        try:
+            status_code, response_headers = transport.request(method, path, headers, body)
+        except Exception:
+            status_code, response_headers = 0, {}
+        self._record(endpoint, started_at, status_code, response_headers)
+        return status_code, response_headers
+
+    def _audience_member(self, transport_factory, fixture, index, think_time, post_every):
+        transport = transport_factory()
+        headers = {"X-Forwarded-For": f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}"}
+        rng = random.Random(index)
+        next_post_at = time.monotonic() + rng.uniform(0, post_every)
+        try:
+            while time.monotonic() < self.stop_at:
+                self._timed(transport, "public_setlist", "GET", f"/api/repertoire/public/setlists/{fixture['token']}/", headers)
+                if time.monotonic() < next_post_at:
+                    time.sleep(rng.uniform(0, 2 * think_time))
+                    continue
+                next_post_at = time.monotonic() + post_every
+                self._timed(
+                    transport,
+                    "public_request_create",
+                    "POST",
+                    f"/api/repertoire/public/setlists/{fixture['token']}/requests/",
+                    headers,
+                    {"song_name": rng.choice(fixture["song_titles"]), "requester_name": f"Fa {index}"},
+                )
+                time.sleep(rng.uniform(0, 2 * think_time))
+        finally:
+            transport.close()
+
+    def _musician_device(self, transport_factory, fixture, poll_interval):
+        transport = transport_factory()
+        headers = {"Authorization": f"Bearer {fixture['access']}"}
+        etag = ""
+        try:
+            while time.monotonic() < self.stop_at:
+                poll_headers = {**headers, "If-None-Match": etag} if etag else headers
+                _, response_headers = self._timed(
+                    transport,
+                    "musician_queue_poll",
+                    "GET",
+                    f"/api/repertoire/setlists/{fixture['setlist_id']}/requests/",
+                    poll_headers,
+                )
+                etag = response_headers.get("ETag", etag)
+                time.sleep(poll_interval)
+        finally:
+            transport.close()
+
+    def _build_report(self, wall_seconds):
+        grouped = defaultdict(list)
+        for sample in self.samples:
+            grouped[sample[0]].append(sample)
+
+        endpoints = {}
+        for endpoint, samples in sorted(grouped.items()):
+            latencies = sorted(sample[2] for sample in samples)
+            queries = [sample[3] for sample in samples if sample[3] is not None]
+            statuses = defaultdict(int)
+            for sample in samples:
+                statuses[str(sample[1])] += 1
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "throughput_rps": round(len(samples) / wall_seconds, 2),
+                "errors": sum(1 for sample in samples if sample[1] == 0 or sample[1] >= 500),
+                "statuses": dict(statuses),
+                "p50_ms": round(_percentile(latencies, 50), 2),
+                "p95_ms": round(_percentile(latencies, 95), 2),
+                "p99_ms": round(_percentile(latencies, 99), 2),
+                "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+            }
+
+        return {
+            "wall_seconds": round(wall_seconds, 2),
+            "total_requests": len(self.samples),
+            "throughput_rps": round(len(self.samples) / wall_seconds, 2),
+            "endpoints": endpoints,
+        }
+
+    def _print_report(self, report):
+        self.stdout.write(
+            f"\n{report['total_requests']} requests em {report['wall_seconds']}s ({report['throughput_rps']} req/s)\n"
+        )
+        self.stdout.write(f"{'endpoint':<24}{'reqs':>7}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}  status")
+        for endpoint, data in report["endpoints"].items():
+            queries = "-" if data["queries_per_request"] is None else data["queries_per_request"]
+            statuses = " ".join(f"{code}:{count}" for code, count in sorted(data["statuses"].items()))
+            self.stdout.write(
+                f"{endpoint:<24}{data['requests']:>7}{data['throughput_rps']:>9}{data['p50_ms']:>9}"
+                f"{data['p95_ms']:>9}{data['p99_ms']:>9}{queries:>9}  {statuses}"
+            )
+
+    def _print_comparison(self, report, baseline):
+        self.stdout.write("\nComparacao com a execucao anterior (p95 ms / req/s / queries):")
+        for endpoint, data in report["endpoints"].items():
+            previous = baseline.get("endpoints", {}).get(endpoint)
+            if not previous:
+                continue
+            self.stdout.write(
+                f"{endpoint:<24}p95 {previous['p95_ms']} -> {data['p95_ms']}  "
+                f"req/s {previous['throughput_rps']} -> {data['throughput_rps']}  "
+                f"queries {previous['queries_per_request']} -> {data['queries_per_request']}"
+            )
@@ -0,0 +1,11 @@
+import time
+
+
+def best_time_ms(func, repeat):
+    """Fastest of `repeat` calls to `func`, in milliseconds; the minimum is the least noisy estimate."""
+    best = float("inf")
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started_at)
+    return best * 1000
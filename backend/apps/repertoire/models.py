@@ -3,6 +3,10 @@ import secrets
 from django.conf import settings
 from django.db import models
 
+# Positions are shifted out of the way before being renumbered, because
+# uniq_setlist_position is checked row by row during an UPDATE.
+POSITION_SHIFT_OFFSET = 1_000_000
+
 
 class Song(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="songs")
@@ -12,6 +16,7 @@ class Song(models.Model):
     duration_ms = models.PositiveIntegerField(null=True, blank=True)
     spotify_track_id = models.CharField(max_length=64, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ["title", "id"]
@@ -55,6 +60,7 @@ class SetlistItem(models.Model):
     setlist = models.ForeignKey(Setlist, on_delete=models.CASCADE, related_name="items")
     song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name="setlist_items")
     position = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ["position", "id"]
@@ -81,3 +87,40 @@ class AudienceRequest(models.Model):
     def __str__(self):
         song_label = self.song.title if self.song else self.requested_song_name
         return f"Pedido: {song_label} ({self.setlist.name})"
+
+
+class SyncTombstone(models.Model):
+    KIND_SONG = "song"
+    KIND_SETLIST = "setlist"
+    KIND_ITEM = "item"
+    KIND_CHOICES = [(KIND_SONG, "Musica"), (KIND_SETLIST, "Repertorio"), (KIND_ITEM, "Item")]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="sync_tombstones")
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["deleted_at", "id"]
+        indexes = [models.Index(fields=["user", "deleted_at"], name="repertoire_tombstone_user_idx")]
+
+    def __str__(self):
+        return f"Removido: {self.kind} #{self.object_id}"
+
+
+class MutationReceipt(models.Model):
+    """Outcome of an offline mutation already replayed, keyed by the client's mutation id."""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="mutation_receipts")
+    key = models.CharField(max_length=64)
+    result = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="uniq_mutation_receipt_key"),
+        ]
+
+    def __str__(self):
+        return f"Mutacao {self.key}"
@@ -0,0 +1,283 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import POSITION_SHIFT_OFFSET, MutationReceipt, Setlist, SetlistItem, Song, SyncTombstone
+from .serializers import SetlistSerializer, SongSerializer
+
+
+class MutationRejected(Exception):
+    pass
+
+
+def _payload_id(payload, field):
+    try:
+        value = int(payload[field])
+    except (KeyError, TypeError, ValueError):
+        raise MutationRejected(f"Campo {field} invalido.")
+    if value == 0:
+        raise MutationRejected(f"Campo {field} invalido.")
+    return value
+
+
+def _temp_id(payload, field):
+    value = _payload_id(payload, field)
+    if value > 0:
+        raise MutationRejected(f"Campo {field} deve ser um id temporario negativo.")
+    return value
+
+
+def _validated(serializer):
+    if not serializer.is_valid():
+        field, errors = next(iter(serializer.errors.items()))
+        raise MutationRejected(f"{field}: {errors[0]}")
+    return serializer.validated_data
+
+
+class MutationReplay:
+    """Replays a client's queued offline mutations in order, in one transaction.
+
+    Client-created rows carry negative temporary ids. Every operation is first
+    applied to an in-memory copy of the rows the batch touches, and the result
+    is then written with set-based queries, so the query count does not grow
+    with the number of operations. Mutation ids double as idempotency keys:
+    a replayed id returns its stored outcome instead of being applied again.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.known_ids = {"songs": {}, "setlists": {}, "items": {}}
+        self.songs = {}
+        self.setlists = {}
+        self.order = {}
+        self.item_song = {}
+        self.item_setlist = {}
+        self.existing_items = {}
+        self.new_songs = {}
+        self.new_setlists = {}
+        self.new_items = set()
+        self.renamed = set()
+        self.deleted_item_ids = []
+        self.touched = set()
+        self.created = []
+
+    def run(self, mutations):
+        # Loading, applying and writing share one transaction, and the touched
+        # setlists stay locked throughout: a concurrent add or delete cannot
+        # slip an item in between the read and the renumbering write.
+        with transaction.atomic():
+            receipts = {
+                receipt.key: receipt.result
+                for receipt in MutationReceipt.objects.filter(user=self.user, key__in=[m["id"] for m in mutations])
+            }
+            for result in receipts.values():
+                for kind, mapping in result.get("id_map", {}).items():
+                    self.known_ids[kind].update({int(temp): real for temp, real in mapping.items()})
+
+            pending = [mutation for mutation in mutations if mutation["id"] not in receipts]
+            self._load(pending)
+
+            results = []
+            fresh = {}
+            for mutation in mutations:
+                if mutation["id"] in receipts or mutation["id"] in fresh:
+                    stored = receipts.get(mutation["id"]) or fresh[mutation["id"]]
+                    results.append({**stored, "id": mutation["id"], "duplicate": True})
+                    continue
+                result = {"id": mutation["id"]}
+                try:
+                    getattr(self, f"_{mutation['type']}")(mutation["payload"], result)
+                    result["status"] = "applied"
+                except MutationRejected as exc:
+                    result["status"] = "error"
+                    result["detail"] = str(exc)
+                fresh[mutation["id"]] = result
+                results.append(result)
+
+            self._write()
+            for result, kind, temp_id, obj in self.created:
+                result.setdefault("id_map", {}).setdefault(kind, {})[str(temp_id)] = obj.pk
+                self.known_ids[kind][temp_id] = obj.pk
+            MutationReceipt.objects.bulk_create(
+                [
+                    MutationReceipt(user=self.user, key=key, result={k: v for k, v in result.items() if k != "id"})
+                    for key, result in fresh.items()
+                ]
+            )
+
+        return {
+            "results": results,
+            "id_map": {
+                kind: {str(temp): real for temp, real in mapping.items()} for kind, mapping in self.known_ids.items()
+            },
+        }
+
+    def _resolve(self, kind, value):
+        return self.known_ids[kind].get(value, value) if value < 0 else value
+
+    def _load(self, mutations):
+        setlist_ids, song_ids, item_ids = set(), set(), set()
+        for mutation in mutations:
+            payload = mutation["payload"]
+            for field, kind, bucket in (
+                ("setlistId", "setlists", setlist_ids),
+                ("songId", "songs", song_ids),
+                ("itemId", "items", item_ids),
+            ):
+                try:
+                    bucket.add(self._resolve(kind, int(payload[field])))
+                except (KeyError, TypeError, ValueError):
+                    pass
+            item_list = payload.get("itemIds")
+            for item_id in item_list if isinstance(item_list, list) else []:
+                try:
+                    item_ids.add(self._resolve("items", int(item_id)))
+                except (TypeError, ValueError):
+                    pass
+
+        item_ids = {item_id for item_id in item_ids if item_id > 0}
+        if item_ids:
+            setlist_ids.update(
+                SetlistItem.objects.filter(id__in=item_ids, setlist__user=self.user).values_list("setlist_id", flat=True)
+            )
+
+        setlist_ids = {setlist_id for setlist_id in setlist_ids if setlist_id > 0}
+        if setlist_ids:
+            # Locked in id order so two overlapping replays cannot deadlock.
+            locked = Setlist.objects.select_for_update().filter(user=self.user, id__in=setlist_ids).order_by("id")
+            self.setlists = {setlist.id: setlist for setlist in locked}
+            self.order = {setlist_id: [] for setlist_id in self.setlists}
+            for item in SetlistItem.objects.filter(setlist_id__in=self.setlists).order_by("position", "id"):
+                self.existing_items[item.id] = item
+                self.order[item.setlist_id].append(item.id)
+                self.item_song[item.id] = item.song_id
+                self.item_setlist[item.id] = item.setlist_id
+
+        song_ids = {song_id for song_id in song_ids if song_id > 0}
+        if song_ids:
+            self.songs = {song.id: song for song in Song.objects.filter(user=self.user, id__in=song_ids)}
+
+    def _setlist_key(self, payload):
+        key = self._resolve("setlists", _payload_id(payload, "setlistId"))
+        if key not in self.setlists:
+            raise MutationRejected("Repertorio nao encontrado.")
+        return key
+
+    def _check_new_temp(self, kind, temp_id, registry):
+        if temp_id in registry or temp_id in self.known_ids[kind]:
+            raise MutationRejected("Id temporario repetido.")
+
+    def _create_song(self, payload, result):
+        temp_id = _temp_id(payload, "tempSongId")
+        self._check_new_temp("songs", temp_id, self.songs)
+        data = _validated(SongSerializer(data={"title": payload.get("title"), "artist": payload.get("artist", "")}))
+        song = Song(user=self.user, **data)
+        self.songs[temp_id] = song
+        self.new_songs[temp_id] = song
+        self.created.append((result, "songs", temp_id, song))
+
+    def _create_setlist(self, payload, result):
+        temp_id = _temp_id(payload, "tempSetlistId")
+        self._check_new_temp("setlists", temp_id, self.setlists)
+        data = _validated(SetlistSerializer(data={"name": payload.get("name")}))
+        setlist = Setlist(user=self.user, **data)
+        self.setlists[temp_id] = setlist
+        self.new_setlists[temp_id] = setlist
+        self.order[temp_id] = []
+        self.created.append((result, "setlists", temp_id, setlist))
+
+    def _rename_setlist(self, payload, result):
+        key = self._setlist_key(payload)
+        self.setlists[key].name = _validated(SetlistSerializer(data={"name": payload.get("name")}))["name"]
+        if key > 0:
+            self.renamed.add(key)
+
+    def _add_setlist_item(self, payload, result):
+        setlist_key = self._setlist_key(payload)
+        song_key = self._resolve("songs", _payload_id(payload, "songId"))
+        temp_id = _temp_id(payload, "tempItemId")
+        if song_key not in self.songs:
+            raise MutationRejected("Musica nao encontrada.")
+        self._check_new_temp("items", temp_id, self.item_setlist)
+        if any(self.item_song[item_key] == song_key for item_key in self.order[setlist_key]):
+            raise MutationRejected("Musica ja adicionada no repertorio.")
+
+        self.order[setlist_key].append(temp_id)
+        self.item_song[temp_id] = song_key
+        self.item_setlist[temp_id] = setlist_key
+        self.new_items.add(temp_id)
+        self.touched.add(setlist_key)
+        self.created.append((result, "items", temp_id, None))
+
+    def _delete_setlist_item(self, payload, result):
+        item_key = self._resolve("items", _payload_id(payload, "itemId"))
+        setlist_key = self.item_setlist.pop(item_key, None)
+        if setlist_key is None:
+            raise MutationRejected("Item nao encontrado.")
+        self.order[setlist_key].remove(item_key)
+        if item_key > 0:
+            self.deleted_item_ids.append(item_key)
+        else:
+            self.new_items.discard(item_key)
+        self.touched.add(setlist_key)
+
+    def _reorder_setlist(self, payload, result):
+        setlist_key = self._setlist_key(payload)
+        try:
+            item_keys = [self._resolve("items", int(item_id)) for item_id in payload["itemIds"]]
+        except (KeyError, TypeError, ValueError):
+            raise MutationRejected("Campo itemIds invalido.")
+        if len(item_keys) != len(self.order[setlist_key]):
+            raise MutationRejected("Quantidade de itens invalida para reordenar.")
+        if set(item_keys) != set(self.order[setlist_key]):
+            raise MutationRejected("Lista de itens invalida.")
+        self.order[setlist_key] = item_keys
+        self.touched.add(setlist_key)
+
+    def _write(self):
+        now = timezone.now()
+        if self.new_songs:
+            Song.objects.bulk_create(list(self.new_songs.values()))
+        if self.new_setlists:
+            Setlist.objects.bulk_create(list(self.new_setlists.values()))
+        if self.renamed:
+            renamed = [self.setlists[key] for key in self.renamed]
+            for setlist in renamed:
+                setlist.updated_at = now
+            Setlist.objects.bulk_update(renamed, ["name", "updated_at"])
+        if self.deleted_item_ids:
+            SyncTombstone.objects.bulk_create(
+                [SyncTombstone(user=self.user, kind=SyncTombstone.KIND_ITEM, object_id=item_id) for item_id in self.deleted_item_ids]
+            )
+            SetlistItem.objects.filter(id__in=self.deleted_item_ids).delete()
+
+        touched_existing = [key for key in self.touched if key > 0]
+        if touched_existing:
+            SetlistItem.objects.filter(setlist_id__in=touched_existing).update(position=F("position") + POSITION_SHIFT_OFFSET)
+
+        kept, created_items = [], {}
+        for setlist_key in self.touched:
+            for position, item_key in enumerate(self.order[setlist_key], start=1):
+                if item_key > 0:
+                    item = self.existing_items[item_key]
+                    item.position = position
+                    item.updated_at = now
+                    kept.append(item)
+                else:
+                    created_items[item_key] = SetlistItem(
+                        setlist=self.setlists[setlist_key],
+                        song=self.songs[self.item_song[item_key]],
+                        position=position,
+                    )
+        if kept:
+            SetlistItem.objects.bulk_update(kept, ["position", "updated_at"])
+        if created_items:
+            SetlistItem.objects.bulk_create(list(created_items.values()))
+        if touched_existing:
+            Setlist.objects.filter(id__in=touched_existing).update(updated_at=now)
+
+        self.created = [
+            (result, kind, temp_id, created_items[temp_id] if kind == "items" else obj)
+            for result, kind, temp_id, obj in self.created
+            if kind != "items" or temp_id in created_items
+        ]
@@ -2,12 +2,24 @@ from rest_framework import serializers
 
 from .models import AudienceRequest, Setlist, SetlistItem, SetlistPublicLink, Song
 
+MUTATION_TYPES = (
+    "create_song",
+    "create_setlist",
+    "rename_setlist",
+    "add_setlist_item",
+    "delete_setlist_item",
+    "reorder_setlist",
+)
+MUTATION_REPLAY_MAX_OPS = 500
+SONG_BULK_MAX_OPS = 2000
+SONG_MERGE_MAX_SOURCES = 100
+
 
 class SongSerializer(serializers.ModelSerializer):
     class Meta:
         model = Song
-        fields = ("id", "title", "artist", "chord_url", "duration_ms", "spotify_track_id", "created_at")
-        read_only_fields = ("id", "spotify_track_id", "created_at")
+        fields = ("id", "title", "artist", "chord_url", "duration_ms", "spotify_track_id", "created_at", "updated_at")
+        read_only_fields = ("id", "spotify_track_id", "created_at", "updated_at")
 
 
 class SetlistItemSerializer(serializers.ModelSerializer):
@@ -18,6 +30,15 @@ class SetlistItemSerializer(serializers.ModelSerializer):
         fields = ("id", "position", "song")
 
 
+class SyncSetlistItemSerializer(serializers.ModelSerializer):
+    setlist_id = serializers.IntegerField(read_only=True)
+    song_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = SetlistItem
+        fields = ("id", "setlist_id", "song_id", "position", "updated_at")
+
+
 class SetlistSerializer(serializers.ModelSerializer):
     class Meta:
         model = Setlist
@@ -45,6 +66,59 @@ class ReorderSetlistSerializer(serializers.Serializer):
     )
 
 
+class SongImportSerializer(serializers.Serializer):
+    file = serializers.FileField(required=False)
+    text = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False)
+    setlist_name = serializers.CharField(max_length=255, required=False, allow_blank=True)
+
+    def validate(self, attrs):
+        if not attrs.get("file") and not attrs.get("text", "").strip():
+            raise serializers.ValidationError("Envie um arquivo ou texto com as musicas.")
+        return attrs
+
+
+class LibraryImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+
+
+class SongBulkOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=("create", "update", "delete"))
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False)
+
+    def validate(self, attrs):
+        if attrs["op"] != "create" and attrs.get("id") is None:
+            raise serializers.ValidationError({"id": "Campo obrigatorio para update e delete."})
+        return attrs
+
+
+class SongBulkSerializer(serializers.Serializer):
+    operations = serializers.ListField(
+        child=SongBulkOperationSerializer(), allow_empty=False, max_length=SONG_BULK_MAX_OPS
+    )
+
+
+class SongMergeSerializer(serializers.Serializer):
+    target_id = serializers.IntegerField()
+    source_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=SONG_MERGE_MAX_SOURCES)
+
+    def validate(self, attrs):
+        attrs["source_ids"] = list(dict.fromkeys(attrs["source_ids"]))
+        if attrs["target_id"] in attrs["source_ids"]:
+            raise serializers.ValidationError({"source_ids": "A musica mantida nao pode estar entre as mescladas."})
+        return attrs
+
+
+class MutationSerializer(serializers.Serializer):
+    id = serializers.CharField(max_length=64)
+    type = serializers.ChoiceField(choices=MUTATION_TYPES)
+    payload = serializers.DictField()
+
+
+class MutationReplaySerializer(serializers.Serializer):
+    mutations = serializers.ListField(child=MutationSerializer(), allow_empty=False, max_length=MUTATION_REPLAY_MAX_OPS)
+
+
 class SetlistPublicLinkSerializer(serializers.ModelSerializer):
     class Meta:
         model = SetlistPublicLink
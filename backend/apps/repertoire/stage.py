@@ -0,0 +1,90 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from config.renderers import FastJSONRenderer
+
+from .models import Setlist, SetlistItem
+
+STAGE_SNAPSHOT_VERSION = 1
+# Rows are positional to keep the payload small; the field list travels with it.
+STAGE_SNAPSHOT_FIELDS = ("item_id", "song_id", "title", "artist", "chord_url", "duration_ms")
+
+
+def _state_key(user_id, setlist_id, state):
+    return f"stage:state:{user_id}:{setlist_id}:{state}"
+
+
+def _body_key(user_id, setlist_id, digest):
+    return f"stage:body:{user_id}:{setlist_id}:{digest}"
+
+
+def _setlist_state(user, setlist_id):
+    """One query: the setlist's name plus everything a change to its items or songs moves."""
+    return (
+        Setlist.objects.filter(user=user, id=setlist_id)
+        .annotate(
+            item_count=Count("items"),
+            items_updated_at=Max("items__updated_at"),
+            songs_updated_at=Max("items__song__updated_at"),
+        )
+        .values("id", "name", "updated_at", "item_count", "items_updated_at", "songs_updated_at")
+        .first()
+    )
+
+
+def _build(setlist):
+    rows = (
+        SetlistItem.objects.filter(setlist_id=setlist["id"])
+        .order_by("position", "id")
+        .values_list("id", "song_id", "song__title", "song__artist", "song__chord_url", "song__duration_ms")
+    )
+    body = FastJSONRenderer().render(
+        {
+            "version": STAGE_SNAPSHOT_VERSION,
+            "setlist": {"id": setlist["id"], "name": setlist["name"]},
+            "fields": STAGE_SNAPSHOT_FIELDS,
+            "items": [list(row) for row in rows],
+        }
+    )
+    return hashlib.sha256(body).hexdigest()[:32], body
+
+
+def current_stage_snapshot(user, setlist_id):
+    """Returns `(digest, body)` for the setlist's current stage snapshot, or None if it is not the user's.
+
+    Snapshots are cached per setlist state, so the body is only rebuilt after
+    an item or one of its songs changes. `digest` is a hash of the body itself.
+    """
+    setlist = _setlist_state(user, setlist_id)
+    if setlist is None:
+        return None
+
+    state = hashlib.sha1(
+        "|".join(
+            str(setlist[field]) for field in ("name", "updated_at", "item_count", "items_updated_at", "songs_updated_at")
+        ).encode()
+    ).hexdigest()
+    state_key = _state_key(user.id, setlist_id, state)
+    digest = cache.get(state_key)
+    body = cache.get(_body_key(user.id, setlist_id, digest)) if digest else None
+    if body is None:
+        digest, body = _build(setlist)
+        cache.set_many(
+            {state_key: digest, _body_key(user.id, setlist_id, digest): body},
+            timeout=settings.STAGE_SNAPSHOT_CACHE_SECONDS,
+        )
+    return digest, body
+
+
+def stage_snapshot_body(user, setlist_id, digest):
+    """Body of a given snapshot version, or None once that version is no longer current nor cached."""
+    body = cache.get(_body_key(user.id, setlist_id, digest))
+    if body is not None:
+        return body
+    current = current_stage_snapshot(user, setlist_id)
+    if current is not None and current[0] == digest:
+        return current[1]
+    return None
@@ -1,9 +1,28 @@
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.models import Session
 from django.core.cache import cache
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APIClient
 
-from apps.repertoire.models import Setlist, SetlistItem, SetlistPublicLink, Song
+from apps.repertoire.fast_serializers import audience_request_values, setlist_detail_data, song_values
+from apps.repertoire.models import AudienceRequest, Setlist, SetlistItem, SetlistPublicLink, Song, SyncTombstone
+from apps.repertoire.serializers import AudienceRequestSerializer, SetlistDetailSerializer, SongSerializer
 from apps.users.models import User
+from apps.users.serializers import get_tokens_for_user
+from config.renderers import FastJSONRenderer
 
 
 class AudienceRequestsFlowTests(TestCase):
@@ -49,6 +68,110 @@ class AudienceRequestsFlowTests(TestCase):
         )
         self.assertEqual(second_response.status_code, 429)
 
+    def test_public_request_keeps_rate_limit_and_idempotency_state_out_of_the_database(self):
+        self.assertNotIn("DatabaseCache", settings.CACHES["default"]["BACKEND"])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.public_client.post(
+                f"/api/repertoire/public/setlists/{self.public_link.token}/requests/",
+                {"song_name": "Wonderwall"},
+                format="json",
+                headers={"Idempotency-Key": "k-1"},
+            )
+        self.assertEqual(response.status_code, 201)
+
+        writes = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE"))
+        ]
+        self.assertEqual(len(writes), 1)
+        self.assertIn(AudienceRequest._meta.db_table, writes[0])
+        self.assertFalse(any("cache" in query["sql"].lower() for query in queries.captured_queries))
+
+
+class AsyncPublicEndpointsTests(TestCase):
+    """Drives the audience endpoints through the ASGI handler, as uvicorn workers do."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="async@example.com", password="strongpass123")
+        self.song = Song.objects.create(user=self.user, title="Wonderwall", artist="Oasis")
+        self.setlist = Setlist.objects.create(user=self.user, name="Bar do Sabado")
+        SetlistItem.objects.create(setlist=self.setlist, song=self.song, position=1)
+        self.public_link = SetlistPublicLink.objects.create(setlist=self.setlist)
+        self.client = AsyncClient()
+
+    async def test_public_setlist_is_served_async(self):
+        response = await self.client.get(f"/api/repertoire/public/setlists/{self.public_link.token}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"id": self.setlist.id, "name": "Bar do Sabado"})
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+
+        missing = await self.client.get("/api/repertoire/public/setlists/nao-existe/")
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(missing.json(), {"detail": "Link publico invalido."})
+
+    async def test_public_request_create_async_matches_song_and_rate_limits(self):
+        url = f"/api/repertoire/public/setlists/{self.public_link.token}/requests/"
+        response = await self.client.post(url, {"song_name": "wonderwall", "requester_name": "Bia"}, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["song"]["id"], self.song.id)
+        self.assertEqual(response.json()["requester_name"], "Bia")
+
+        audience_request = await AudienceRequest.objects.aget(setlist=self.setlist)
+        self.assertTrue(audience_request.session_key)
+        self.assertFalse(await Session.objects.aexists())
+
+        second = await self.client.post(url, {"song_name": "Wonderwall"}, content_type="application/json")
+        self.assertEqual(second.status_code, 429)
+        self.assertNotIn("setlive_audience", second.cookies)
+
+    async def test_public_request_audience_cookie_is_signed(self):
+        url = f"/api/repertoire/public/setlists/{self.public_link.token}/requests/"
+        await self.client.post(url, {"song_name": "Wonderwall"}, content_type="application/json")
+        audience_id = (await AudienceRequest.objects.aget(setlist=self.setlist)).session_key
+        self.assertIn(audience_id, self.client.cookies["setlive_audience"].value)
+
+        # A forged value is ignored and replaced by a fresh identity.
+        self.client.cookies["setlive_audience"] = "forjado"
+        forged = await self.client.post(url, {"song_name": "Wonderwall"}, content_type="application/json")
+        self.assertEqual(forged.status_code, 201)
+        self.assertNotEqual(forged.cookies["setlive_audience"].value, "forjado")
+        self.assertEqual(await AudienceRequest.objects.filter(session_key="forjado").acount(), 0)
+
+    async def test_public_request_create_async_validation_errors(self):
+        url = f"/api/repertoire/public/setlists/{self.public_link.token}/requests/"
+        response = await self.client.post(url, {"requester_name": "Bia"}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("song_name", response.json())
+
+        malformed = await self.client.post(url, "{", content_type="application/json")
+        self.assertEqual(malformed.status_code, 400)
+
+
+    async def test_public_request_replays_duplicate_idempotency_key(self):
+        url = f"/api/repertoire/public/setlists/{self.public_link.token}/requests/"
+        payload = {"song_name": "Wonderwall", "requester_name": "Bia"}
+        first = await self.client.post(url, payload, content_type="application/json", headers={"Idempotency-Key": "k-1"})
+        retry = await self.client.post(url, payload, content_type="application/json", headers={"Idempotency-Key": "k-1"})
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(await AudienceRequest.objects.filter(setlist=self.setlist).acount(), 1)
+
+        reused = await self.client.post(
+            url, {"song_name": "Outra"}, content_type="application/json", headers={"Idempotency-Key": "k-1"}
+        )
+        self.assertEqual(reused.status_code, 422)
+
+        # A throttled answer is not stored, so a later retry with the same key runs again.
+        for _ in range(2):
+            throttled = await self.client.post(
+                url, {"song_name": "Outra"}, content_type="application/json", headers={"Idempotency-Key": "k-2"}
+            )
+            self.assertEqual(throttled.status_code, 429)
+            self.assertNotIn("Idempotent-Replayed", throttled)
+
 
 class RepertoireSecurityTests(TestCase):
     def setUp(self):
@@ -95,3 +218,761 @@ class RepertoireSecurityTests(TestCase):
         self.assertEqual(response.data["total"], 2)
         self.assertTrue(response.data["has_next"])
         self.assertEqual(len(response.data["items"]), 1)
+
+
+class SongImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="musician@example.com", password="strongpass123")
+        self.existing = Song.objects.create(user=self.user, title="Wonderwall", artist="Oasis")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_csv_import_dedupes_library_and_builds_setlist_in_order(self):
+        upload = SimpleUploadedFile(
+            "set.csv",
+            "titulo,artista\nYellow,Coldplay\n wonderwall ,OASIS\nYellow,Coldplay\n,\nCreep,Radiohead\n".encode("utf-8"),
+            content_type="text/csv",
+        )
+        response = self.client.post("/api/repertoire/songs/import/", {"file": upload, "setlist_name": "Sexta"})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["lines_total"], 5)
+        self.assertEqual(response.data["lines_skipped"], 1)
+        self.assertEqual(response.data["songs_created"], 2)
+        self.assertEqual(response.data["songs_reused"], 2)
+        setlist = Setlist.objects.get(id=response.data["setlist_id"])
+        self.assertEqual(
+            list(setlist.items.order_by("position").values_list("song__title", flat=True)),
+            ["Yellow", "Wonderwall", "Creep"],
+        )
+
+    def test_plain_text_import_uses_constant_number_of_queries(self):
+        text = "\n".join(f"{index}. Song {index} - Band {index % 7}" for index in range(1, 2501))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/repertoire/songs/import/",
+                {"text": text, "setlist_name": "Grande"},
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["songs_created"], 2500)
+        self.assertEqual(Song.objects.filter(user=self.user, artist="Band 3").count(), 357)
+        self.assertLess(len(queries), 50)
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="sync@example.com", password="strongpass123")
+        self.song_a = Song.objects.create(user=self.user, title="Song A", artist="Band")
+        self.song_b = Song.objects.create(user=self.user, title="Song B", artist="Band")
+        self.setlist = Setlist.objects.create(user=self.user, name="Set")
+        self.item_a = SetlistItem.objects.create(setlist=self.setlist, song=self.song_a, position=1)
+        self.item_b = SetlistItem.objects.create(setlist=self.setlist, song=self.song_b, position=2)
+        other = User.objects.create_user(email="other-sync@example.com", password="strongpass123")
+        Song.objects.create(user=other, title="Other", artist="Band")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _age_everything(self):
+        # Pushes existing rows out of the cursor overlap window.
+        old = timezone.now() - timedelta(hours=1)
+        Song.objects.update(updated_at=old)
+        Setlist.objects.update(updated_at=old)
+        SetlistItem.objects.update(updated_at=old)
+
+    def test_full_sync_returns_only_own_library(self):
+        response = self.client.get("/api/repertoire/sync/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["full"])
+        self.assertEqual({song["id"] for song in response.data["songs"]}, {self.song_a.id, self.song_b.id})
+        self.assertEqual([setlist["id"] for setlist in response.data["setlists"]], [self.setlist.id])
+        self.assertEqual(
+            [(item["id"], item["song_id"], item["position"]) for item in response.data["items"]],
+            [(self.item_a.id, self.song_a.id, 1), (self.item_b.id, self.song_b.id, 2)],
+        )
+
+    def test_delta_contains_changes_and_tombstones_since_cursor(self):
+        self._age_everything()
+        cursor = self.client.get("/api/repertoire/sync/").data["cursor"]
+        with mock.patch("apps.repertoire.views.SYNC_CURSOR_OVERLAP", timedelta(0)):
+            unchanged = self.client.get("/api/repertoire/sync/", {"since": cursor})
+            self.assertEqual(
+                (unchanged.data["songs"], unchanged.data["setlists"], unchanged.data["items"]), ([], [], [])
+            )
+
+            self.client.patch(f"/api/repertoire/songs/{self.song_b.id}/", {"title": "Song B2"}, format="json")
+            self.client.delete(f"/api/repertoire/items/{self.item_a.id}/")
+            self.client.delete(f"/api/repertoire/songs/{self.song_a.id}/")
+
+            delta = self.client.get("/api/repertoire/sync/", {"since": cursor})
+
+        self.assertFalse(delta.data["full"])
+        self.assertEqual([song["title"] for song in delta.data["songs"]], ["Song B2"])
+        self.assertEqual([(item["id"], item["position"]) for item in delta.data["items"]], [(self.item_b.id, 1)])
+        self.assertEqual([setlist["id"] for setlist in delta.data["setlists"]], [self.setlist.id])
+        self.assertEqual(delta.data["deleted"], {"songs": [self.song_a.id], "setlists": [], "items": [self.item_a.id]})
+
+    def test_reorder_marks_items_as_changed(self):
+        self._age_everything()
+        cursor = self.client.get("/api/repertoire/sync/").data["cursor"]
+        self.client.post(
+            f"/api/repertoire/setlists/{self.setlist.id}/reorder/",
+            {"item_ids": [self.item_b.id, self.item_a.id]},
+            format="json",
+        )
+        with mock.patch("apps.repertoire.views.SYNC_CURSOR_OVERLAP", timedelta(0)):
+            delta = self.client.get("/api/repertoire/sync/", {"since": cursor})
+        self.assertEqual(
+            [(item["id"], item["position"]) for item in delta.data["items"]], [(self.item_b.id, 1), (self.item_a.id, 2)]
+        )
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get("/api/repertoire/sync/", {"since": "ontem"})
+        self.assertEqual(response.status_code, 400)
+
+
+class MutationReplayTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="offline@example.com", password="strongpass123")
+        self.song = Song.objects.create(user=self.user, title="Song A", artist="Band")
+        self.setlist = Setlist.objects.create(user=self.user, name="Set")
+        self.item = SetlistItem.objects.create(setlist=self.setlist, song=self.song, position=1)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _replay(self, mutations):
+        return self.client.post(
+            "/api/repertoire/mutations/",
+            {"mutations": [{"id": key, "type": kind, "payload": payload} for key, kind, payload in mutations]},
+            format="json",
+        )
+
+    def _offline_session(self):
+        return [
+            ("m1", "create_song", {"tempSongId": -1, "title": "Nova", "artist": "Banda"}),
+            ("m2", "create_setlist", {"tempSetlistId": -2, "name": "Show novo"}),
+            ("m3", "add_setlist_item", {"setlistId": -2, "songId": -1, "tempItemId": -3}),
+            ("m4", "add_setlist_item", {"setlistId": self.setlist.id, "songId": -1, "tempItemId": -4}),
+            ("m5", "reorder_setlist", {"setlistId": self.setlist.id, "itemIds": [-4, self.item.id]}),
+            ("m6", "rename_setlist", {"setlistId": self.setlist.id, "name": "Set renomeado"}),
+            ("m7", "delete_setlist_item", {"itemId": self.item.id}),
+        ]
+
+    def test_offline_session_is_applied_in_one_request(self):
+        response = self._replay(self._offline_session())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["status"] for result in response.data["results"]], ["applied"] * 7)
+
+        id_map = response.data["id_map"]
+        new_song = Song.objects.get(id=id_map["songs"]["-1"])
+        new_setlist = Setlist.objects.get(id=id_map["setlists"]["-2"])
+        self.assertEqual((new_song.title, new_setlist.name), ("Nova", "Show novo"))
+        self.assertEqual(
+            list(new_setlist.items.values_list("id", "song_id", "position")), [(id_map["items"]["-3"], new_song.id, 1)]
+        )
+
+        self.setlist.refresh_from_db()
+        self.assertEqual(self.setlist.name, "Set renomeado")
+        self.assertEqual(list(self.setlist.items.values_list("id", "position")), [(id_map["items"]["-4"], 1)])
+        self.assertTrue(SyncTombstone.objects.filter(kind=SyncTombstone.KIND_ITEM, object_id=self.item.id).exists())
+
+    def test_retry_is_idempotent_and_resolves_earlier_temp_ids(self):
+        first = self._replay(self._offline_session())
+        counts = (Song.objects.count(), Setlist.objects.count(), SetlistItem.objects.count())
+
+        retry = self._replay(
+            self._offline_session() + [("m8", "rename_setlist", {"setlistId": -2, "name": "Show final"})]
+        )
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual((Song.objects.count(), Setlist.objects.count(), SetlistItem.objects.count()), counts)
+        self.assertTrue(all(result["duplicate"] for result in retry.data["results"][:7]))
+        self.assertEqual(retry.data["results"][7]["status"], "applied")
+        self.assertEqual(retry.data["id_map"]["songs"], first.data["id_map"]["songs"])
+        self.assertEqual(Setlist.objects.get(id=first.data["id_map"]["setlists"]["-2"]).name, "Show final")
+
+    def test_rejected_operation_does_not_block_the_rest(self):
+        response = self._replay(
+            [
+                ("e1", "add_setlist_item", {"setlistId": self.setlist.id, "songId": self.song.id, "tempItemId": -1}),
+                ("e2", "rename_setlist", {"setlistId": 999999, "name": "X"}),
+                ("e3", "create_song", {"tempSongId": -2, "title": "Depois"}),
+            ]
+        )
+        self.assertEqual(
+            [(result["status"], result.get("detail")) for result in response.data["results"]],
+            [
+                ("error", "Musica ja adicionada no repertorio."),
+                ("error", "Repertorio nao encontrado."),
+                ("applied", None),
+            ],
+        )
+        self.assertTrue(Song.objects.filter(title="Depois").exists())
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def batch(prefix, size):
+            mutations = []
+            for index in range(1, size + 1):
+                mutations.append((f"{prefix}s{index}", "create_song", {"tempSongId": -index, "title": f"{prefix} {index}"}))
+                mutations.append(
+                    (
+                        f"{prefix}i{index}",
+                        "add_setlist_item",
+                        {"setlistId": self.setlist.id, "songId": -index, "tempItemId": -index},
+                    )
+                )
+            return mutations
+
+        query_counts = []
+        for prefix, size in (("a", 3), ("b", 60)):
+            with CaptureQueriesContext(connection) as queries:
+                response = self._replay(batch(prefix, size))
+            self.assertEqual(response.status_code, 200)
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+        self.assertEqual(self.setlist.items.count(), 64)
+
+
+class BootstrapTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="boot@example.com", password="strongpass123", first_name="Ana")
+        self.songs = [Song.objects.create(user=self.user, title=f"Song {index}", artist="Band") for index in range(3)]
+        self.older = Setlist.objects.create(user=self.user, name="Antigo")
+        self.newer = Setlist.objects.create(user=self.user, name="Recente")
+        SetlistItem.objects.create(setlist=self.older, song=self.songs[0], position=1)
+        SetlistItem.objects.create(setlist=self.newer, song=self.songs[1], position=1)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_bootstrap_returns_home_screen_in_one_payload(self):
+        response = self.client.get("/api/repertoire/bootstrap/", {"page_size": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["user"]["first_name"], "Ana")
+        self.assertEqual([setlist["name"] for setlist in response.data["setlists"]], ["Recente", "Antigo"])
+        self.assertEqual((len(response.data["songs"]["items"]), response.data["songs"]["total"]), (2, 3))
+        self.assertTrue(response.data["songs"]["has_next"])
+        self.assertEqual(response.data["spotify"], {"connected": False})
+        self.assertEqual(response.data["active_setlist"]["id"], self.newer.id)
+        self.assertEqual(response.data["active_setlist"]["items"][0]["song"]["id"], self.songs[1].id)
+
+        chosen = self.client.get("/api/repertoire/bootstrap/", {"setlist": self.older.id})
+        self.assertEqual(chosen.data["active_setlist"]["id"], self.older.id)
+
+    def test_warm_start_returns_304_until_library_changes(self):
+        etag = self.client.get("/api/repertoire/bootstrap/")["ETag"]
+        self.assertTrue(etag.startswith('W/"bootstrap-'))
+
+        not_modified = self.client.get("/api/repertoire/bootstrap/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+
+        self.client.patch(f"/api/repertoire/songs/{self.songs[2].id}/", {"title": "Renomeada"}, format="json")
+        changed = self.client.get("/api/repertoire/bootstrap/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+
+    def test_empty_library(self):
+        other = User.objects.create_user(email="empty@example.com", password="strongpass123")
+        client = APIClient()
+        client.force_authenticate(user=other)
+        response = client.get("/api/repertoire/bootstrap/")
+        self.assertEqual((response.data["setlists"], response.data["active_setlist"]), ([], None))
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="idem@example.com", password="strongpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_retried_song_create_is_replayed_without_writing_again(self):
+        payload = {"title": "Yellow", "artist": "Coldplay"}
+        first = self.client.post("/api/repertoire/songs/", payload, format="json", HTTP_IDEMPOTENCY_KEY="song-1")
+        with self.assertNumQueries(0):
+            retry = self.client.post("/api/repertoire/songs/", payload, format="json", HTTP_IDEMPOTENCY_KEY="song-1")
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Song.objects.filter(user=self.user).count(), 1)
+
+        without_key = self.client.post("/api/repertoire/songs/", payload, format="json")
+        self.assertEqual(without_key.status_code, 201)
+        self.assertEqual(Song.objects.filter(user=self.user).count(), 2)
+
+    def test_keys_are_scoped_per_user_and_reject_other_payloads(self):
+        self.client.post("/api/repertoire/setlists/", {"name": "Show"}, format="json", HTTP_IDEMPOTENCY_KEY="same")
+        reused = self.client.post("/api/repertoire/setlists/", {"name": "Outro"}, format="json", HTTP_IDEMPOTENCY_KEY="same")
+        self.assertEqual(reused.status_code, 422)
+
+        other = User.objects.create_user(email="idem2@example.com", password="strongpass123")
+        client = APIClient()
+        client.force_authenticate(user=other)
+        response = client.post("/api/repertoire/setlists/", {"name": "Show"}, format="json", HTTP_IDEMPOTENCY_KEY="same")
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Setlist.objects.count(), 2)
+
+    def test_multipart_uploads_are_fingerprinted_by_content(self):
+        def upload(text):
+            return {"file": SimpleUploadedFile("songs.txt", text.encode(), content_type="text/plain")}
+
+        first = self.client.post("/api/repertoire/songs/import/", upload("Yellow - Coldplay"), HTTP_IDEMPOTENCY_KEY="csv")
+        retry = self.client.post("/api/repertoire/songs/import/", upload("Yellow - Coldplay"), HTTP_IDEMPOTENCY_KEY="csv")
+        same_size = self.client.post("/api/repertoire/songs/import/", upload("Creep - Radiohead"), HTTP_IDEMPOTENCY_KEY="csv")
+        self.assertEqual((first.status_code, retry.status_code, same_size.status_code), (201, 201, 422))
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Song.objects.filter(user=self.user).count(), 1)
+
+    def test_in_flight_key_returns_conflict(self):
+        with mock.patch("config.idempotency.cache.add", return_value=False):
+            response = self.client.post("/api/repertoire/songs/", {"title": "Yellow"}, format="json", HTTP_IDEMPOTENCY_KEY="busy")
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Song.objects.exists())
+
+
+class LibraryBackupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="backup@example.com", password="strongpass123")
+        self.songs = [
+            Song.objects.create(user=self.user, title=f"Song {index}", artist="Band", duration_ms=1000 * index)
+            for index in range(5)
+        ]
+        self.setlist = Setlist.objects.create(user=self.user, name="Show")
+        for position, song in enumerate(reversed(self.songs), start=1):
+            SetlistItem.objects.create(setlist=self.setlist, song=song, position=position)
+        AudienceRequest.objects.create(setlist=self.setlist, song=self.songs[0], requested_song_name="Song 0", requester_name="Bia")
+        AudienceRequest.objects.create(setlist=self.setlist, requested_song_name="Fora da lista")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _export(self):
+        response = self.client.get("/api/repertoire/library/export/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        return b"".join(response.streaming_content)
+
+    def _import(self, client, content):
+        upload = SimpleUploadedFile("setlive-library.ndjson", content, content_type="application/x-ndjson")
+        return client.post("/api/repertoire/library/import/", {"file": upload}, format="multipart")
+
+    def test_export_streams_every_record_type_in_chunks(self):
+        with mock.patch("apps.repertoire.backup.BACKUP_CHUNK_SIZE", 2):
+            content = self._export()
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(records[0]["format"], "setlive-library")
+        self.assertEqual(records[-1], {"type": "end", "counts": {"song": 5, "setlist": 1, "item": 5, "audience_request": 2}})
+        self.assertEqual([record["type"] for record in records[1:6]], ["song"] * 5)
+        self.assertEqual(records[1]["duration_ms"], 0)
+
+    async def test_export_is_streamed_asynchronously_under_asgi(self):
+        access = get_tokens_for_user(self.user)["access"]
+        response = await AsyncClient().get("/api/repertoire/library/export/", headers={"Authorization": f"Bearer {access}"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(content, await sync_to_async(self._export)())
+
+    def test_round_trip_into_another_account(self):
+        content = self._export()
+        other = User.objects.create_user(email="restore@example.com", password="strongpass123")
+        Song.objects.create(user=other, title="song 1", artist="BAND")
+        client = APIClient()
+        client.force_authenticate(user=other)
+
+        with mock.patch("apps.repertoire.backup.BACKUP_CHUNK_SIZE", 2):
+            response = self._import(client, content)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            response.data,
+            {"songs_created": 4, "songs_reused": 1, "setlists_created": 1, "items_created": 5, "audience_requests_created": 2},
+        )
+
+        restored = Setlist.objects.get(user=other)
+        self.assertEqual(
+            list(restored.items.values_list("song__title", flat=True)),
+            ["Song 4", "Song 3", "Song 2", "song 1", "Song 0"],
+        )
+        self.assertEqual(set(restored.items.values_list("song__user", flat=True)), {other.id})
+        original = AudienceRequest.objects.get(setlist=self.setlist, song=self.songs[0])
+        copied = AudienceRequest.objects.get(setlist=restored, requester_name="Bia")
+        self.assertEqual(copied.created_at, original.created_at)
+        self.assertEqual(copied.song.user, other)
+
+    def test_truncated_or_inconsistent_backups_are_rejected_atomically(self):
+        content = self._export()
+        other = User.objects.create_user(email="restore@example.com", password="strongpass123")
+        client = APIClient()
+        client.force_authenticate(user=other)
+
+        truncated = self._import(client, b"\n".join(content.splitlines()[:-1]))
+        self.assertEqual(truncated.status_code, 400)
+        self.assertEqual(truncated.data["detail"], "Backup incompleto.")
+
+        lines = content.splitlines()
+        dangling = json.dumps({"type": "item", "id": 1, "setlist_id": 999, "song_id": 1, "position": 9}).encode()
+        broken = self._import(client, b"\n".join([*lines[:-1], dangling, lines[-1]]))
+        self.assertEqual(broken.status_code, 400)
+        self.assertIn("setlist_id", broken.data["detail"])
+
+        not_backup = self._import(client, b"Wonderwall - Oasis\n")
+        self.assertEqual(not_backup.status_code, 400)
+        self.assertFalse(Song.objects.filter(user=other).exists())
+        self.assertFalse(Setlist.objects.filter(user=other).exists())
+
+
+class SongBulkTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="bulk@example.com", password="strongpass123")
+        self.songs = [Song.objects.create(user=self.user, title=f"Song {index}", artist="Band") for index in range(4)]
+        self.setlist = Setlist.objects.create(user=self.user, name="Show")
+        SetlistItem.objects.create(setlist=self.setlist, song=self.songs[3], position=1)
+        self.other_song = Song.objects.create(
+            user=User.objects.create_user(email="other-bulk@example.com", password="strongpass123"), title="Alheia"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _bulk(self, operations):
+        return self.client.post("/api/repertoire/songs/bulk/", {"operations": operations}, format="json")
+
+    def test_applies_operations_and_reports_each_result(self):
+        response = self._bulk(
+            [
+                {"op": "create", "data": {"title": "Nova", "artist": "Banda"}},
+                {"op": "update", "id": self.songs[0].id, "data": {"chord_url": "https://cifras.example.com/0"}},
+                {"op": "update", "id": self.songs[0].id, "data": {"artist": "Outra"}},
+                {"op": "update", "id": self.songs[1].id, "data": {"title": ""}},
+                {"op": "delete", "id": self.songs[3].id},
+                {"op": "delete", "id": self.other_song.id},
+                {"op": "create", "data": {"artist": "Sem titulo"}},
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual(
+            [result["status"] for result in results],
+            ["created", "updated", "updated", "error", "deleted", "error", "error"],
+        )
+        self.assertEqual(results[0]["song"]["title"], "Nova")
+        self.assertIn("title", results[3]["errors"])
+        self.assertEqual(results[5]["detail"], "Musica nao encontrada.")
+
+        self.songs[0].refresh_from_db()
+        self.assertEqual((self.songs[0].chord_url, self.songs[0].artist), ("https://cifras.example.com/0", "Outra"))
+        self.assertEqual(Song.objects.get(id=self.songs[1].id).title, "Song 1")
+        self.assertFalse(Song.objects.filter(id=self.songs[3].id).exists())
+        self.assertFalse(SetlistItem.objects.filter(setlist=self.setlist).exists())
+        self.assertTrue(SyncTombstone.objects.filter(kind=SyncTombstone.KIND_SONG, object_id=self.songs[3].id).exists())
+        self.assertTrue(Song.objects.filter(id=self.other_song.id).exists())
+
+    def test_delete_supersedes_earlier_update(self):
+        response = self._bulk(
+            [
+                {"op": "update", "id": self.songs[0].id, "data": {"artist": "Outra"}},
+                {"op": "delete", "id": self.songs[0].id},
+                {"op": "delete", "id": self.songs[0].id},
+            ]
+        )
+        self.assertEqual([result["status"] for result in response.data["results"]], ["skipped", "deleted", "error"])
+        self.assertFalse(Song.objects.filter(id=self.songs[0].id).exists())
+
+    def test_rejects_malformed_batches(self):
+        self.assertEqual(self._bulk([]).status_code, 400)
+        self.assertEqual(self._bulk([{"op": "update", "data": {"title": "x"}}]).status_code, 400)
+        self.assertEqual(self._bulk([{"op": "merge", "id": 1}]).status_code, 400)
+
+
+class SongDuplicateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="dupes@example.com", password="strongpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _song(self, title, artist="", **fields):
+        return Song.objects.create(user=self.user, title=title, artist=artist, **fields)
+
+    def test_groups_by_unaccented_key_and_spotify_track(self):
+        original = self._song("Evidências", "Chitãozinho & Xororó")
+        typed = self._song("evidencias", "Chitaozinho e Xororo!")
+        linked = self._song("Evidencias (Ao Vivo)", "Chitãozinho", spotify_track_id="track-1", chord_url="https://c.example.com")
+        same_track = self._song("Evidências", "Chitãozinho & Xororó", spotify_track_id="track-1")
+        self._song("Evidencias", "Outra dupla")
+        Song.objects.create(user=User.objects.create_user(email="x@example.com", password="strongpass123"), title="Evidências")
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/repertoire/songs/duplicates/")
+        self.assertEqual(response.status_code, 200)
+        groups = response.data["groups"]
+        self.assertEqual(len(groups), 1)
+        self.assertEqual({song["id"] for song in groups[0]["songs"]}, {original.id, linked.id, same_track.id})
+        self.assertEqual(groups[0]["suggested_target_id"], linked.id)
+        self.assertNotIn(typed.id, {song["id"] for song in groups[0]["songs"]})
+
+    def test_merge_repoints_items_and_requests_keeping_positions_contiguous(self):
+        target = self._song("Wonderwall", "Oasis")
+        source = self._song("wonderwall", "oasis", chord_url="https://c.example.com/w", duration_ms=258000)
+        other = self._song("Yellow", "Coldplay")
+        both = Setlist.objects.create(user=self.user, name="Ambas")
+        for position, song in enumerate([source, other, target], start=1):
+            SetlistItem.objects.create(setlist=both, song=song, position=position)
+        only_source = Setlist.objects.create(user=self.user, name="So a copia")
+        SetlistItem.objects.create(setlist=only_source, song=source, position=1)
+        AudienceRequest.objects.create(setlist=both, song=source, requested_song_name="wonderwall")
+
+        response = self.client.post(
+            "/api/repertoire/songs/merge/", {"target_id": target.id, "source_ids": [source.id]}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.data["items_repointed"], response.data["items_removed"], response.data["audience_requests_repointed"]),
+            (2, 1, 1),
+        )
+        self.assertEqual(response.data["song"]["chord_url"], "https://c.example.com/w")
+        self.assertFalse(Song.objects.filter(id=source.id).exists())
+        self.assertEqual(
+            list(both.items.values_list("position", "song_id")), [(1, target.id), (2, other.id)]
+        )
+        self.assertEqual(list(only_source.items.values_list("song_id", flat=True)), [target.id])
+        self.assertEqual(AudienceRequest.objects.get(setlist=both).song_id, target.id)
+        self.assertTrue(SyncTombstone.objects.filter(kind=SyncTombstone.KIND_SONG, object_id=source.id).exists())
+
+    def test_merge_rejects_foreign_or_overlapping_songs(self):
+        target = self._song("Wonderwall")
+        foreign = Song.objects.create(user=User.objects.create_user(email="y@example.com", password="strongpass123"), title="Wonderwall")
+        url = "/api/repertoire/songs/merge/"
+        self.assertEqual(self.client.post(url, {"target_id": target.id, "source_ids": [foreign.id]}, format="json").status_code, 404)
+        self.assertEqual(self.client.post(url, {"target_id": target.id, "source_ids": [target.id]}, format="json").status_code, 400)
+        self.assertTrue(Song.objects.filter(id=foreign.id).exists())
+
+
+class StageSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="stage@example.com", password="strongpass123")
+        self.songs = [
+            Song.objects.create(user=self.user, title="Wonderwall", artist="Oasis", duration_ms=258000),
+            Song.objects.create(user=self.user, title="Yellow", artist="Coldplay", chord_url="https://c.example.com/y"),
+        ]
+        self.setlist = Setlist.objects.create(user=self.user, name="Show")
+        self.items = [
+            SetlistItem.objects.create(setlist=self.setlist, song=song, position=position)
+            for position, song in enumerate(self.songs, start=1)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = f"/api/repertoire/setlists/{self.setlist.id}/stage/"
+
+    def _pointer(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        return response.data
+
+    def test_snapshot_is_content_addressed_and_immutable(self):
+        pointer = self._pointer()
+        self.assertTrue(pointer["url"].endswith(f"{self.url}{pointer['digest']}/"))
+
+        response = self.client.get(f"{self.url}{pointer['digest']}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["ETag"], f'"{pointer["digest"]}"')
+        snapshot = json.loads(response.content)
+        self.assertEqual(snapshot["setlist"], {"id": self.setlist.id, "name": "Show"})
+        self.assertEqual(snapshot["fields"], ["item_id", "song_id", "title", "artist", "chord_url", "duration_ms"])
+        self.assertEqual(
+            snapshot["items"],
+            [
+                [self.items[0].id, self.songs[0].id, "Wonderwall", "Oasis", "", 258000],
+                [self.items[1].id, self.songs[1].id, "Yellow", "Coldplay", "https://c.example.com/y", None],
+            ],
+        )
+
+        for if_none_match in (f'"{pointer["digest"]}"', f'"other", W/"{pointer["digest"]}"'):
+            cached = self.client.get(f"{self.url}{pointer['digest']}/", HTTP_IF_NONE_MATCH=if_none_match)
+            self.assertEqual(cached.status_code, 304)
+
+    def test_unchanged_setlist_reuses_cached_snapshot(self):
+        digest = self._pointer()["digest"]
+        with self.assertNumQueries(1):
+            self.assertEqual(self._pointer()["digest"], digest)
+
+    def test_song_or_item_changes_produce_a_new_version(self):
+        first = self._pointer()["digest"]
+        self.client.patch(f"/api/repertoire/songs/{self.songs[1].id}/", {"artist": "Coldplay (Live)"}, format="json")
+        second = self._pointer()["digest"]
+        self.assertNotEqual(second, first)
+
+        self.client.post(f"/api/repertoire/setlists/{self.setlist.id}/reorder/", {"item_ids": [self.items[1].id, self.items[0].id]}, format="json")
+        third = self._pointer()["digest"]
+        self.assertNotEqual(third, second)
+
+        cache.clear()
+        self.assertEqual(self.client.get(f"{self.url}{first}/").status_code, 404)
+        self.assertEqual(self.client.get(f"{self.url}{third}/").status_code, 200)
+
+    def test_other_users_cannot_read_snapshots(self):
+        digest = self._pointer()["digest"]
+        other = APIClient()
+        other.force_authenticate(user=User.objects.create_user(email="intruso@example.com", password="strongpass123"))
+        self.assertEqual(other.get(self.url).status_code, 404)
+        self.assertEqual(other.get(f"{self.url}{digest}/").status_code, 404)
+        self.assertEqual(other.get(f"{self.url}{digest}/", HTTP_IF_NONE_MATCH=f'"{digest}"').status_code, 404)
+
+
+class ValuesSerializerTests(TestCase):
+    """The values()-based read path must render exactly like the ModelSerializer path."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="values@example.com", password="strongpass123")
+        self.songs = [
+            Song.objects.create(user=self.user, title="Evidências", artist="Chitãozinho", duration_ms=270000),
+            Song.objects.create(user=self.user, title="Yellow", chord_url="https://c.example.com/y", spotify_track_id="t1"),
+        ]
+        self.setlist = Setlist.objects.create(user=self.user, name="Show")
+        for position, song in enumerate(self.songs, start=1):
+            SetlistItem.objects.create(setlist=self.setlist, song=song, position=position)
+        AudienceRequest.objects.create(setlist=self.setlist, song=self.songs[0], requested_song_name="evidencias")
+        AudienceRequest.objects.create(setlist=self.setlist, requested_song_name="Fora", requester_name="Bia")
+        self.renderer = FastJSONRenderer()
+
+    def assertRendersSame(self, fast, model_serializer_data):
+        self.assertEqual(self.renderer.render(fast), self.renderer.render(model_serializer_data))
+
+    def test_matches_model_serializers_byte_for_byte(self):
+        setlist = Setlist.objects.prefetch_related("items__song").get(id=self.setlist.id)
+        self.assertRendersSame(
+            setlist_detail_data(Setlist.objects.filter(id=self.setlist.id)), SetlistDetailSerializer(setlist).data
+        )
+
+        queue = AudienceRequest.objects.filter(setlist=self.setlist)
+        self.assertRendersSame(audience_request_values.many(queue), AudienceRequestSerializer(queue, many=True).data)
+
+        songs = Song.objects.filter(user=self.user).order_by("title", "id")
+        self.assertRendersSame(song_values.many(songs), SongSerializer(songs, many=True).data)
+
+    def test_hot_endpoints_use_values_path(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with self.assertNumQueries(2):
+            response = client.get(f"/api/repertoire/setlists/{self.setlist.id}/")
+        self.assertEqual([item["song"]["title"] for item in response.data["items"]], ["Evidências", "Yellow"])
+        missing = client.get("/api/repertoire/setlists/999999/")
+        self.assertEqual(missing.status_code, 404)
+
+        queue = client.get(f"/api/repertoire/setlists/{self.setlist.id}/requests/")
+        self.assertEqual([item["song"] and item["song"]["id"] for item in queue.data["items"]], [None, self.songs[0].id])
+
+
+def _reversed_item_ids(fixture):
+    return {"item_ids": list(reversed(fixture["item_ids"]))}
+
+
+def _bulk_song_operations(song_ids):
+    return {
+        "operations": [
+            *({"op": "update", "id": song_id, "data": {"artist": "Nova banda"}} for song_id in song_ids[:5]),
+            *({"op": "delete", "id": song_id} for song_id in song_ids[5:7]),
+            *({"op": "create", "data": {"title": f"Nova {index}"}} for index in range(3)),
+        ]
+    }
+
+
+# endpoint -> (method, url, payload, max queries). Every entry must cost the same
+# number of queries for a small and a large setlist/queue/library.
+QUERY_BUDGETS = {
+    "song-list": ("get", "/api/repertoire/songs/?page_size=100", None, 2),
+    "setlist-list": ("get", "/api/repertoire/setlists/", None, 1),
+    "setlist-detail": ("get", "/api/repertoire/setlists/{setlist_id}/", None, 2),
+    "setlist-add-item": ("post", "/api/repertoire/setlists/{setlist_id}/items/", lambda f: {"song_id": f["spare_song_id"]}, 8),
+    "setlist-reorder": ("post", "/api/repertoire/setlists/{setlist_id}/reorder/", _reversed_item_ids, 10),
+    "setlist-item-delete": ("delete", "/api/repertoire/items/{first_item_id}/", None, 8),
+    "setlist-audience-requests": ("get", "/api/repertoire/setlists/{setlist_id}/requests/", None, 4),
+    "public-setlist": ("get", "/api/repertoire/public/setlists/{token}/", None, 1),
+    "sync": ("get", "/api/repertoire/sync/", None, 3),
+    "song-bulk": ("post", "/api/repertoire/songs/bulk/", lambda f: _bulk_song_operations(f["song_ids"]), 10),
+    "bootstrap": ("get", "/api/repertoire/bootstrap/", None, 6),
+}
+QUERY_BUDGET_SIZES = (10, 200)
+
+
+class QueryBudgetTests(TestCase):
+    def _build_fixture(self, size):
+        user = User.objects.create(email=f"budget-{User.objects.count()}-{size}@example.com")
+        songs = Song.objects.bulk_create(
+            [Song(user=user, title=f"Song {index}", artist="Band") for index in range(size + 1)]
+        )
+        setlist = Setlist.objects.create(user=user, name=f"Set {size}")
+        items = SetlistItem.objects.bulk_create(
+            [SetlistItem(setlist=setlist, song=song, position=index) for index, song in enumerate(songs[:size], start=1)]
+        )
+        AudienceRequest.objects.bulk_create(
+            [
+                AudienceRequest(setlist=setlist, song=song if index % 2 else None, requested_song_name=song.title)
+                for index, song in enumerate(songs[:size])
+            ]
+        )
+        public_link = SetlistPublicLink.objects.create(setlist=setlist)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client, {
+            "setlist_id": setlist.id,
+            "item_ids": [item.id for item in items],
+            "first_item_id": items[0].id,
+            "spare_song_id": songs[-1].id,
+            "song_ids": [song.id for song in songs],
+            "token": public_link.token,
+        }
+
+    def _count_queries(self, name, size):
+        method, url, payload, _ = QUERY_BUDGETS[name]
+        client, fixture = self._build_fixture(size)
+        data = payload(fixture) if payload else None
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(url.format(**fixture), data, format="json")
+        self.assertLess(response.status_code, 400, f"{name}: {response.status_code}")
+        return len(queries)
+
+    def test_endpoints_stay_within_constant_query_budgets(self):
+        for name, (_, _, _, max_queries) in QUERY_BUDGETS.items():
+            with self.subTest(endpoint=name):
+                small, large = (self._count_queries(name, size) for size in QUERY_BUDGET_SIZES)
+                self.assertEqual(small, large, f"{name}: {small} queries for {QUERY_BUDGET_SIZES[0]} rows, {large} for {QUERY_BUDGET_SIZES[1]}")
+                self.assertLessEqual(large, max_queries, f"{name}: {large} queries, budget {max_queries}")
+
+
+class SimulateGigCommandTests(TransactionTestCase):
+    """Smoke run of the load simulator against the in-process app; worker threads need committed fixtures."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_short_run_reports_every_endpoint_and_cleans_up(self):
+        output = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            report_path = os.path.join(directory, "gig.json")
+            call_command(
+                "simulate_gig",
+                "--audience=2",
+                "--musicians=1",
+                "--duration=0.5",
+                "--songs=3",
+                "--think-time=0.05",
+                "--post-every=0.1",
+                "--poll-interval=0.1",
+                f"--output={report_path}",
+                stdout=output,
+            )
+            with open(report_path, encoding="utf-8") as report_file:
+                report = json.load(report_file)
+
+        text = output.getvalue()
+        self.assertIn("Simulando 2 pessoas do publico e 1 dispositivos", text)
+        self.assertIn("requests em", text)
+        self.assertEqual(
+            set(report["endpoints"]), {"public_setlist", "public_request_create", "musician_queue_poll"}
+        )
+        self.assertGreater(report["total_requests"], 0)
+        self.assertIn("200", report["endpoints"]["public_setlist"]["statuses"])
+        self.assertFalse(User.objects.filter(email__startswith="gig-sim-").exists())
@@ -1,6 +1,10 @@
 from django.urls import path
 
 from .views import (
+    BootstrapView,
+    LibraryExportView,
+    LibraryImportView,
+    MutationReplayView,
     PublicAudienceRequestCreateView,
     PublicSetlistView,
     SetlistAddItemView,
@@ -10,19 +14,41 @@ from .views import (
     SetlistListCreateView,
     SetlistPublicLinkView,
     SetlistReorderView,
+    SongBulkView,
     SongDetailView,
+    SongDuplicatesView,
+    SongImportView,
     SongListCreateView,
+    SongMergeView,
+    StageSnapshotBodyView,
+    StageSnapshotView,
+    SyncView,
 )
 
 urlpatterns = [
     path("songs/", SongListCreateView.as_view(), name="song-list-create"),
+    path("songs/bulk/", SongBulkView.as_view(), name="song-bulk"),
+    path("songs/duplicates/", SongDuplicatesView.as_view(), name="song-duplicates"),
+    path("songs/merge/", SongMergeView.as_view(), name="song-merge"),
+    path("songs/import/", SongImportView.as_view(), name="song-import"),
     path("songs/<int:pk>/", SongDetailView.as_view(), name="song-detail"),
     path("setlists/", SetlistListCreateView.as_view(), name="setlist-list-create"),
     path("setlists/<int:pk>/", SetlistDetailView.as_view(), name="setlist-detail"),
     path("setlists/<int:setlist_id>/items/", SetlistAddItemView.as_view(), name="setlist-add-item"),
     path("setlists/<int:setlist_id>/reorder/", SetlistReorderView.as_view(), name="setlist-reorder"),
+    path("setlists/<int:setlist_id>/stage/", StageSnapshotView.as_view(), name="setlist-stage-snapshot"),
+    path(
+        "setlists/<int:setlist_id>/stage/<str:digest>/",
+        StageSnapshotBodyView.as_view(),
+        name="setlist-stage-snapshot-body",
+    ),
     path("setlists/<int:setlist_id>/audience-link/", SetlistPublicLinkView.as_view(), name="setlist-audience-link"),
     path("setlists/<int:setlist_id>/requests/", SetlistAudienceRequestsView.as_view(), name="setlist-audience-requests"),
+    path("library/export/", LibraryExportView.as_view(), name="library-export"),
+    path("library/import/", LibraryImportView.as_view(), name="library-import"),
+    path("bootstrap/", BootstrapView.as_view(), name="bootstrap"),
+    path("sync/", SyncView.as_view(), name="sync"),
+    path("mutations/", MutationReplayView.as_view(), name="mutation-replay"),
     path("items/<int:item_id>/", SetlistItemDeleteView.as_view(), name="setlist-item-delete"),
     path("public/setlists/<str:token>/", PublicSetlistView.as_view(), name="public-setlist"),
     path("public/setlists/<str:token>/requests/", PublicAudienceRequestCreateView.as_view(), name="public-request-create"),
@@ -1,28 +1,83 @@
+import hashlib
+import io
+import uuid
+from datetime import timedelta
+
 from django.conf import settings
 from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
 from django.core.paginator import Paginator
-from django.db import transaction
-from django.db.models import Max
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
 from django.db.models import Q
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import parse_etags
+from django.utils.dateparse import parse_datetime
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import APIException, ParseError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import AudienceRequest, Setlist, SetlistItem, SetlistPublicLink, Song
+from apps.spotify.models import SpotifyConnection
+from apps.spotify.views import connection_status
+from apps.users.serializers import UserSerializer
+from config.idempotency import (
+    REPLAYED_HEADER,
+    IdempotentAPIViewMixin,
+    IdempotentReplay,
+    abegin_idempotent_request,
+)
+from config.parsers import FastJSONParser
+from config.renderers import FastJSONRenderer
+
+from .backup import BackupFormatError, LibraryImport, aiter_library_export, iter_library_export
+from .bulk import apply_song_operations
+from .duplicates import find_duplicate_groups, merge_songs, suggested_merge_target
+from .fast_serializers import audience_request_values, setlist_detail_data, song_values
+from .importers import iter_song_rows, normalize_song_key, open_text_upload
+from .mutations import MutationReplay
+from .models import (
+    POSITION_SHIFT_OFFSET,
+    AudienceRequest,
+    Setlist,
+    SetlistItem,
+    SetlistPublicLink,
+    Song,
+    SyncTombstone,
+)
 from .serializers import (
     AddSetlistItemSerializer,
     AudienceRequestSerializer,
+    LibraryImportSerializer,
+    MutationReplaySerializer,
     PublicAudienceRequestCreateSerializer,
     PublicSetlistSerializer,
     ReorderSetlistSerializer,
     SetlistDetailSerializer,
     SetlistSerializer,
+    SongBulkSerializer,
+    SongImportSerializer,
+    SongMergeSerializer,
     SongSerializer,
+    SyncSetlistItemSerializer,
 )
+from .stage import current_stage_snapshot, stage_snapshot_body
 
 SHORT_RATE_WINDOW_SECONDS = 15
 LONG_RATE_WINDOW_SECONDS = 10 * 60
 LONG_RATE_MAX_REQUESTS = 20
+AUDIENCE_COOKIE_SALT = "repertoire.audience"
+IMPORT_MAX_LINES = 10000
+IMPORT_BATCH_SIZE = 1000
+# A change committed just before the cursor was taken can become visible after
+# it; re-sending that window is harmless because the client applies upserts.
+SYNC_CURSOR_OVERLAP = timedelta(seconds=5)
+STAGE_SNAPSHOT_MAX_AGE = 365 * 24 * 60 * 60
 
 
 def _client_ip(request):
@@ -32,25 +87,56 @@ def _client_ip(request):
     return request.META.get("REMOTE_ADDR", "")
 
 
-def _ensure_session_key(request):
-    if not request.session.session_key:
-        request.session.save()
-    return request.session.session_key or ""
-
-
 def _public_url_for_token(request, token):
     if settings.FRONTEND_PUBLIC_URL:
         return f"{settings.FRONTEND_PUBLIC_URL}/public/{token}"
     return request.build_absolute_uri(f"/public/{token}")
 
 
+def _song_page_size(request):
+    try:
+        page_size_raw = int(request.query_params.get("page_size", 30) or 30)
+    except (TypeError, ValueError):
+        page_size_raw = 30
+    return min(max(page_size_raw, 1), 100)
+
+
+def _song_page(queryset, page, page_size):
+    paginator = Paginator(queryset.values_list(*song_values.columns), page_size)
+    page_obj = paginator.get_page(page)
+    return {
+        "items": [song_values.to_representation(row) for row in page_obj.object_list],
+        "page": page_obj.number,
+        "page_size": page_size,
+        "total": paginator.count,
+        "has_previous": page_obj.has_previous(),
+        "has_next": page_obj.has_next(),
+    }
+
+
+def _record_tombstones(user, kind, object_ids):
+    SyncTombstone.objects.bulk_create(
+        [SyncTombstone(user=user, kind=kind, object_id=object_id) for object_id in object_ids]
+    )
+
+
+def _etag_matches(request, etag):
+    # Weak comparison over the If-None-Match list: ResponseCompressionMiddleware
+    # sends strong ETags back as W/"...", and clients echo that form.
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    return any(candidate == "*" or candidate.removeprefix("W/") == opaque for candidate in parse_etags(if_none_match))
+
+
 def _queue_etag(setlist_id, count, latest_id, latest_created_at):
     latest_part = latest_created_at.isoformat() if latest_created_at else "none"
     latest_id_part = latest_id or 0
     return f'W/"setlist-{setlist_id}-count-{count}-latest-{latest_id_part}-{latest_part}"'
 
 
-class SongListCreateView(generics.ListCreateAPIView):
+class SongListCreateView(IdempotentAPIViewMixin, generics.ListCreateAPIView):
     serializer_class = SongSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -62,44 +148,182 @@ class SongListCreateView(generics.ListCreateAPIView):
         return queryset.order_by("title", "id")
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
         try:
             page = max(int(request.query_params.get("page", 1) or 1), 1)
         except (TypeError, ValueError):
             page = 1
-        try:
-            page_size_raw = int(request.query_params.get("page_size", 30) or 30)
-        except (TypeError, ValueError):
-            page_size_raw = 30
-        page_size = min(max(page_size_raw, 1), 100)
+        return Response(_song_page(self.get_queryset(), page, _song_page_size(request)))
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class SongBulkView(IdempotentAPIViewMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = SongBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = apply_song_operations(request.user, serializer.validated_data["operations"])
+        return Response({"results": results})
+
+
+class SongDuplicatesView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
-        paginator = Paginator(queryset, page_size)
-        page_obj = paginator.get_page(page)
-        items = self.get_serializer(page_obj.object_list, many=True).data
+    def get(self, request):
+        groups = find_duplicate_groups(request.user)
         return Response(
             {
-                "items": items,
-                "page": page_obj.number,
-                "page_size": page_size,
-                "total": paginator.count,
-                "has_previous": page_obj.has_previous(),
-                "has_next": page_obj.has_next(),
+                "groups": [
+                    {"suggested_target_id": suggested_merge_target(group).id, "songs": SongSerializer(group, many=True).data}
+                    for group in groups
+                ]
             }
         )
 
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+
+class SongMergeView(IdempotentAPIViewMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = SongMergeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        target_id = serializer.validated_data["target_id"]
+        source_ids = serializer.validated_data["source_ids"]
+
+        songs = Song.objects.filter(user=request.user, id__in=[target_id, *source_ids]).in_bulk()
+        if len(songs) != len(source_ids) + 1:
+            return Response({"detail": "Musica nao encontrada."}, status=status.HTTP_404_NOT_FOUND)
+
+        target = songs[target_id]
+        result = merge_songs(request.user, target, [songs[song_id] for song_id in source_ids])
+        return Response({**result, "song": SongSerializer(target).data})
 
 
-class SongDetailView(generics.RetrieveUpdateDestroyAPIView):
+class SongImportView(IdempotentAPIViewMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = SongImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        uploaded_file = serializer.validated_data.get("file")
+        setlist_name = serializer.validated_data.get("setlist_name", "").strip()
+
+        if uploaded_file:
+            rows = iter_song_rows(open_text_upload(uploaded_file), uploaded_file.name)
+        else:
+            rows = iter_song_rows(io.StringIO(serializer.validated_data["text"]))
+
+        library = {
+            normalize_song_key(title, artist): song_id
+            for song_id, title, artist in Song.objects.filter(user=request.user).values_list("id", "title", "artist")
+        }
+        pending_songs = {}
+        pending_item_keys = []
+        setlist_keys = set()
+        next_position = 1
+        counts = {"lines_total": 0, "lines_skipped": 0, "songs_created": 0, "songs_reused": 0}
+
+        def flush():
+            nonlocal next_position
+            if pending_songs:
+                created = Song.objects.bulk_create(list(pending_songs.values()), batch_size=IMPORT_BATCH_SIZE)
+                for key, song in zip(pending_songs.keys(), created):
+                    library[key] = song.id
+                pending_songs.clear()
+            if pending_item_keys:
+                items = []
+                for key in pending_item_keys:
+                    items.append(SetlistItem(setlist=setlist, song_id=library[key], position=next_position))
+                    next_position += 1
+                SetlistItem.objects.bulk_create(items, batch_size=IMPORT_BATCH_SIZE)
+                pending_item_keys.clear()
+
+        with transaction.atomic():
+            setlist = Setlist.objects.create(user=request.user, name=setlist_name) if setlist_name else None
+
+            for title, artist in rows:
+                counts["lines_total"] += 1
+                if counts["lines_total"] > IMPORT_MAX_LINES:
+                    transaction.set_rollback(True)
+                    return Response(
+                        {"detail": f"Arquivo excede o limite de {IMPORT_MAX_LINES} linhas."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                if not title:
+                    counts["lines_skipped"] += 1
+                    continue
+
+                key = normalize_song_key(title, artist)
+                if key in library or key in pending_songs:
+                    counts["songs_reused"] += 1
+                else:
+                    pending_songs[key] = Song(user=request.user, title=title, artist=artist)
+                    counts["songs_created"] += 1
+
+                if setlist and key not in setlist_keys:
+                    setlist_keys.add(key)
+                    pending_item_keys.append(key)
+
+                if len(pending_songs) >= IMPORT_BATCH_SIZE or len(pending_item_keys) >= IMPORT_BATCH_SIZE:
+                    flush()
+
+            flush()
+
+        return Response(
+            {
+                **counts,
+                "setlist_id": setlist.id if setlist else None,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class LibraryExportView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if isinstance(request._request, ASGIRequest):
+            chunks = aiter_library_export(request.user)
+        else:
+            chunks = iter_library_export(request.user)
+        response = StreamingHttpResponse(chunks, content_type="application/x-ndjson")
+        response["Content-Disposition"] = 'attachment; filename="setlive-library.ndjson"'
+        response["Cache-Control"] = "no-store"
+        return response
+
+
+class LibraryImportView(IdempotentAPIViewMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = LibraryImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            counts = LibraryImport(request.user).run(serializer.validated_data["file"])
+        except BackupFormatError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except IntegrityError:
+            return Response({"detail": "Backup com dados inconsistentes."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(counts, status=status.HTTP_201_CREATED)
+
+
+class SongDetailView(IdempotentAPIViewMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = SongSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         return Song.objects.filter(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            _record_tombstones(self.request.user, SyncTombstone.KIND_SONG, [instance.id])
+            instance.delete()
+
 
-class SetlistListCreateView(generics.ListCreateAPIView):
+class SetlistListCreateView(IdempotentAPIViewMixin, generics.ListCreateAPIView):
     serializer_class = SetlistSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -110,7 +334,7 @@ class SetlistListCreateView(generics.ListCreateAPIView):
         serializer.save(user=self.request.user)
 
 
-class SetlistDetailView(generics.RetrieveUpdateDestroyAPIView):
+class SetlistDetailView(IdempotentAPIViewMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -121,12 +345,30 @@ class SetlistDetailView(generics.RetrieveUpdateDestroyAPIView):
             return SetlistDetailSerializer
         return SetlistSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        data = setlist_detail_data(Setlist.objects.filter(user=request.user, pk=kwargs["pk"]))
+        if data is None:
+            raise Http404(f"No {Setlist._meta.object_name} matches the given query.")
+        return Response(data)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            _record_tombstones(self.request.user, SyncTombstone.KIND_SETLIST, [instance.id])
+            instance.delete()
+
+
+def _locked_setlist(user, setlist_id):
+    # Writers that renumber items hold the setlist row until they commit, so
+    # they (and offline mutation replays) apply one after the other.
+    return Setlist.objects.select_for_update().filter(user=user, id=setlist_id).first()
+
 
-class SetlistAddItemView(APIView):
+class SetlistAddItemView(IdempotentAPIViewMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @transaction.atomic
     def post(self, request, setlist_id):
-        setlist = Setlist.objects.filter(user=request.user, id=setlist_id).first()
+        setlist = _locked_setlist(request.user, setlist_id)
         if not setlist:
             return Response({"detail": "Repertorio nao encontrado."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -155,11 +397,12 @@ class SetlistAddItemView(APIView):
         )
 
 
-class SetlistReorderView(APIView):
+class SetlistReorderView(IdempotentAPIViewMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @transaction.atomic
     def post(self, request, setlist_id):
-        setlist = Setlist.objects.filter(user=request.user, id=setlist_id).first()
+        setlist = _locked_setlist(request.user, setlist_id)
         if not setlist:
             return Response({"detail": "Repertorio nao encontrado."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -179,45 +422,199 @@ class SetlistReorderView(APIView):
             return Response({"detail": "Lista de itens invalida."}, status=status.HTTP_400_BAD_REQUEST)
 
         item_map = {item.id: item for item in items}
-        with transaction.atomic():
-            offset = len(items) + 1000
-            for temp_index, item_id in enumerate(item_ids, start=1):
-                item = item_map[item_id]
-                item.position = offset + temp_index
-                item.save(update_fields=["position"])
-
-            for position, item_id in enumerate(item_ids, start=1):
-                item = item_map[item_id]
-                item.position = position
-                item.save(update_fields=["position"])
-            setlist.save(update_fields=["updated_at"])
-
-        setlist.refresh_from_db()
+        ordered_items = [item_map[item_id] for item_id in item_ids]
+        # Two set-based passes through a temporary range keep uniq_setlist_position valid.
+        offset = len(items) + 1000
+        for temp_index, item in enumerate(ordered_items, start=1):
+            item.position = offset + temp_index
+        SetlistItem.objects.bulk_update(ordered_items, ["position"])
+
+        now = timezone.now()
+        for position, item in enumerate(ordered_items, start=1):
+            item.position = position
+            item.updated_at = now
+        SetlistItem.objects.bulk_update(ordered_items, ["position", "updated_at"])
+        setlist.save(update_fields=["updated_at"])
+
+        setlist = Setlist.objects.prefetch_related("items__song").get(id=setlist.id)
         return Response(SetlistDetailSerializer(setlist).data)
 
 
-class SetlistItemDeleteView(APIView):
+class SetlistItemDeleteView(IdempotentAPIViewMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @transaction.atomic
     def delete(self, request, item_id):
-        item = SetlistItem.objects.filter(id=item_id, setlist__user=request.user).select_related("setlist").first()
+        item = (
+            SetlistItem.objects.filter(id=item_id, setlist__user=request.user)
+            .select_related("setlist")
+            .select_for_update(of=("setlist",))
+            .first()
+        )
         if not item:
             return Response({"detail": "Item nao encontrado."}, status=status.HTTP_404_NOT_FOUND)
 
         setlist = item.setlist
         removed_position = item.position
 
-        with transaction.atomic():
-            item.delete()
-            remaining = SetlistItem.objects.filter(setlist=setlist, position__gt=removed_position).order_by("position", "id")
-            for next_item in remaining:
-                next_item.position -= 1
-                next_item.save(update_fields=["position"])
-            setlist.save(update_fields=["updated_at"])
+        _record_tombstones(request.user, SyncTombstone.KIND_ITEM, [item.id])
+        item.delete()
+        remaining = SetlistItem.objects.filter(setlist=setlist, position__gt=removed_position)
+        remaining.update(position=F("position") + POSITION_SHIFT_OFFSET)
+        SetlistItem.objects.filter(setlist=setlist, position__gt=POSITION_SHIFT_OFFSET).update(
+            position=F("position") - POSITION_SHIFT_OFFSET - 1, updated_at=timezone.now()
+        )
+        setlist.save(update_fields=["updated_at"])
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class SyncView(APIView):
+    """Songs, setlists and items changed since `?since=<cursor>`, plus tombstones.
+
+    Without `since` the whole library is returned. Tombstones are only written
+    for the object the user deleted: items of a deleted setlist or song are
+    dropped by the client along with their parent.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        cursor = timezone.now()
+        since_raw = request.query_params.get("since", "").strip()
+        since = None
+        if since_raw:
+            since = parse_datetime(since_raw)
+            if since is None or timezone.is_naive(since):
+                return Response({"detail": "Cursor invalido."}, status=status.HTTP_400_BAD_REQUEST)
+            since -= SYNC_CURSOR_OVERLAP
+
+        songs = Song.objects.filter(user=request.user)
+        setlists = Setlist.objects.filter(user=request.user)
+        items = SetlistItem.objects.filter(setlist__user=request.user)
+        deleted = {SyncTombstone.KIND_SONG: [], SyncTombstone.KIND_SETLIST: [], SyncTombstone.KIND_ITEM: []}
+        if since is not None:
+            songs = songs.filter(updated_at__gt=since)
+            setlists = setlists.filter(updated_at__gt=since)
+            items = items.filter(updated_at__gt=since)
+            tombstones = SyncTombstone.objects.filter(user=request.user, deleted_at__gt=since)
+            for kind, object_id in tombstones.values_list("kind", "object_id"):
+                deleted[kind].append(object_id)
+
+        return Response(
+            {
+                "cursor": cursor.isoformat(),
+                "full": since is None,
+                "songs": SongSerializer(songs.order_by("id"), many=True).data,
+                "setlists": SetlistSerializer(setlists.order_by("id"), many=True).data,
+                "items": SyncSetlistItemSerializer(items.order_by("setlist_id", "position"), many=True).data,
+                "deleted": {
+                    "songs": deleted[SyncTombstone.KIND_SONG],
+                    "setlists": deleted[SyncTombstone.KIND_SETLIST],
+                    "items": deleted[SyncTombstone.KIND_ITEM],
+                },
+            }
+        )
+
+
+class MutationReplayView(IdempotentAPIViewMixin, APIView):
+    """Applies the client's queued offline mutations in one round trip; see MutationReplay."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = MutationReplaySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            payload = MutationReplay(request.user).run(serializer.validated_data["mutations"])
+        except IntegrityError:
+            # Another replay of the same mutation ids committed first; retrying returns its receipts.
+            return Response(
+                {"detail": "Sincronizacao concorrente em andamento. Tente novamente."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(payload)
+
+
+class BootstrapView(APIView):
+    """Everything the home screen needs on launch, in one response and a fixed number of queries.
+
+    `?setlist=<id>` picks the active setlist (defaults to the most recently
+    updated one) and `?page_size=` sizes the first song page. The weak ETag is
+    a hash of the payload, so an unchanged library answers 304.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        setlists = list(Setlist.objects.filter(user=request.user).order_by("-updated_at", "-id"))
+        try:
+            requested_id = int(request.query_params.get("setlist", 0) or 0)
+        except (TypeError, ValueError):
+            requested_id = 0
+        active = next((setlist for setlist in setlists if setlist.id == requested_id), setlists[0] if setlists else None)
+
+        payload = {
+            "user": UserSerializer(request.user).data,
+            "setlists": SetlistSerializer(setlists, many=True).data,
+            "songs": _song_page(Song.objects.filter(user=request.user).order_by("title", "id"), 1, _song_page_size(request)),
+            "spotify": connection_status(SpotifyConnection.objects.filter(user=request.user).first()),
+            "active_setlist": setlist_detail_data(Setlist.objects.filter(id=active.id)) if active else None,
+        }
+
+        digest = hashlib.sha1(FastJSONRenderer().render(payload)).hexdigest()
+        etag = f'W/"bootstrap-{digest}"'
+        if _etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(payload)
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"
+        return response
+
+
+class StageSnapshotView(APIView):
+    """Points at the current stage snapshot of a setlist; the snapshot itself is immutable."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, setlist_id):
+        snapshot = current_stage_snapshot(request.user, setlist_id)
+        if snapshot is None:
+            return Response({"detail": "Repertorio nao encontrado."}, status=status.HTTP_404_NOT_FOUND)
+
+        digest = snapshot[0]
+        response = Response(
+            {
+                "digest": digest,
+                "url": request.build_absolute_uri(
+                    reverse("setlist-stage-snapshot-body", kwargs={"setlist_id": setlist_id, "digest": digest})
+                ),
+            }
+        )
+        response["Cache-Control"] = "no-cache"
+        return response
+
+
+class StageSnapshotBodyView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, setlist_id, digest):
+        # The lookup is scoped to the user, so it runs before the conditional
+        # check: a 304 must not confirm that someone else's version exists.
+        body = stage_snapshot_body(request.user, setlist_id, digest)
+        if body is None:
+            return Response({"detail": "Versao do modo palco nao encontrada."}, status=status.HTTP_404_NOT_FOUND)
+        etag = f'"{digest}"'
+        if _etag_matches(request, etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        response["Cache-Control"] = f"private, max-age={STAGE_SNAPSHOT_MAX_AGE}, immutable"
+        return response
+
+
 class SetlistPublicLinkView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -245,14 +642,14 @@ class SetlistAudienceRequestsView(APIView):
         if not setlist:
             return Response({"detail": "Repertorio nao encontrado."}, status=status.HTTP_404_NOT_FOUND)
 
-        queue = AudienceRequest.objects.filter(setlist=setlist).select_related("song")
+        queue = AudienceRequest.objects.filter(setlist=setlist)
         queue_count = queue.count()
         latest = queue.values("id", "created_at").first()
         latest_id = latest["id"] if latest else None
         latest_created_at = latest["created_at"] if latest else None
         etag = _queue_etag(setlist.id, queue_count, latest_id, latest_created_at)
 
-        if request.headers.get("If-None-Match") == etag:
+        if _etag_matches(request, etag):
             not_modified = Response(status=status.HTTP_304_NOT_MODIFIED)
             not_modified["ETag"] = etag
             not_modified["Cache-Control"] = "no-cache"
@@ -262,7 +659,7 @@ class SetlistAudienceRequestsView(APIView):
             {
                 "setlist_id": setlist.id,
                 "count": queue_count,
-                "items": AudienceRequestSerializer(queue, many=True).data,
+                "items": audience_request_values.many(queue),
             }
         )
         response["ETag"] = etag
@@ -270,79 +667,141 @@ class SetlistAudienceRequestsView(APIView):
         return response
 
 
-class PublicSetlistView(APIView):
-    permission_classes = [permissions.AllowAny]
+def _json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(FastJSONRenderer().render(data), status=status_code, content_type="application/json")
 
-    def get(self, request, token):
-        public_link = (
-            SetlistPublicLink.objects.filter(token=token, is_active=True)
-            .select_related("setlist")
-            .first()
-        )
+
+def _request_payload(request):
+    if request.content_type == "application/json":
+        return FastJSONParser().parse(io.BytesIO(request.body), parser_context={"encoding": request.encoding or settings.DEFAULT_CHARSET})
+    return request.POST
+
+
+def _audience_id(request):
+    """Rate-limit identity from a signed cookie, so a new audience member costs no write."""
+    audience_id = request.get_signed_cookie(settings.AUDIENCE_COOKIE_NAME, default="", salt=AUDIENCE_COOKIE_SALT)
+    if audience_id:
+        return audience_id, False
+    return uuid.uuid4().hex, True
+
+
+def _set_audience_cookie(response, audience_id):
+    response.set_signed_cookie(
+        settings.AUDIENCE_COOKIE_NAME,
+        audience_id,
+        salt=AUDIENCE_COOKIE_SALT,
+        max_age=settings.AUDIENCE_COOKIE_MAX_AGE,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite="Lax",
+    )
+
+
+async def _aactive_public_link(token):
+    return await SetlistPublicLink.objects.filter(token=token, is_active=True).select_related("setlist").afirst()
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class PublicSetlistView(View):
+    """Audience endpoint served natively async under ASGI (see config/asgi.py)."""
+
+    http_method_names = ["get", "options"]
+
+    async def get(self, request, token):
+        public_link = await _aactive_public_link(token)
         if not public_link:
-            return Response({"detail": "Link publico invalido."}, status=status.HTTP_404_NOT_FOUND)
+            return _json_response({"detail": "Link publico invalido."}, status.HTTP_404_NOT_FOUND)
 
-        return Response(PublicSetlistSerializer(public_link.setlist).data)
+        return _json_response(PublicSetlistSerializer(public_link.setlist).data)
 
 
-class PublicAudienceRequestCreateView(APIView):
-    permission_classes = [permissions.AllowAny]
+@method_decorator(csrf_exempt, name="dispatch")
+class PublicAudienceRequestCreateView(View):
+    http_method_names = ["post", "options"]
 
-    def post(self, request, token):
-        public_link = SetlistPublicLink.objects.filter(token=token, is_active=True).select_related("setlist").first()
+    async def post(self, request, token):
+        try:
+            record = await abegin_idempotent_request(request, f"public:{token}")
+        except IdempotentReplay as replay:
+            response = _json_response(replay.data, replay.status_code)
+            response[REPLAYED_HEADER] = "true"
+            return response
+        except APIException as exc:
+            return _json_response({"detail": exc.detail}, exc.status_code)
+
+        audience_id, is_new_audience = _audience_id(request)
+        try:
+            data, status_code = await self._create(request, token, audience_id)
+        except BaseException:
+            if record is not None:
+                await record.arelease()
+            raise
+        if record is not None:
+            await record.afinish(status_code, data)
+        response = _json_response(data, status_code)
+        if is_new_audience:
+            _set_audience_cookie(response, audience_id)
+        return response
+
+    async def _create(self, request, token, audience_id):
+        public_link = await _aactive_public_link(token)
         if not public_link:
-            return Response({"detail": "Link publico invalido."}, status=status.HTTP_404_NOT_FOUND)
+            return {"detail": "Link publico invalido."}, status.HTTP_404_NOT_FOUND
 
         setlist = public_link.setlist
-        serializer = PublicAudienceRequestCreateSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        try:
+            payload = _request_payload(request)
+        except ParseError as exc:
+            return {"detail": exc.detail}, status.HTTP_400_BAD_REQUEST
+        serializer = PublicAudienceRequestCreateSerializer(data=payload)
+        if not serializer.is_valid():
+            return serializer.errors, status.HTTP_400_BAD_REQUEST
 
         requested_song_name = serializer.validated_data["song_name"].strip()
         requester_name = serializer.validated_data.get("requester_name", "").strip()
         if not requested_song_name:
-            return Response({"detail": "Nome da musica e obrigatorio."}, status=status.HTTP_400_BAD_REQUEST)
+            return {"detail": "Nome da musica e obrigatorio."}, status.HTTP_400_BAD_REQUEST
 
-        matched_song = (
+        matched_song = await (
             Song.objects.filter(setlist_items__setlist=setlist, title__iexact=requested_song_name)
             .order_by("id")
-            .first()
+            .afirst()
         )
 
         client_ip = _client_ip(request)
-        session_key = _ensure_session_key(request)
-        short_key = f"audience:short:{setlist.id}:{client_ip}:{session_key}"
-        long_key = f"audience:long:{setlist.id}:{client_ip}:{session_key}"
+        short_key = f"audience:short:{setlist.id}:{client_ip}:{audience_id}"
+        long_key = f"audience:long:{setlist.id}:{client_ip}:{audience_id}"
 
-        if cache.get(short_key):
-            return Response(
+        if await cache.aget(short_key):
+            return (
                 {"detail": f"Espere {SHORT_RATE_WINDOW_SECONDS}s antes de enviar novo pedido."},
-                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                status.HTTP_429_TOO_MANY_REQUESTS,
             )
 
-        if cache.add(long_key, 1, timeout=LONG_RATE_WINDOW_SECONDS):
+        if await cache.aadd(long_key, 1, timeout=LONG_RATE_WINDOW_SECONDS):
             request_count = 1
         else:
             try:
-                request_count = cache.incr(long_key)
+                request_count = await cache.aincr(long_key)
             except ValueError:
-                cache.set(long_key, 1, timeout=LONG_RATE_WINDOW_SECONDS)
+                await cache.aset(long_key, 1, timeout=LONG_RATE_WINDOW_SECONDS)
                 request_count = 1
 
         if request_count > LONG_RATE_MAX_REQUESTS:
-            return Response(
+            return (
                 {"detail": "Limite de pedidos excedido. Tente novamente mais tarde."},
-                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                status.HTTP_429_TOO_MANY_REQUESTS,
             )
 
-        cache.set(short_key, 1, timeout=SHORT_RATE_WINDOW_SECONDS)
+        await cache.aset(short_key, 1, timeout=SHORT_RATE_WINDOW_SECONDS)
 
-        audience_request = AudienceRequest.objects.create(
+        audience_request = await AudienceRequest.objects.acreate(
             setlist=setlist,
             song=matched_song,
             requested_song_name=requested_song_name,
             requester_name=requester_name,
             ip_address=client_ip or None,
-            session_key=session_key,
+            session_key=audience_id,
         )
 
-        return Response(AudienceRequestSerializer(audience_request).data, status=status.HTTP_201_CREATED)
+        return AudienceRequestSerializer(audience_request).data, status.HTTP_201_CREATED
@@ -0,0 +1,419 @@
+import base64
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import requests
+from django.core.cache import cache
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+SPOTIFY_AUTHORIZE_URL = "https://accounts.spotify.com/authorize"
+# Overridable so jobs and tests can run against a local fake Spotify server.
+SPOTIFY_TOKEN_URL = os.getenv("SPOTIFY_TOKEN_URL", "https://accounts.spotify.com/api/token")
+SPOTIFY_API_BASE = os.getenv("SPOTIFY_API_BASE", "https://api.spotify.com/v1").rstrip("/")
+
+TRACKS_BATCH_SIZE = 50
+SEARCH_CACHE_TIMEOUT_SECONDS = 24 * 60 * 60
+MAX_RATE_LIMIT_RETRIES = 3
+REQUEST_BUDGET_SECONDS = float(os.getenv("SPOTIFY_REQUEST_BUDGET_SECONDS", "8"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("SPOTIFY_BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("SPOTIFY_BREAKER_RESET_SECONDS", "30"))
+CATALOG_CACHE_SIZE = int(os.getenv("SPOTIFY_CATALOG_CACHE_SIZE", "2000"))
+CATALOG_CACHE_TTL_SECONDS = float(os.getenv("SPOTIFY_CATALOG_CACHE_TTL_SECONDS", str(6 * 60 * 60)))
+CATALOG_SEARCH_LIMIT = 10
+
+_app_token = {"access_token": "", "expires_at": 0.0}
+_app_token_lock = threading.Lock()
+_deadline = threading.local()
+
+
+class SpotifyUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Spotify indisponivel no momento. Tente novamente em instantes."
+    default_code = "spotify_unavailable"
+
+
+class CircuitBreaker:
+    """Per-process breaker: opens after consecutive failures, lets one probe through after the reset window."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._opened_at = 0.0
+            self._probe_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            if self._probe_in_flight:
+                return False
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def snapshot(self):
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures}
+
+
+breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+
+
+class TTLCache:
+    """Thread-safe in-process LRU with a per-entry TTL."""
+
+    def __init__(self, maxsize, ttl_seconds):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Catalog results are user-independent, so one process-wide cache serves every user.
+catalog_search_cache = TTLCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL_SECONDS)
+catalog_track_cache = TTLCache(CATALOG_CACHE_SIZE * CATALOG_SEARCH_LIMIT, CATALOG_CACHE_TTL_SECONDS)
+
+
+@contextmanager
+def request_deadline(seconds=None):
+    """Bound the total time spent talking to Spotify while handling one request."""
+    previous = getattr(_deadline, "at", None)
+    _deadline.at = time.monotonic() + (REQUEST_BUDGET_SECONDS if seconds is None else seconds)
+    try:
+        yield
+    finally:
+        _deadline.at = previous
+
+
+def _remaining_budget():
+    deadline_at = getattr(_deadline, "at", None)
+    if deadline_at is None:
+        return None
+    return deadline_at - time.monotonic()
+
+
+def _request(method, url, timeout, **kwargs):
+    remaining = _remaining_budget()
+    if remaining is not None:
+        if remaining <= 0:
+            raise SpotifyUnavailable("Tempo limite para consultar o Spotify excedido.")
+        timeout = min(timeout, remaining)
+
+    if not breaker.allow_request():
+        raise SpotifyUnavailable()
+
+    try:
+        response = getattr(requests, method)(url, timeout=timeout, **kwargs)
+    except requests.RequestException as exc:
+        breaker.record_failure()
+        raise SpotifyUnavailable() from exc
+
+    if response.status_code >= 500:
+        breaker.record_failure()
+        raise SpotifyUnavailable()
+    if response.status_code == 429:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
+
+def spotify_client_credentials():
+    client_id = os.getenv("SPOTIFY_CLIENT_ID", "")
+    client_secret = os.getenv("SPOTIFY_CLIENT_SECRET", "")
+    if not client_id or not client_secret:
+        raise serializers.ValidationError("Spotify nao configurado no servidor.")
+    return client_id, client_secret
+
+
+def auth_headers(access_token):
+    return {"Authorization": f"Bearer {access_token}"}
+
+
+def token_request(data):
+    client_id, client_secret = spotify_client_credentials()
+    basic = base64.b64encode(f"{client_id}:{client_secret}".encode("utf-8")).decode("utf-8")
+    headers = {
+        "Authorization": f"Basic {basic}",
+        "Content-Type": "application/x-www-form-urlencoded",
+    }
+    response = _request("post", SPOTIFY_TOKEN_URL, data=data, headers=headers, timeout=15)
+    if response.status_code >= 400:
+        detail = "Falha ao autenticar com Spotify."
+        try:
+            payload = response.json()
+            detail = payload.get("error_description") or payload.get("error") or detail
+        except Exception:
+            pass
+        raise serializers.ValidationError(detail)
+    return response.json()
+
+
+def app_access_token():
+    """Client-credentials token for catalog lookups that are not tied to a user."""
+    with _app_token_lock:
+        if _app_token["access_token"] and _app_token["expires_at"] > time.monotonic() + 30:
+            return _app_token["access_token"]
+
+        payload = token_request({"grant_type": "client_credentials"})
+        _app_token["access_token"] = payload.get("access_token", "")
+        _app_token["expires_at"] = time.monotonic() + int(payload.get("expires_in", 3600))
+        return _app_token["access_token"]
+
+
+def _get(url, access_token, timeout, error_detail):
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        response = _request("get", url, headers=auth_headers(access_token), timeout=timeout)
+        if response.status_code != 429 or attempt == MAX_RATE_LIMIT_RETRIES:
+            break
+        try:
+            retry_after = min(max(int(response.headers.get("Retry-After", 1)), 1), 30)
+        except (TypeError, ValueError):
+            retry_after = 1
+        remaining = _remaining_budget()
+        if remaining is not None and retry_after >= remaining:
+            raise SpotifyUnavailable("Limite de requisicoes do Spotify atingido. Tente novamente em instantes.")
+        time.sleep(retry_after)
+
+    if response.status_code >= 400:
+        raise serializers.ValidationError(error_detail)
+    return response.json()
+
+
+def _track_payload(track):
+    title = (track.get("name") or "").strip()
+    artists = track.get("artists") or []
+    artist_name = ", ".join([artist.get("name", "").strip() for artist in artists if artist.get("name")]).strip()
+    return {
+        "spotify_track_id": track.get("id") or "",
+        "title": title,
+        "artist": artist_name,
+        "duration_ms": track.get("duration_ms"),
+    }
+
+
+def fetch_spotify_profile(access_token):
+    response = _request("get", f"{SPOTIFY_API_BASE}/me", headers=auth_headers(access_token), timeout=15)
+    if response.status_code >= 400:
+        raise serializers.ValidationError("Falha ao obter perfil Spotify.")
+    return response.json()
+
+
+def fetch_playlists(access_token):
+    playlists = []
+    url = f"{SPOTIFY_API_BASE}/me/playlists?limit=50"
+
+    while url:
+        response = _request("get", url, headers=auth_headers(access_token), timeout=20)
+        if response.status_code >= 400:
+            raise serializers.ValidationError("Falha ao listar playlists no Spotify.")
+
+        payload = response.json()
+        for item in payload.get("items", []):
+            playlists.append(
+                {
+                    "id": item.get("id"),
+                    "name": item.get("name"),
+                    "tracks_total": item.get("tracks", {}).get("total", 0),
+                }
+            )
+
+        url = payload.get("next")
+
+    return playlists
+
+
+def fetch_playlist_tracks(access_token, playlist_id):
+    response = _request(
+        "get",
+        f"{SPOTIFY_API_BASE}/playlists/{playlist_id}?fields=id,name",
+        headers=auth_headers(access_token),
+        timeout=20,
+    )
+    if response.status_code >= 400:
+        raise serializers.ValidationError("Playlist nao encontrada no Spotify.")
+
+    playlist_payload = response.json()
+    playlist_name = playlist_payload.get("name") or "Playlist importada"
+
+    tracks = []
+    url = f"{SPOTIFY_API_BASE}/playlists/{playlist_id}/tracks?limit=100"
+    while url:
+        track_response = _request("get", url, headers=auth_headers(access_token), timeout=20)
+        if track_response.status_code >= 400:
+            raise serializers.ValidationError("Falha ao buscar faixas da playlist.")
+
+        payload = track_response.json()
+        for item in payload.get("items", []):
+            track = item.get("track") or {}
+            if not track or track.get("is_local"):
+                continue
+
+            track_data = _track_payload(track)
+            if not track_data["title"]:
+                continue
+            tracks.append(track_data)
+
+        url = payload.get("next")
+
+    return playlist_name, tracks
+
+
+def fetch_tracks(access_token, track_ids):
+    """Resolve track ids through `/tracks?ids=`, TRACKS_BATCH_SIZE ids per call."""
+    tracks = {}
+    track_ids = list(dict.fromkeys(track_id for track_id in track_ids if track_id))
+    for start in range(0, len(track_ids), TRACKS_BATCH_SIZE):
+        batch = track_ids[start:start + TRACKS_BATCH_SIZE]
+        payload = _get(
+            f"{SPOTIFY_API_BASE}/tracks?ids={','.join(batch)}",
+            access_token,
+            timeout=20,
+            error_detail="Falha ao buscar faixas no Spotify.",
+        )
+        for track in payload.get("tracks") or []:
+            if track and track.get("id"):
+                tracks[track["id"]] = _track_payload(track)
+    return tracks
+
+
+def normalize_query(value):
+    return " ".join((value or "").casefold().split())
+
+
+def cached_catalog_search(query):
+    """Cached result of search_catalog for `query`, or None on a cache miss."""
+    return catalog_search_cache.get(normalize_query(query))
+
+
+def search_catalog(access_token, query):
+    """Free-text catalog search, served from the shared LRU when possible."""
+    normalized = normalize_query(query)
+    cached = catalog_search_cache.get(normalized)
+    if cached is not None:
+        return cached
+
+    payload = _get(
+        f"{SPOTIFY_API_BASE}/search?type=track&limit={CATALOG_SEARCH_LIMIT}&q={requests.utils.quote(normalized)}",
+        access_token,
+        timeout=10,
+        error_detail="Falha ao buscar musica no Spotify.",
+    )
+    tracks = []
+    for track in (payload.get("tracks") or {}).get("items") or []:
+        if not track or not track.get("id") or track.get("is_local"):
+            continue
+        track_data = _track_payload(track)
+        if track_data["title"]:
+            tracks.append(track_data)
+            catalog_track_cache.set(track_data["spotify_track_id"], track_data)
+
+    catalog_search_cache.set(normalized, tracks)
+    return tracks
+
+
+def get_catalog_track(access_token, track_id):
+    """Track metadata by id, reusing entries cached by earlier searches."""
+    cached = catalog_track_cache.get(track_id)
+    if cached is not None:
+        return cached
+
+    track = fetch_tracks(access_token, [track_id]).get(track_id)
+    if track:
+        catalog_track_cache.set(track_id, track)
+    return track
+
+
+def search_track(access_token, title, artist=""):
+    """Best catalog match for a title/artist pair, cached across calls (None when not found)."""
+    normalized_title = normalize_query(title)
+    normalized_artist = normalize_query(artist)
+    if not normalized_title:
+        return None
+
+    cache_key = f"spotify:track-search:{normalized_title}|{normalized_artist}"
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached or None
+
+    query = f'track:"{title.strip()}"'
+    if normalized_artist:
+        query += f' artist:"{artist.strip()}"'
+    payload = _get(
+        f"{SPOTIFY_API_BASE}/search?type=track&limit=5&q={requests.utils.quote(query)}",
+        access_token,
+        timeout=20,
+        error_detail="Falha ao buscar musica no Spotify.",
+    )
+
+    match = None
+    for track in (payload.get("tracks") or {}).get("items") or []:
+        if track and normalize_query(track.get("name")).startswith(normalized_title):
+            match = _track_payload(track)
+            break
+
+    # Misses are cached too (as an empty dict) so unknown songs are not searched again.
+    cache.set(cache_key, match or {}, timeout=SEARCH_CACHE_TIMEOUT_SECONDS)
+    return match
@@ -0,0 +1,95 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from apps.repertoire.models import Song
+from apps.spotify.client import app_access_token, fetch_tracks, search_track
+
+
+class Command(BaseCommand):
+    help = (
+        "Preenche duration_ms/spotify_track_id de musicas sem metadados do Spotify. "
+        "Use SPOTIFY_API_BASE/SPOTIFY_TOKEN_URL para apontar para um servidor fake local."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=200)
+        parser.add_argument("--limit", type=int, default=0, help="Maximo de musicas a examinar (0 = todas).")
+        parser.add_argument("--user-id", type=int, default=None)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        chunk_size = max(options["chunk_size"], 1)
+        limit = max(options["limit"], 0)
+        dry_run = options["dry_run"]
+
+        queryset = Song.objects.filter(Q(duration_ms__isnull=True) | Q(spotify_track_id=""))
+        if options["user_id"]:
+            queryset = queryset.filter(user_id=options["user_id"])
+        queryset = queryset.only("id", "title", "artist", "duration_ms", "spotify_track_id").order_by("id")
+
+        started_at = time.perf_counter()
+        last_id = 0
+        scanned = 0
+        updated = 0
+        chunk_number = 0
+
+        while not limit or scanned < limit:
+            batch_size = min(chunk_size, limit - scanned) if limit else chunk_size
+            songs = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not songs:
+                break
+
+            chunk_number += 1
+            last_id = songs[-1].id
+            scanned += len(songs)
+
+            try:
+                # The client caches the token and renews it shortly before it
+                # expires, so asking per chunk keeps long runs authenticated.
+                changed = self._enrich_chunk(app_access_token(), songs)
+            except APIException as exc:
+                raise CommandError(f"Falha no lote {chunk_number} (ultimo id {last_id}): {exc.detail}") from exc
+
+            if changed and not dry_run:
+                now = timezone.now()
+                for song in changed:
+                    song.updated_at = now
+                Song.objects.bulk_update(changed, ["duration_ms", "spotify_track_id", "updated_at"])
+            updated += len(changed)
+
+            elapsed = time.perf_counter() - started_at
+            self.stdout.write(
+                f"lote {chunk_number}: {scanned} examinadas, {updated} atualizadas, "
+                f"{scanned / elapsed if elapsed else 0:.1f} musicas/s (ultimo id {last_id})"
+            )
+
+        elapsed = time.perf_counter() - started_at
+        suffix = " (dry-run, nada gravado)" if dry_run else ""
+        self.stdout.write(
+            self.style.SUCCESS(f"Concluido: {scanned} examinadas, {updated} atualizadas em {elapsed:.1f}s{suffix}.")
+        )
+
+    def _enrich_chunk(self, access_token, songs):
+        changed = {}
+
+        by_track_id = fetch_tracks(access_token, [song.spotify_track_id for song in songs if song.spotify_track_id])
+        for song in songs:
+            if song.spotify_track_id:
+                track = by_track_id.get(song.spotify_track_id)
+            else:
+                track = search_track(access_token, song.title, song.artist)
+            if not track:
+                continue
+
+            if not song.spotify_track_id and track["spotify_track_id"]:
+                song.spotify_track_id = track["spotify_track_id"]
+                changed[song.id] = song
+            if song.duration_ms is None and track["duration_ms"]:
+                song.duration_ms = track["duration_ms"]
+                changed[song.id] = song
+
+        return list(changed.values())
@@ -0,0 +1,325 @@
+import os
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from requests import ConnectionError as RequestsConnectionError
+from rest_framework.test import APIClient
+
+from apps.repertoire.models import Song
+from apps.spotify import client as spotify_client
+from apps.spotify import views as spotify_views
+from apps.spotify.models import SpotifyConnection
+from apps.users.models import User
+
+
+TRACK_ID = "4gzpq5DPGxSnKTe4SA8HAU"
+
+
+def _fake_response(payload, status_code=200):
+    response = mock.Mock()
+    response.status_code = status_code
+    response.json.return_value = payload
+    return response
+
+
+@mock.patch.dict(os.environ, {"SPOTIFY_CLIENT_ID": "client", "SPOTIFY_CLIENT_SECRET": "secret"})
+class SpotifyTokenRefreshTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        spotify_views._access_token_cache.clear()
+        spotify_client.breaker.reset()
+        self.user = User.objects.create_user(email="musician@example.com", password="strongpass123")
+        self.connection = SpotifyConnection.objects.create(
+            user=self.user,
+            access_token="expired",
+            refresh_token="refresh",
+            token_expires_at=timezone.now() - timedelta(minutes=5),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    @mock.patch("apps.spotify.client.requests.get")
+    @mock.patch("apps.spotify.client.requests.post")
+    def test_expired_token_is_refreshed_once_and_reused(self, post_mock, get_mock):
+        post_mock.return_value = _fake_response({"access_token": "fresh", "expires_in": 3600})
+        get_mock.return_value = _fake_response({"items": [], "next": None})
+
+        first = self.client.get("/api/spotify/playlists/")
+        second = self.client.get("/api/spotify/playlists/")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(post_mock.call_count, 1)
+        self.connection.refresh_from_db()
+        self.assertEqual(self.connection.access_token, "fresh")
+        self.assertEqual(get_mock.call_args.kwargs["headers"]["Authorization"], "Bearer fresh")
+
+    @mock.patch("apps.spotify.client.requests.post")
+    def test_stale_connection_reuses_token_refreshed_by_another_worker(self, post_mock):
+        stale_copy = SpotifyConnection.objects.get(pk=self.connection.pk)
+        SpotifyConnection.objects.filter(pk=self.connection.pk).update(
+            access_token="refreshed-elsewhere",
+            token_expires_at=timezone.now() + timedelta(hours=1),
+        )
+
+        token = spotify_views._ensure_access_token(stale_copy)
+
+        self.assertEqual(token, "refreshed-elsewhere")
+        post_mock.assert_not_called()
+
+    @mock.patch("apps.spotify.client.requests.post")
+    def test_refresh_that_loses_the_race_uses_the_stored_token(self, post_mock):
+        def refresh_elsewhere_first(*args, **kwargs):
+            SpotifyConnection.objects.filter(pk=self.connection.pk).update(
+                access_token="refreshed-elsewhere",
+                token_expires_at=timezone.now() + timedelta(hours=1),
+            )
+            return _fake_response({"access_token": "late", "expires_in": 3600})
+
+        post_mock.side_effect = refresh_elsewhere_first
+
+        token = spotify_views._ensure_access_token(SpotifyConnection.objects.get(pk=self.connection.pk))
+
+        self.assertEqual(token, "refreshed-elsewhere")
+        self.connection.refresh_from_db()
+        self.assertEqual(self.connection.access_token, "refreshed-elsewhere")
+
+    @mock.patch("apps.spotify.views.time.sleep")
+    @mock.patch("apps.spotify.client.requests.post")
+    def test_waiter_polls_for_the_token_stored_by_the_lock_holder(self, post_mock, sleep_mock):
+        cache.add(spotify_views._token_refresh_lock_key(self.user.id), 1)
+
+        def holder_stores_token(seconds):
+            SpotifyConnection.objects.filter(pk=self.connection.pk).update(
+                access_token="refreshed-by-holder",
+                token_expires_at=timezone.now() + timedelta(hours=1),
+            )
+
+        sleep_mock.side_effect = holder_stores_token
+
+        token = spotify_views._ensure_access_token(SpotifyConnection.objects.get(pk=self.connection.pk))
+
+        self.assertEqual(token, "refreshed-by-holder")
+        self.assertEqual(sleep_mock.call_count, 1)
+        post_mock.assert_not_called()
+
+    @mock.patch("apps.spotify.views.time.monotonic", side_effect=[0, 0, 100])
+    @mock.patch("apps.spotify.views.time.sleep")
+    @mock.patch("apps.spotify.client.requests.post")
+    def test_waiter_gives_up_when_the_holder_never_stores_a_token(self, post_mock, sleep_mock, monotonic_mock):
+        cache.add(spotify_views._token_refresh_lock_key(self.user.id), 1)
+
+        with self.assertRaises(spotify_client.SpotifyUnavailable):
+            spotify_views._ensure_access_token(SpotifyConnection.objects.get(pk=self.connection.pk))
+        post_mock.assert_not_called()
+
+    @mock.patch("apps.spotify.client.requests.post")
+    def test_refresh_releases_the_lock(self, post_mock):
+        post_mock.return_value = _fake_response({"access_token": "fresh", "expires_in": 3600})
+
+        self.assertEqual(spotify_views._ensure_access_token(SpotifyConnection.objects.get(pk=self.connection.pk)), "fresh")
+        self.assertIsNone(cache.get(spotify_views._token_refresh_lock_key(self.user.id)))
+
+    def test_cached_token_skips_connection_query(self):
+        SpotifyConnection.objects.filter(pk=self.connection.pk).update(
+            access_token="valid",
+            token_expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.assertEqual(spotify_views._access_token_for_user(self.user), "valid")
+
+        with self.assertNumQueries(0):
+            self.assertEqual(spotify_views._access_token_for_user(self.user), "valid")
+
+
+@mock.patch.dict(os.environ, {"SPOTIFY_CLIENT_ID": "client", "SPOTIFY_CLIENT_SECRET": "secret"})
+class EnrichSongMetadataCommandTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        spotify_client.breaker.reset()
+        spotify_client._app_token["access_token"] = ""
+        self.user = User.objects.create_user(email="musician@example.com", password="strongpass123")
+        self.known_id = Song.objects.create(user=self.user, title="Wonderwall", artist="Oasis", spotify_track_id=TRACK_ID)
+        self.unknown = Song.objects.create(user=self.user, title="Yellow", artist="Coldplay")
+        self.missing = Song.objects.create(user=self.user, title="Autoral", artist="")
+        self.complete = Song.objects.create(user=self.user, title="Done", spotify_track_id="trk9", duration_ms=1000)
+
+    @mock.patch("apps.spotify.client.requests.get")
+    @mock.patch("apps.spotify.client.requests.post")
+    def test_fills_missing_metadata_from_batch_and_search(self, post_mock, get_mock):
+        post_mock.return_value = _fake_response({"access_token": "app", "expires_in": 3600})
+
+        def fake_get(url, headers, timeout):
+            if "/tracks?ids=" in url:
+                return _fake_response({"tracks": [{"id": TRACK_ID, "name": "Wonderwall", "duration_ms": 258000}]})
+            if "Yellow" in url:
+                return _fake_response({"tracks": {"items": [{"id": "trk2", "name": "Yellow", "duration_ms": 266000}]}})
+            return _fake_response({"tracks": {"items": []}})
+
+        get_mock.side_effect = fake_get
+        output = StringIO()
+        call_command("enrich_song_metadata", "--chunk-size", "2", stdout=output)
+
+        self.known_id.refresh_from_db()
+        self.unknown.refresh_from_db()
+        self.missing.refresh_from_db()
+        self.assertEqual(self.known_id.duration_ms, 258000)
+        self.assertEqual((self.unknown.spotify_track_id, self.unknown.duration_ms), ("trk2", 266000))
+        self.assertIsNone(self.missing.duration_ms)
+        self.assertIn("3 examinadas, 2 atualizadas", output.getvalue())
+        self.assertFalse(any("trk9" in call.args[0] for call in get_mock.call_args_list))
+
+    @mock.patch("apps.spotify.client.requests.get")
+    @mock.patch("apps.spotify.client.requests.post")
+    def test_token_is_renewed_between_chunks_when_it_expires(self, post_mock, get_mock):
+        post_mock.side_effect = [
+            _fake_response({"access_token": "first", "expires_in": 0}),
+            _fake_response({"access_token": "second", "expires_in": 3600}),
+        ]
+        get_mock.side_effect = lambda url, headers, timeout: _fake_response(
+            {"tracks": []} if "/tracks?ids=" in url else {"tracks": {"items": []}}
+        )
+
+        call_command("enrich_song_metadata", "--chunk-size", "2", stdout=StringIO())
+
+        tokens = [call.kwargs["headers"]["Authorization"] for call in get_mock.call_args_list]
+        self.assertEqual(post_mock.call_count, 2)
+        self.assertEqual(tokens[0], "Bearer first")
+        self.assertEqual(tokens[-1], "Bearer second")
+
+
+class SpotifyCircuitBreakerTests(TestCase):
+    def setUp(self):
+        spotify_client.breaker.reset()
+        spotify_views._access_token_cache.clear()
+        self.user = User.objects.create_user(email="musician@example.com", password="strongpass123")
+        SpotifyConnection.objects.create(
+            user=self.user,
+            access_token="valid",
+            refresh_token="refresh",
+            token_expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        spotify_client.breaker.reset()
+
+    @mock.patch("apps.spotify.client.requests.get")
+    def test_breaker_opens_after_failures_and_fails_fast(self, get_mock):
+        get_mock.side_effect = RequestsConnectionError("down")
+
+        for _ in range(spotify_client.BREAKER_FAILURE_THRESHOLD):
+            response = self.client.get("/api/spotify/playlists/")
+            self.assertEqual(response.status_code, 503)
+
+        get_mock.reset_mock()
+        response = self.client.get("/api/spotify/playlists/")
+        self.assertEqual(response.status_code, 503)
+        get_mock.assert_not_called()
+
+        health = self.client.get("/healthz/")
+        self.assertEqual(health.data["spotify"]["state"], "open")
+
+    @mock.patch("apps.spotify.client.requests.get")
+    def test_half_open_probe_closes_breaker_on_success(self, get_mock):
+        get_mock.return_value = _fake_response({"items": [], "next": None})
+        for _ in range(spotify_client.BREAKER_FAILURE_THRESHOLD):
+            spotify_client.breaker.record_failure()
+
+        with mock.patch.object(spotify_client.breaker, "reset_seconds", 0):
+            self.assertEqual(spotify_client.breaker.state, "half_open")
+            response = self.client.get("/api/spotify/playlists/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(spotify_client.breaker.state, "closed")
+
+    @mock.patch("apps.spotify.client.requests.get")
+    def test_request_deadline_caps_outbound_timeout(self, get_mock):
+        get_mock.return_value = _fake_response({"items": [], "next": None})
+
+        with spotify_client.request_deadline(2):
+            spotify_client.fetch_playlists("valid")
+
+        self.assertLessEqual(get_mock.call_args.kwargs["timeout"], 2)
+
+
+@mock.patch.dict(os.environ, {"SPOTIFY_CLIENT_ID": "client", "SPOTIFY_CLIENT_SECRET": "secret"})
+class SpotifyCatalogSearchTests(TestCase):
+    def setUp(self):
+        spotify_client.breaker.reset()
+        spotify_client.catalog_search_cache.clear()
+        spotify_client.catalog_track_cache.clear()
+        spotify_client._app_token["access_token"] = ""
+        cache.clear()
+        self.user = User.objects.create_user(email="musician@example.com", password="strongpass123")
+        self.other_user = User.objects.create_user(email="other@example.com", password="strongpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    @mock.patch("apps.spotify.client.requests.get")
+    @mock.patch("apps.spotify.client.requests.post")
+    def test_search_results_are_shared_across_users_and_add_creates_song(self, post_mock, get_mock):
+        post_mock.return_value = _fake_response({"access_token": "app", "expires_in": 3600})
+        get_mock.return_value = _fake_response(
+            {"tracks": {"items": [{"id": TRACK_ID, "name": "Wonderwall", "artists": [{"name": "Oasis"}], "duration_ms": 258000}]}}
+        )
+
+        first = self.client.get("/api/spotify/search/?q=Wonderwall%20%20")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data["items"][0]["spotify_track_id"], TRACK_ID)
+        self.assertIsNone(first.data["items"][0]["song_id"])
+
+        other_client = APIClient()
+        other_client.force_authenticate(user=self.other_user)
+        second = other_client.get("/api/spotify/search/?q=wonderwall")
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(get_mock.call_count, 1)
+
+        created = self.client.post("/api/spotify/tracks/", {"spotify_track_id": TRACK_ID}, format="json")
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(created.data["duration_ms"], 258000)
+        self.assertEqual(get_mock.call_count, 1)
+
+        again = self.client.post("/api/spotify/tracks/", {"spotify_track_id": TRACK_ID}, format="json")
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(Song.objects.filter(user=self.user).count(), 1)
+
+    @mock.patch("apps.spotify.client.requests.get")
+    @mock.patch("apps.spotify.client.requests.post")
+    def test_only_repeated_in_flight_queries_are_throttled(self, post_mock, get_mock):
+        post_mock.return_value = _fake_response({"access_token": "app", "expires_in": 3600})
+        get_mock.return_value = _fake_response({"tracks": {"items": []}})
+
+        self.assertEqual(self.client.get("/api/spotify/search/?q=won").status_code, 200)
+        self.assertEqual(self.client.get("/api/spotify/search/?q=wond").status_code, 200)
+        self.assertEqual(get_mock.call_count, 2)
+
+        spotify_views._claim_search(self.user.id, "wonder")
+        response = self.client.get("/api/spotify/search/?q=wonder")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        self.assertEqual(get_mock.call_count, 2)
+        self.assertGreater(spotify_views.SEARCH_IN_FLIGHT_SECONDS, spotify_client.REQUEST_BUDGET_SECONDS)
+
+    @mock.patch("apps.spotify.client.requests.get")
+    def test_add_rejects_malformed_track_ids(self, get_mock):
+        for track_id in ("trk1", "4gzpq5DPGxSnKTe4SA8HAU,other", "../me/4gzpq5DPGxSnKTe4SA"):
+            response = self.client.post("/api/spotify/tracks/", {"spotify_track_id": track_id}, format="json")
+            self.assertEqual(response.status_code, 400)
+        get_mock.assert_not_called()
+
+    def test_lru_cache_evicts_least_recently_used_entry(self):
+        lru = spotify_client.TTLCache(maxsize=2, ttl_seconds=60)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+
+        self.assertEqual(lru.get("a"), 1)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("c"), 3)
@@ -1,11 +1,13 @@
 from django.urls import path
 
 from .views import (
+    SpotifyAddTrackView,
     SpotifyAuthUrlView,
     SpotifyConnectionStatusView,
     SpotifyExchangeCodeView,
     SpotifyImportPlaylistView,
     SpotifyPlaylistsView,
+    SpotifySearchView,
 )
 
 urlpatterns = [
@@ -14,4 +16,6 @@ urlpatterns = [
     path("exchange-code/", SpotifyExchangeCodeView.as_view(), name="spotify-exchange-code"),
     path("playlists/", SpotifyPlaylistsView.as_view(), name="spotify-playlists"),
     path("import-playlist/", SpotifyImportPlaylistView.as_view(), name="spotify-import-playlist"),
+    path("search/", SpotifySearchView.as_view(), name="spotify-search"),
+    path("tracks/", SpotifyAddTrackView.as_view(), name="spotify-add-track"),
 ]
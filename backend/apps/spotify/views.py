@@ -1,61 +1,90 @@
-import base64
+import hashlib
+import math
 import os
 import secrets
+import threading
+import time
 from datetime import timedelta
 
 import requests
+from django.core.cache import cache
 from django.db import transaction
 from django.utils import timezone
 from rest_framework import permissions, serializers, status
+from rest_framework.exceptions import Throttled
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from apps.repertoire.models import Setlist, SetlistItem, Song
+from apps.repertoire.serializers import SongSerializer
+from apps.spotify.client import (
+    REQUEST_BUDGET_SECONDS,
+    SPOTIFY_AUTHORIZE_URL,
+    SpotifyUnavailable,
+    app_access_token,
+    cached_catalog_search,
+    fetch_playlist_tracks,
+    fetch_playlists,
+    fetch_spotify_profile,
+    get_catalog_track,
+    normalize_query,
+    request_deadline,
+    search_catalog,
+    spotify_client_credentials,
+    token_request,
+)
 from apps.spotify.models import SpotifyConnection
 
-SPOTIFY_AUTHORIZE_URL = "https://accounts.spotify.com/authorize"
-SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
-SPOTIFY_API_BASE = "https://api.spotify.com/v1"
 SPOTIFY_SCOPES = "playlist-read-private playlist-read-collaborative"
+TOKEN_REFRESH_MARGIN = timedelta(seconds=30)
+# One caller per user refreshes; the others poll the row for the token it stores.
+TOKEN_REFRESH_LOCK_SECONDS = math.ceil(REQUEST_BUDGET_SECONDS) + 1
+TOKEN_REFRESH_POLL_SECONDS = 0.1
+
+# Valid access tokens per user (SpotifyConnection is one-to-one with User), so
+# hot paths can skip the connection read until the token nears expiry.
+_access_token_cache = {}
+_access_token_cache_lock = threading.Lock()
+
+SEARCH_MIN_QUERY_LENGTH = 2
+# The claim is released when the search returns; its TTL only covers a worker
+# that dies mid-request, so it must outlast the request deadline.
+SEARCH_IN_FLIGHT_SECONDS = math.ceil(REQUEST_BUDGET_SECONDS) + 1
+SEARCH_RETRY_AFTER_SECONDS = 1
 
 
 class PlaylistImportSerializer(serializers.Serializer):
     playlist_id = serializers.CharField(max_length=128)
 
 
-def _spotify_client_credentials():
-    client_id = os.getenv("SPOTIFY_CLIENT_ID", "")
-    client_secret = os.getenv("SPOTIFY_CLIENT_SECRET", "")
-    if not client_id or not client_secret:
-        raise serializers.ValidationError("Spotify nao configurado no servidor.")
-    return client_id, client_secret
+class AddTrackSerializer(serializers.Serializer):
+    spotify_track_id = serializers.RegexField(
+        r"^[A-Za-z0-9]{22}$", error_messages={"invalid": "Id de faixa Spotify invalido."}
+    )
 
 
 def _default_redirect_uri():
     return os.getenv("SPOTIFY_REDIRECT_URI", "http://localhost:5173")
 
 
-def _auth_headers(access_token):
-    return {"Authorization": f"Bearer {access_token}"}
+def _token_is_fresh(access_token, expires_at):
+    return bool(access_token) and expires_at is not None and expires_at > timezone.now() + TOKEN_REFRESH_MARGIN
 
 
-def _token_request(data):
-    client_id, client_secret = _spotify_client_credentials()
-    basic = base64.b64encode(f"{client_id}:{client_secret}".encode("utf-8")).decode("utf-8")
-    headers = {
-        "Authorization": f"Basic {basic}",
-        "Content-Type": "application/x-www-form-urlencoded",
-    }
-    response = requests.post(SPOTIFY_TOKEN_URL, data=data, headers=headers, timeout=15)
-    if response.status_code >= 400:
-        detail = "Falha ao autenticar com Spotify."
-        try:
-            payload = response.json()
-            detail = payload.get("error_description") or payload.get("error") or detail
-        except Exception:
-            pass
-        raise serializers.ValidationError(detail)
-    return response.json()
+def _cache_access_token(connection):
+    with _access_token_cache_lock:
+        if _token_is_fresh(connection.access_token, connection.token_expires_at):
+            _access_token_cache[connection.user_id] = (connection.access_token, connection.token_expires_at)
+        else:
+            _access_token_cache.pop(connection.user_id, None)
+
+
+def _cached_access_token(user_id):
+    with _access_token_cache_lock:
+        cached = _access_token_cache.get(user_id)
+    if cached and _token_is_fresh(*cached):
+        return cached[0]
+    return None
 
 
 def _save_tokens(connection, token_payload):
@@ -65,106 +94,106 @@ def _save_tokens(connection, token_payload):
         connection.refresh_token = token_payload["refresh_token"]
     connection.token_expires_at = timezone.now() + timedelta(seconds=expires_in)
     connection.save(update_fields=["access_token", "refresh_token", "token_expires_at", "updated_at"])
+    _cache_access_token(connection)
 
 
-def _ensure_access_token(connection):
-    if connection.access_token and connection.token_expires_at and connection.token_expires_at > timezone.now() + timedelta(seconds=30):
-        return connection.access_token
+def _token_refresh_lock_key(user_id):
+    return f"spotify:refresh:{user_id}"
+
 
+def _refresh_access_token(connection):
     if not connection.refresh_token:
         raise serializers.ValidationError("Conexao Spotify expirada. Conecte novamente.")
 
-    token_payload = _token_request(
+    token_payload = token_request(
         {
             "grant_type": "refresh_token",
             "refresh_token": connection.refresh_token,
         }
     )
-    _save_tokens(connection, token_payload)
-    return connection.access_token
-
-
-def _fetch_spotify_profile(access_token):
-    response = requests.get(f"{SPOTIFY_API_BASE}/me", headers=_auth_headers(access_token), timeout=15)
-    if response.status_code >= 400:
-        raise serializers.ValidationError("Falha ao obter perfil Spotify.")
-    return response.json()
+    now = timezone.now()
+    fields = {
+        "access_token": token_payload.get("access_token", connection.access_token),
+        "refresh_token": token_payload.get("refresh_token") or connection.refresh_token,
+        "token_expires_at": now + timedelta(seconds=int(token_payload.get("expires_in", 3600))),
+    }
+    # Compare-and-set on the expiry that was read, in case the lock expired
+    # under a slow refresh and another caller stored a token first.
+    stored = SpotifyConnection.objects.filter(pk=connection.pk, token_expires_at=connection.token_expires_at).update(
+        **fields, updated_at=now
+    )
+    if stored:
+        for field, value in fields.items():
+            setattr(connection, field, value)
+    else:
+        connection.refresh_from_db(fields=["access_token", "refresh_token", "token_expires_at"])
 
 
-def _fetch_playlists(access_token):
-    playlists = []
-    url = f"{SPOTIFY_API_BASE}/me/playlists?limit=50"
+def _ensure_access_token(connection):
+    if _token_is_fresh(connection.access_token, connection.token_expires_at):
+        _cache_access_token(connection)
+        return connection.access_token
 
-    while url:
-        response = requests.get(url, headers=_auth_headers(access_token), timeout=20)
-        if response.status_code >= 400:
-            raise serializers.ValidationError("Falha ao listar playlists no Spotify.")
+    cached = _cached_access_token(connection.user_id)
+    if cached:
+        return cached
+
+    # Single flight without holding a row lock across the HTTP call: the
+    # refresh runs under a short-lived cache lock, and whoever does not get it
+    # re-reads the row until the holder has stored the new token.
+    lock_key = _token_refresh_lock_key(connection.user_id)
+    deadline = time.monotonic() + TOKEN_REFRESH_LOCK_SECONDS
+    while True:
+        connection.refresh_from_db(fields=["access_token", "refresh_token", "token_expires_at"])
+        if _token_is_fresh(connection.access_token, connection.token_expires_at):
+            _cache_access_token(connection)
+            return connection.access_token
+        if cache.add(lock_key, 1, timeout=TOKEN_REFRESH_LOCK_SECONDS):
+            break
+        if time.monotonic() >= deadline:
+            raise SpotifyUnavailable()
+        time.sleep(TOKEN_REFRESH_POLL_SECONDS)
+
+    try:
+        # The previous holder may have stored a token between the read and the lock.
+        connection.refresh_from_db(fields=["access_token", "refresh_token", "token_expires_at"])
+        if not _token_is_fresh(connection.access_token, connection.token_expires_at):
+            _refresh_access_token(connection)
+    finally:
+        cache.delete(lock_key)
+
+    _cache_access_token(connection)
+    return connection.access_token
 
-        payload = response.json()
-        for item in payload.get("items", []):
-            playlists.append(
-                {
-                    "id": item.get("id"),
-                    "name": item.get("name"),
-                    "tracks_total": item.get("tracks", {}).get("total", 0),
-                }
-            )
 
-        url = payload.get("next")
+def _search_claim_key(user_id, query):
+    return f"spotify:search:{user_id}:{hashlib.sha1(query.encode()).hexdigest()}"
 
-    return playlists
 
+def _claim_search(user_id, query):
+    # Only a repeat of a query that is still being fetched is turned away: a
+    # new keystroke always searches, and debouncing them is the client's job.
+    # The claim expires on its own if the worker dies mid-request.
+    if not cache.add(_search_claim_key(user_id, query), 1, timeout=SEARCH_IN_FLIGHT_SECONDS):
+        raise Throttled(wait=SEARCH_RETRY_AFTER_SECONDS, detail="Busca em andamento. Aguarde para buscar novamente.")
 
-def _fetch_playlist_tracks(access_token, playlist_id):
-    response = requests.get(
-        f"{SPOTIFY_API_BASE}/playlists/{playlist_id}?fields=id,name",
-        headers=_auth_headers(access_token),
-        timeout=20,
-    )
-    if response.status_code >= 400:
-        raise serializers.ValidationError("Playlist nao encontrada no Spotify.")
-
-    playlist_payload = response.json()
-    playlist_name = playlist_payload.get("name") or "Playlist importada"
-
-    tracks = []
-    url = f"{SPOTIFY_API_BASE}/playlists/{playlist_id}/tracks?limit=100"
-    while url:
-        track_response = requests.get(url, headers=_auth_headers(access_token), timeout=20)
-        if track_response.status_code >= 400:
-            raise serializers.ValidationError("Falha ao buscar faixas da playlist.")
-
-        payload = track_response.json()
-        for item in payload.get("items", []):
-            track = item.get("track") or {}
-            if not track or track.get("is_local"):
-                continue
-
-            title = (track.get("name") or "").strip()
-            if not title:
-                continue
-
-            artists = track.get("artists") or []
-            artist_name = ", ".join([artist.get("name", "").strip() for artist in artists if artist.get("name")]).strip()
-            tracks.append(
-                {
-                    "spotify_track_id": track.get("id") or "",
-                    "title": title,
-                    "artist": artist_name,
-                    "duration_ms": track.get("duration_ms"),
-                }
-            )
 
-        url = payload.get("next")
+def _access_token_for_user(user):
+    cached = _cached_access_token(user.id)
+    if cached:
+        return cached
 
-    return playlist_name, tracks
+    connection = SpotifyConnection.objects.filter(user=user).first()
+    if not connection:
+        return None
+    return _ensure_access_token(connection)
 
 
 class SpotifyAuthUrlView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        client_id, _ = _spotify_client_credentials()
+        client_id, _ = spotify_client_credentials()
         redirect_uri = request.query_params.get("redirect_uri") or _default_redirect_uri()
 
         connection, _ = SpotifyConnection.objects.get_or_create(user=request.user)
@@ -200,16 +229,17 @@ class SpotifyExchangeCodeView(APIView):
         if not connection.oauth_state or connection.oauth_state != state:
             return Response({"detail": "State OAuth invalido."}, status=status.HTTP_400_BAD_REQUEST)
 
-        token_payload = _token_request(
-            {
-                "grant_type": "authorization_code",
-                "code": code,
-                "redirect_uri": redirect_uri,
-            }
-        )
-        _save_tokens(connection, token_payload)
+        with request_deadline():
+            token_payload = token_request(
+                {
+                    "grant_type": "authorization_code",
+                    "code": code,
+                    "redirect_uri": redirect_uri,
+                }
+            )
+            _save_tokens(connection, token_payload)
 
-        profile = _fetch_spotify_profile(connection.access_token)
+            profile = fetch_spotify_profile(connection.access_token)
         connection.spotify_user_id = profile.get("id", "")
         connection.display_name = profile.get("display_name") or profile.get("id", "")
         connection.oauth_state = ""
@@ -224,33 +254,33 @@ class SpotifyExchangeCodeView(APIView):
         )
 
 
+def connection_status(connection):
+    if not connection or not connection.refresh_token:
+        return {"connected": False}
+    return {
+        "connected": True,
+        "spotify_user_id": connection.spotify_user_id,
+        "display_name": connection.display_name,
+    }
+
+
 class SpotifyConnectionStatusView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        connection = SpotifyConnection.objects.filter(user=request.user).first()
-        if not connection or not connection.refresh_token:
-            return Response({"connected": False})
-
-        return Response(
-            {
-                "connected": True,
-                "spotify_user_id": connection.spotify_user_id,
-                "display_name": connection.display_name,
-            }
-        )
+        return Response(connection_status(SpotifyConnection.objects.filter(user=request.user).first()))
 
 
 class SpotifyPlaylistsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        connection = SpotifyConnection.objects.filter(user=request.user).first()
-        if not connection:
-            return Response({"detail": "Conta Spotify nao conectada."}, status=status.HTTP_400_BAD_REQUEST)
+        with request_deadline():
+            access_token = _access_token_for_user(request.user)
+            if not access_token:
+                return Response({"detail": "Conta Spotify nao conectada."}, status=status.HTTP_400_BAD_REQUEST)
 
-        access_token = _ensure_access_token(connection)
-        playlists = _fetch_playlists(access_token)
+            playlists = fetch_playlists(access_token)
         return Response({"items": playlists})
 
 
@@ -262,12 +292,12 @@ class SpotifyImportPlaylistView(APIView):
         serializer.is_valid(raise_exception=True)
         playlist_id = serializer.validated_data["playlist_id"]
 
-        connection = SpotifyConnection.objects.filter(user=request.user).first()
-        if not connection:
-            return Response({"detail": "Conta Spotify nao conectada."}, status=status.HTTP_400_BAD_REQUEST)
+        with request_deadline():
+            access_token = _access_token_for_user(request.user)
+            if not access_token:
+                return Response({"detail": "Conta Spotify nao conectada."}, status=status.HTTP_400_BAD_REQUEST)
 
-        access_token = _ensure_access_token(connection)
-        playlist_name, tracks = _fetch_playlist_tracks(access_token, playlist_id)
+            playlist_name, tracks = fetch_playlist_tracks(access_token, playlist_id)
 
         with transaction.atomic():
             setlist = Setlist.objects.create(user=request.user, name=playlist_name)
@@ -299,7 +329,7 @@ class SpotifyImportPlaylistView(APIView):
                         song.duration_ms = duration_ms
                         updated_fields.append("duration_ms")
                     if updated_fields:
-                        song.save(update_fields=updated_fields)
+                        song.save(update_fields=[*updated_fields, "updated_at"])
                 else:
                     song = Song.objects.create(
                         user=request.user,
@@ -323,3 +353,55 @@ class SpotifyImportPlaylistView(APIView):
             },
             status=status.HTTP_201_CREATED,
         )
+
+
+class SpotifySearchView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        query = normalize_query(request.query_params.get("q", ""))
+        if len(query) < SEARCH_MIN_QUERY_LENGTH:
+            return Response({"query": query, "items": []})
+
+        tracks = cached_catalog_search(query)
+        if tracks is None:
+            _claim_search(request.user.id, query)
+            try:
+                with request_deadline():
+                    tracks = search_catalog(app_access_token(), query)
+            finally:
+                cache.delete(_search_claim_key(request.user.id, query))
+
+        track_ids = [track["spotify_track_id"] for track in tracks]
+        song_ids = dict(
+            Song.objects.filter(user=request.user, spotify_track_id__in=track_ids).values_list("spotify_track_id", "id")
+        )
+        items = [{**track, "song_id": song_ids.get(track["spotify_track_id"])} for track in tracks]
+        return Response({"query": query, "items": items})
+
+
+class SpotifyAddTrackView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = AddTrackSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        track_id = serializer.validated_data["spotify_track_id"]
+
+        song = Song.objects.filter(user=request.user, spotify_track_id=track_id).first()
+        if song:
+            return Response(SongSerializer(song).data)
+
+        with request_deadline():
+            track = get_catalog_track(app_access_token(), track_id)
+        if not track:
+            return Response({"detail": "Faixa nao encontrada no Spotify."}, status=status.HTTP_404_NOT_FOUND)
+
+        song = Song.objects.create(
+            user=request.user,
+            title=track["title"],
+            artist=track["artist"],
+            duration_ms=track["duration_ms"],
+            spotify_track_id=track["spotify_track_id"],
+        )
+        return Response(SongSerializer(song).data, status=status.HTTP_201_CREATED)
@@ -5,3 +5,12 @@ class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.users'
     label = 'users'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from .authentication import invalidate_cached_user
+        from .models import User
+
+        post_save.connect(invalidate_cached_user, sender=User, dispatch_uid="users.invalidate_cached_user.save")
+        post_delete.connect(invalidate_cached_user, sender=User, dispatch_uid="users.invalidate_cached_user.delete")
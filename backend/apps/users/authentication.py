@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .revocation import is_token_revoked
+
+
+def user_cache_key(user_id):
+    """Key of the user's cache generation; every cached copy of the user is tagged with it."""
+    return f"auth:user:{user_id}"
+
+
+def _token_cache_key(user_id, validated_token):
+    return f"{user_cache_key(user_id)}:{validated_token.get('iat', '')}"
+
+
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Wired to post_save/post_delete of User: is_active, password and profile
+    # edits all go through save(), and moving the generation makes every
+    # worker reload the row on its next request, whatever token it carries.
+    cache.set(user_cache_key(instance.pk), time.time_ns(), timeout=None)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that keeps the resolved user in the cache for AUTH_USER_CACHE_SECONDS.
+
+    Entries are per user and token (`iat`), and are tagged with the user's
+    cache generation so a save anywhere invalidates them on every worker.
+    """
+
+    def get_validated_token(self, raw_token):
+        validated_token = super().get_validated_token(raw_token)
+        if is_token_revoked(validated_token):
+            raise InvalidToken("Token revogado.")
+        return validated_token
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or settings.AUTH_USER_CACHE_SECONDS <= 0:
+            return super().get_user(validated_token)
+
+        generation_key = user_cache_key(user_id)
+        token_key = _token_cache_key(user_id, validated_token)
+        cached = cache.get_many([generation_key, token_key])
+        generation, entry = cached.get(generation_key), cached.get(token_key)
+        if generation is not None and entry is not None and entry[0] == generation:
+            return entry[1]
+
+        # simplejwt only returns active users, so an inactive one is never cached.
+        user = super().get_user(validated_token)
+        if generation is None:
+            generation = time.time_ns()
+            if not cache.add(generation_key, generation, timeout=None):
+                # Invalidated meanwhile: the row just read may already be stale.
+                return user
+        cache.set(token_key, (generation, user), timeout=settings.AUTH_USER_CACHE_SECONDS)
+        return user
@@ -0,0 +1,119 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.utils import timezone as django_timezone
+
+from .models import RevokedToken
+
+_SYNC_BATCH_SIZE = 500
+# Rows created this long before the previous sync are read again, so a row
+# whose transaction committed late (or a worker with a skewed clock) is not missed.
+_SYNC_OVERLAP = timedelta(seconds=60)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter; `in` never misses an added item, false positives are tolerated."""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return ((first + index * second) % self.size for index in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+def _new_bloom():
+    return BloomFilter(settings.TOKEN_REVOCATION_BLOOM_CAPACITY, settings.TOKEN_REVOCATION_BLOOM_ERROR_RATE)
+
+
+class RevocationList:
+    """Revoked jtis are stored in the RevokedToken table until the token expires.
+
+    Each process keeps a Bloom filter of revoked jtis, caught up from the
+    table at most every TOKEN_REVOCATION_SYNC_SECONDS, so checking a token
+    that was never revoked usually does no I/O at all. A Bloom hit is
+    confirmed against the table. Bits cannot be removed, so every
+    TOKEN_REVOCATION_REBUILD_SECONDS the filter is rebuilt from the rows
+    that have not expired yet.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._bloom = _new_bloom()
+            self._synced_since = None
+            self._synced_at = float("-inf")
+            self._rebuilt_at = float("-inf")
+
+    def revoke(self, jti, expires_at):
+        if not jti or expires_at <= time.time():
+            return
+
+        now = django_timezone.now()
+        RevokedToken.objects.filter(expires_at__lte=now).delete()
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(jti=jti, expires_at=datetime.fromtimestamp(expires_at, tz=timezone.utc))],
+            ignore_conflicts=True,
+        )
+        with self._lock:
+            self._bloom.add(jti)
+
+    def is_revoked(self, jti):
+        if not jti:
+            return False
+        self._sync()
+        if jti not in self._bloom:
+            return False
+        return RevokedToken.objects.filter(jti=jti, expires_at__gt=django_timezone.now()).exists()
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._synced_at < settings.TOKEN_REVOCATION_SYNC_SECONDS:
+            return
+
+        with self._lock:
+            if now - self._synced_at < settings.TOKEN_REVOCATION_SYNC_SECONDS:
+                return
+            started = django_timezone.now()
+            rows = RevokedToken.objects.filter(expires_at__gt=started)
+            rebuild = now - self._rebuilt_at >= settings.TOKEN_REVOCATION_REBUILD_SECONDS
+            if rebuild:
+                bloom = _new_bloom()
+            else:
+                bloom = self._bloom
+                rows = rows.filter(created_at__gte=self._synced_since - _SYNC_OVERLAP)
+            for jti in rows.values_list("jti", flat=True).iterator(chunk_size=_SYNC_BATCH_SIZE):
+                bloom.add(jti)
+            if rebuild:
+                self._bloom = bloom
+                self._rebuilt_at = now
+            self._synced_since = started
+            self._synced_at = now
+
+
+revocation_list = RevocationList()
+
+
+def revoke_token(token):
+    revocation_list.revoke(token.get("jti"), token.get("exp", 0))
+
+
+def is_token_revoked(token):
+    return revocation_list.is_revoked(token.get("jti"))
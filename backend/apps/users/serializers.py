@@ -1,8 +1,11 @@
 ﻿from django.contrib.auth import authenticate
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from .models import User
+from .revocation import is_token_revoked
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -45,6 +48,27 @@ class LoginSerializer(serializers.Serializer):
         return attrs
 
 
+class RefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        try:
+            refresh = RefreshToken(attrs['refresh'])
+        except TokenError as exc:
+            raise InvalidToken(exc.args[0]) from exc
+        if is_token_revoked(refresh):
+            raise InvalidToken('Token revogado.')
+        return super().validate(attrs)
+
+
+class LogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField(required=False)
+
+    def validate_refresh(self, value):
+        try:
+            return RefreshToken(value)
+        except TokenError as exc:
+            raise serializers.ValidationError('Refresh token inválido.') from exc
+
+
 def get_tokens_for_user(user):
     refresh = RefreshToken.for_user(user)
     return {
@@ -1,8 +1,32 @@
-from django.test import TestCase
+import io
+import json
+import logging
+import gzip
+import importlib
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
-from apps.users.models import User
+from apps.users.models import RevokedToken, User
+from apps.users.revocation import BloomFilter, RevocationList, revocation_list
+from apps.users.serializers import get_tokens_for_user
+from config.log import JsonFormatter, NonBlockingStreamHandler, RequestOkSampler
+from config.middleware import QueryAccounting
+from config.renderers import FastJSONRenderer
 
 
 class AuthFlowTests(TestCase):
@@ -59,6 +83,158 @@ class AuthFlowTests(TestCase):
         self.assertEqual(me_unauthorized.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="cached@example.com", password="strongpass123", first_name="Ana")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(self.user)['access']}")
+
+    def test_second_request_resolves_user_without_query(self):
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/auth/me/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 0)
+
+    def test_saving_user_invalidates_cached_entry(self):
+        self.client.get("/api/auth/me/")
+
+        self.user.first_name = "Bia"
+        self.user.save()
+        self.assertEqual(self.client.get("/api/auth/me/").data["user"]["first_name"], "Bia")
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_entries_are_per_token(self):
+        self.client.get("/api/auth/me/")
+        other = AccessToken.for_user(self.user)
+        other.set_iat(at_time=datetime.now(timezone.utc) - timedelta(seconds=10))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {other}")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get("/api/auth/me/").status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+
+    @override_settings(TOKEN_REVOCATION_SYNC_SECONDS=3600)
+    def test_cold_and_warm_lookups_against_the_configured_cache(self):
+        self.assertNotIn("DatabaseCache", settings.CACHES["default"]["BACKEND"])
+        revocation_list.is_revoked("primer")  # keeps the revocation catch-up out of the count
+        with CaptureQueriesContext(connection) as cold:
+            self.assertEqual(self.client.get("/api/auth/me/").status_code, status.HTTP_200_OK)
+        self.assertEqual(len(cold), 1)
+        self.assertIn(User._meta.db_table, cold[0]["sql"])
+
+        with CaptureQueriesContext(connection) as warm:
+            self.assertEqual(self.client.get("/api/auth/me/").status_code, status.HTTP_200_OK)
+        self.assertEqual(len(warm), 0)
+
+    def test_production_settings_require_redis(self):
+        with mock.patch.dict(os.environ, {"REDIS_URL": ""}), mock.patch.dict(sys.modules):
+            sys.modules.pop("config.settings.base", None)
+            sys.modules.pop("config.settings.prod", None)
+            with self.assertRaisesMessage(ImproperlyConfigured, "REDIS_URL"):
+                importlib.import_module("config.settings.prod")
+
+    @override_settings(AUTH_USER_CACHE_SECONDS=0)
+    def test_cache_can_be_disabled(self):
+        self.client.get("/api/auth/me/")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/auth/me/")
+        self.assertEqual(len(queries), 1)
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        revocation_list.reset()
+        self.user = User.objects.create_user(email="revoke@example.com", password="strongpass123")
+        self.tokens = get_tokens_for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        response = self.client.post("/api/auth/logout/", {"refresh": self.tokens["refresh"]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, status.HTTP_401_UNAUTHORIZED)
+        refresh_response = APIClient().post("/api/auth/refresh/", {"refresh": self.tokens["refresh"]}, format="json")
+        self.assertEqual(refresh_response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        other_tokens = get_tokens_for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {other_tokens['access']}")
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, status.HTTP_200_OK)
+
+    def test_logout_rejects_refresh_token_of_another_user(self):
+        other = User.objects.create_user(email="other@example.com", password="strongpass123")
+        response = self.client.post(
+            "/api/auth/logout/", {"refresh": get_tokens_for_user(other)["refresh"]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_logout_with_expired_access_token_still_revokes_refresh_token(self):
+        expired = AccessToken.for_user(self.user)
+        expired.set_exp(lifetime=timedelta(seconds=-1))
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {expired}")
+
+        response = client.post("/api/auth/logout/", {"refresh": self.tokens["refresh"]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        refresh_response = APIClient().post("/api/auth/refresh/", {"refresh": self.tokens["refresh"]}, format="json")
+        self.assertEqual(refresh_response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_without_any_token_is_rejected(self):
+        self.assertEqual(APIClient().post("/api/auth/logout/", {}, format="json").status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unrevoked_token_check_skips_database_between_syncs(self):
+        self.client.get("/api/auth/me/")
+        with self.assertNumQueries(0):
+            self.assertFalse(revocation_list.is_revoked("never-revoked"))
+
+    @override_settings(TOKEN_REVOCATION_SYNC_SECONDS=0)
+    def test_other_process_catches_up_from_revocation_table(self):
+        other_process = RevocationList()
+        self.assertFalse(other_process.is_revoked("jti-1"))
+
+        revocation_list.revoke("jti-1", time.time() + 60)
+        cache.clear()
+        self.assertTrue(other_process.is_revoked("jti-1"))
+        self.assertTrue(RevocationList().is_revoked("jti-1"))
+        self.assertFalse(other_process.is_revoked("jti-2"))
+
+    def test_expired_revocations_are_purged(self):
+        RevokedToken.objects.create(jti="old", expires_at=datetime(2020, 1, 1, tzinfo=timezone.utc))
+        revocation_list.revoke("jti-1", time.time() + 60)
+        self.assertEqual(list(RevokedToken.objects.values_list("jti", flat=True)), ["jti-1"])
+
+    @override_settings(TOKEN_REVOCATION_SYNC_SECONDS=0)
+    def test_bloom_filter_is_rebuilt_without_expired_revocations(self):
+        revocations = RevocationList()
+        revocations.revoke("jti-1", time.time() + 60)
+        revocations.is_revoked("jti-1")
+        self.assertIn("jti-1", revocations._bloom)
+
+        RevokedToken.objects.filter(jti="jti-1").update(expires_at=datetime(2020, 1, 1, tzinfo=timezone.utc))
+        revocations.is_revoked("jti-2")
+        self.assertIn("jti-1", revocations._bloom)
+
+        with override_settings(TOKEN_REVOCATION_REBUILD_SECONDS=0):
+            revocations.is_revoked("jti-2")
+        self.assertNotIn("jti-1", revocations._bloom)
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        items = [f"jti-{index}" for index in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+        false_positives = sum(f"other-{index}" in bloom for index in range(1000))
+        self.assertLess(false_positives, 50)
+
+
 class ObservabilityMiddlewareTests(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -72,3 +248,119 @@ class ObservabilityMiddlewareTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertIn("X-Request-Id", response)
         self.assertIn("X-Response-Time-ms", response)
+
+    def test_metrics_endpoint_exposes_per_route_series(self):
+        self.client.post(
+            "/api/auth/register/",
+            {"email": "metrics@example.com", "password": "strongpass123"},
+            format="json",
+        )
+
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode("utf-8")
+        self.assertIn('setlive_http_requests_total{method="POST",route="auth-register",status="201"}', body)
+        self.assertIn('setlive_http_request_duration_seconds_bucket{le="0.01",method="POST",route="auth-register"}', body)
+        self.assertIn("setlive_http_requests_in_flight", body)
+
+    def test_server_timing_reports_db_serialize_and_total(self):
+        user = User.objects.create_user(email="timing@example.com", password="strongpass123")
+        self.client.force_authenticate(user=user)
+
+        response = self.client.get("/api/auth/me/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", serialize;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_repeated_query_shapes_are_detected(self):
+        accounting = QueryAccounting()
+        with connection.execute_wrapper(accounting):
+            for index in range(5):
+                list(User.objects.filter(id=index))
+            list(User.objects.filter(id__in=[1, 2, 3]))
+            list(User.objects.filter(id__in=[4, 5]))
+
+        self.assertEqual(accounting.count, 7)
+        repeated = accounting.repeated_shapes(3)
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual(repeated[0][1], 5)
+        self.assertEqual(accounting.repeated_shapes(1)[-1][1], 2)
+
+
+class StructuredLoggingTests(TestCase):
+    def test_json_lines_include_extra_fields_and_are_written_by_listener(self):
+        stream = io.StringIO()
+        handler = NonBlockingStreamHandler(stream=stream)
+        handler.setFormatter(JsonFormatter())
+        test_logger = logging.getLogger("setlive.tests.json")
+        test_logger.addHandler(handler)
+        test_logger.propagate = False
+        try:
+            test_logger.warning("request_warning", extra={"request_id": "abc", "route": "auth-me", "status_code": 404})
+        finally:
+            test_logger.removeHandler(handler)
+            handler.close()
+
+        line = json.loads(stream.getvalue().strip())
+        self.assertEqual(line["message"], "request_warning")
+        self.assertEqual(line["request_id"], "abc")
+        self.assertEqual(line["route"], "auth-me")
+        self.assertEqual(line["status_code"], 404)
+
+    def test_sampler_only_drops_request_ok_lines(self):
+        sampler = RequestOkSampler(rate=0)
+        ok_record = logging.makeLogRecord({"msg": "request_ok", "levelno": logging.INFO})
+        error_record = logging.makeLogRecord({"msg": "request_error", "levelno": logging.ERROR})
+
+        self.assertFalse(sampler.filter(ok_record))
+        self.assertTrue(sampler.filter(error_record))
+
+
+class HealthcheckTests(TestCase):
+    def test_reports_connection_reuse_mode(self):
+        response = APIClient().get("/healthz/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(response.data["database_connections"]["mode"], {"persistent", "per_request"})
+
+    def test_reports_pool_stats_when_pool_is_configured(self):
+        pool = mock.Mock(min_size=1, max_size=4)
+        pool.get_stats.return_value = {"pool_size": 2, "pool_available": 1, "requests_waiting": 0}
+
+        with mock.patch.object(type(connection), "pool", pool, create=True):
+            response = APIClient().get("/healthz/")
+
+        stats = response.data["database_connections"]
+        self.assertEqual(stats["mode"], "pool")
+        self.assertEqual((stats["size"], stats["available"], stats["max_size"]), (2, 1, 4))
+
+
+class FastJSONAndCompressionTests(TestCase):
+    def test_fast_renderer_matches_stdlib_renderer_bytes(self):
+        payload = {
+            "id": 1,
+            "name": "Repertório ✓",
+            "created_at": datetime(2026, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc),
+            "price": Decimal("1.50"),
+            "items": [{"position": 1, "song": None}],
+            7: "int key",
+        }
+        self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    @override_settings(COMPRESSION_MIN_BYTES=1)
+    def test_responses_are_compressed_when_client_accepts(self):
+        client = APIClient()
+        gzip_response = client.post(
+            "/api/auth/register/",
+            {"email": "gzip@example.com", "password": "strongpass123"},
+            format="json",
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+        self.assertEqual(gzip_response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", gzip_response["Vary"])
+        self.assertIn(b"gzip@example.com", gzip.decompress(gzip_response.content))
+
+        identity = client.post("/api/auth/login/", {"email": "gzip@example.com", "password": "strongpass123"}, format="json")
+        self.assertFalse(identity.has_header("Content-Encoding"))
+
+    def test_small_responses_are_sent_uncompressed(self):
+        response = APIClient().get("/healthz/", HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertFalse(response.has_header("Content-Encoding"))
@@ -1,10 +1,16 @@
 ﻿from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.views import TokenRefreshView
 
+from .authentication import CachedJWTAuthentication
+from .revocation import revoke_token
 from .serializers import (
     LoginSerializer,
+    LogoutSerializer,
+    RefreshSerializer,
     RegisterSerializer,
     UserSerializer,
     get_tokens_for_user,
@@ -50,11 +56,41 @@ class MeView(APIView):
 
 
 class LogoutView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
+    # An expired access token must not prevent revoking the refresh token, so
+    # authentication is optional here and either token is enough to log out.
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
 
     def post(self, request):
+        serializer = LogoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        refresh = serializer.validated_data.get('refresh')
+        access = _optional_access_token(request)
+        if refresh is None and access is None:
+            return Response({'detail': 'Token de acesso ou refresh token obrigatório.'}, status=status.HTTP_401_UNAUTHORIZED)
+        if refresh is not None and access is not None:
+            if str(refresh.get(api_settings.USER_ID_CLAIM)) != str(access.get(api_settings.USER_ID_CLAIM)):
+                return Response({'detail': 'Refresh token inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+        if refresh is not None:
+            revoke_token(refresh)
+        if access is not None:
+            revoke_token(access)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+def _optional_access_token(request):
+    authentication = CachedJWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        return None
+    try:
+        return authentication.get_validated_token(raw_token)
+    except (InvalidToken, TokenError):
+        return None
+
+
 class RefreshView(TokenRefreshView):
     permission_classes = [permissions.AllowAny]
+    serializer_class = RefreshSerializer
@@ -0,0 +1,153 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+_MAX_KEY_LENGTH = 255
+_UNSAFE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+# Rate-limit and in-flight answers say nothing about the outcome, so a retry must run again.
+_NOT_STORED_STATUSES = (status.HTTP_409_CONFLICT, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Requisicao com esta Idempotency-Key ainda em andamento."
+    default_code = "idempotency_conflict"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "Idempotency-Key ja usada com outra requisicao."
+    default_code = "idempotency_key_reused"
+
+
+class IdempotentReplay(Exception):
+    def __init__(self, stored):
+        super().__init__(stored["status"])
+        self.status_code = stored["status"]
+        self.data = stored["data"]
+
+
+class IdempotencyRecord:
+    """Claim on an Idempotency-Key for one request; `finish` stores its response for replays."""
+
+    def __init__(self, result_key, lock_key, fingerprint):
+        self.result_key = result_key
+        self.lock_key = lock_key
+        self.fingerprint = fingerprint
+
+    def _stored(self, status_code, data):
+        if status_code >= 500 or status_code in _NOT_STORED_STATUSES:
+            return None
+        return {"fingerprint": self.fingerprint, "status": status_code, "data": data}
+
+    def finish(self, status_code, data):
+        stored = self._stored(status_code, data)
+        if stored is not None:
+            cache.set(self.result_key, stored, timeout=settings.IDEMPOTENCY_TTL_SECONDS)
+        cache.delete(self.lock_key)
+
+    async def afinish(self, status_code, data):
+        stored = self._stored(status_code, data)
+        if stored is not None:
+            await cache.aset(self.result_key, stored, timeout=settings.IDEMPOTENCY_TTL_SECONDS)
+        await cache.adelete(self.lock_key)
+
+    def release(self):
+        cache.delete(self.lock_key)
+
+    async def arelease(self):
+        await cache.adelete(self.lock_key)
+
+
+def _prepare(request, scope):
+    key = request.headers.get(IDEMPOTENCY_HEADER, "").strip()
+    if not key or request.method not in _UNSAFE_METHODS:
+        return None
+    if len(key) > _MAX_KEY_LENGTH:
+        raise ParseError(f"{IDEMPOTENCY_HEADER} deve ter no maximo {_MAX_KEY_LENGTH} caracteres.")
+
+    digest = hashlib.sha256(f"{scope}\0{key}".encode()).hexdigest()
+    fingerprint = hashlib.sha256(f"{request.method} {request.path}\0".encode())
+    if request.content_type.startswith("multipart/"):
+        _update_with_form(fingerprint, request)
+    else:
+        fingerprint.update(request.body)
+    return IdempotencyRecord(f"idem:{digest}", f"idem:{digest}:lock", fingerprint.hexdigest())
+
+
+def _update_with_form(fingerprint, request):
+    # Multipart bodies are hashed from the parsed form, reading uploads in
+    # chunks (from disk when large) rather than buffering the raw body again.
+    for name, values in sorted(request.POST.lists()):
+        for value in values:
+            fingerprint.update(f"field\0{name}\0{len(value)}\0{value}\0".encode())
+    for name, uploads in sorted(request.FILES.lists()):
+        for upload in uploads:
+            fingerprint.update(f"file\0{name}\0{upload.name}\0{upload.size}\0".encode())
+            for chunk in upload.chunks():
+                fingerprint.update(chunk)
+            upload.seek(0)
+
+
+def _check_stored(record, stored):
+    if stored is None:
+        return
+    if stored["fingerprint"] != record.fingerprint:
+        raise IdempotencyKeyReused()
+    raise IdempotentReplay(stored)
+
+
+def begin_idempotent_request(request, scope):
+    """Returns None without a key; raises IdempotentReplay for a stored response."""
+    record = _prepare(request, scope)
+    if record is None:
+        return None
+    _check_stored(record, cache.get(record.result_key))
+    if not cache.add(record.lock_key, 1, timeout=settings.IDEMPOTENCY_LOCK_SECONDS):
+        raise IdempotencyConflict()
+    return record
+
+
+async def abegin_idempotent_request(request, scope):
+    record = _prepare(request, scope)
+    if record is None:
+        return None
+    _check_stored(record, await cache.aget(record.result_key))
+    if not await cache.aadd(record.lock_key, 1, timeout=settings.IDEMPOTENCY_LOCK_SECONDS):
+        raise IdempotencyConflict()
+    return record
+
+
+class IdempotentAPIViewMixin:
+    """Honours an Idempotency-Key header on unsafe methods, scoped to the authenticated user."""
+
+    def initial(self, request, *args, **kwargs):
+        self.idempotency_record = None
+        super().initial(request, *args, **kwargs)
+        self.idempotency_record = begin_idempotent_request(request, f"user:{request.user.pk}")
+
+    def handle_exception(self, exc):
+        if isinstance(exc, IdempotentReplay):
+            return Response(exc.data, status=exc.status_code, headers={REPLAYED_HEADER: "true"})
+        try:
+            return super().handle_exception(exc)
+        except Exception:
+            # Unhandled errors become a 500: let the client's retry run again.
+            record = getattr(self, "idempotency_record", None)
+            if record is not None:
+                self.idempotency_record = None
+                record.release()
+            raise
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        record = getattr(self, "idempotency_record", None)
+        if record is not None:
+            self.idempotency_record = None
+            record.finish(response.status_code, getattr(response, "data", None))
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,67 @@
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including the `extra` fields passed by callers."""
+
+    def format(self, record):
+        payload = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class RequestOkSampler(logging.Filter):
+    """Keep only a fraction of `request_ok` lines; warnings and errors always pass."""
+
+    def __init__(self, rate=None):
+        super().__init__()
+        self.rate = float(os.getenv("LOG_REQUEST_OK_SAMPLE_RATE", "1") if rate is None else rate)
+
+    def filter(self, record):
+        if record.msg != "request_ok" or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class NonBlockingStreamHandler(QueueHandler):
+    """Format on the calling thread, write to the stream from a background listener thread."""
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.dropped = 0
+        target = logging.StreamHandler(stream or sys.stderr)
+        self.listener = QueueListener(self.queue, target, respect_handler_level=False)
+        self.listener.start()
+        self._listening = True
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block a request thread on a slow stdout; drop instead.
+            self.dropped += 1
+
+    def close(self):
+        # logging.shutdown() closes handlers at exit, which flushes queued records.
+        if self._listening:
+            self._listening = False
+            self.listener.stop()
+        super().close()
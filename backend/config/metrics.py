@@ -0,0 +1,55 @@
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_DURATION = Histogram(
+    "setlive_http_request_duration_seconds",
+    "Request latency by route (URL name).",
+    ["route", "method"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_TOTAL = Counter(
+    "setlive_http_requests_total",
+    "Requests by route, method and status code.",
+    ["route", "method", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "setlive_http_requests_in_flight",
+    "Requests currently being handled.",
+    multiprocess_mode="livesum",
+)
+
+
+def route_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or match.route or "unnamed"
+
+
+def observe_request(request, status_code, elapsed_seconds):
+    route = route_name(request)
+    REQUEST_DURATION.labels(route=route, method=request.method).observe(elapsed_seconds)
+    REQUESTS_TOTAL.labels(route=route, method=request.method, status=str(status_code)).inc()
+
+
+def render_latest():
+    # Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR;
+    # aggregate them so any worker can answer the scrape.
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,34 +1,126 @@
+import gzip
 import logging
+import re
 import time
 import uuid
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.utils.cache import patch_vary_headers
+
+from config.metrics import REQUESTS_IN_FLIGHT, observe_request, route_name
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional, gzip is always available
+    brotli = None
 
 
 logger = logging.getLogger("setlive.request")
 
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*%s\s*,)*\s*%s\s*\)")
+
+
+def _sql_shape(sql):
+    return _PLACEHOLDER_LIST.sub("(...)", sql)
+
+
+class QueryAccounting:
+    """`connection.execute_wrapper` that counts queries, DB time and repeated SQL shapes."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started_at
+            self.count += 1
+            self.shapes[_sql_shape(sql)] += 1
+
+    def repeated_shapes(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+
+def _push_execute_wrapper(wrapper):
+    connection.execute_wrappers.append(wrapper)
+
+
+def _pop_execute_wrapper(wrapper):
+    connection.execute_wrappers.remove(wrapper)
+
 
 class RequestObservabilityMiddleware:
     """Attach basic request metrics and structured request logs."""
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
         started_at = time.perf_counter()
+        accounting = QueryAccounting()
+        request._render_ms = 0.0
+        with REQUESTS_IN_FLIGHT.track_inprogress(), connection.execute_wrapper(accounting):
+            response = self.get_response(request)
+        return self._finish(request, response, started_at, accounting)
+
+    async def __acall__(self, request):
+        started_at = time.perf_counter()
+        accounting = QueryAccounting()
+        request._render_ms = 0.0
+        # Connections are per thread: under ASGI the ORM runs in the request's
+        # thread-sensitive executor, so the wrapper has to be installed there.
+        await sync_to_async(_push_execute_wrapper)(accounting)
+        try:
+            with REQUESTS_IN_FLIGHT.track_inprogress():
+                response = await self.get_response(request)
+        finally:
+            await sync_to_async(_pop_execute_wrapper)(accounting)
+        return self._finish(request, response, started_at, accounting)
+
+    def _finish(self, request, response, started_at, accounting):
         request_id = request.headers.get("X-Request-Id", str(uuid.uuid4()))
-        response = self.get_response(request)
         elapsed_ms = (time.perf_counter() - started_at) * 1000
+        observe_request(request, response.status_code, elapsed_ms / 1000)
+        db_ms = accounting.duration * 1000
 
         response["X-Request-Id"] = request_id
         response["X-Response-Time-ms"] = f"{elapsed_ms:.2f}"
+        response["Server-Timing"] = (
+            f'db;dur={db_ms:.2f};desc="{accounting.count} queries", '
+            f"serialize;dur={request._render_ms:.2f}, "
+            f"total;dur={elapsed_ms:.2f}"
+        )
 
         extra = {
             "request_id": request_id,
             "method": request.method,
+            "route": route_name(request),
             "path": request.get_full_path(),
             "status_code": response.status_code,
             "duration_ms": round(elapsed_ms, 2),
+            "db_queries": accounting.count,
+            "db_ms": round(db_ms, 2),
         }
 
+        for shape, count in accounting.repeated_shapes(settings.QUERY_REPEAT_WARNING_THRESHOLD):
+            logger.warning("repeated_query", extra={**extra, "query_shape": shape, "query_repeats": count})
+
         if response.status_code >= 500:
             logger.error("request_error", extra=extra)
         elif response.status_code >= 400:
@@ -37,3 +129,83 @@ class RequestObservabilityMiddleware:
             logger.info("request_ok", extra=extra)
 
         return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that step.
+        render_started_at = time.perf_counter()
+
+        def record_render_time(rendered_response):
+            request._render_ms = (time.perf_counter() - render_started_at) * 1000
+
+        response.add_post_render_callback(record_render_time)
+        return response
+
+
+_COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def _accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class ResponseCompressionMiddleware:
+    """Brotli/gzip for API responses above settings.COMPRESSION_MIN_BYTES, negotiated via Accept-Encoding."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self._compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._compress(request, await self.get_response(request))
+
+    def _compress(self, request, response):
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        if not response.get("Content-Type", "").startswith(_COMPRESSIBLE_TYPES):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return response
+
+        accepted = _accepted_encodings(request)
+        if brotli is not None and "br" in accepted:
+            encoding, compressed = "br", brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+        elif "gzip" in accepted:
+            encoding, compressed = "gzip", gzip.compress(response.content, compresslevel=settings.COMPRESSION_GZIP_LEVEL)
+        else:
+            return response
+
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            # The bytes differ per encoding, so a strong validator must become weak.
+            response["ETag"] = "W/" + etag
+        return response
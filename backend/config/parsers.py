@@ -0,0 +1,26 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional, stdlib json is the fallback
+    orjson = None
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser backed by orjson when installed."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            raw = stream.read() if stream is not None else b""
+            if encoding.lower().replace("-", "") != "utf8":
+                raw = raw.decode(encoding).encode("utf-8")
+            return orjson.loads(raw)
+        except (ValueError, UnicodeError) as exc:
+            raise ParseError(f"JSON parse error - {exc}") from exc
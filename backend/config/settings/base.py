@@ -2,6 +2,7 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from corsheaders.defaults import default_headers as default_cors_headers
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -30,6 +31,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'config.middleware.ResponseCompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'config.middleware.RequestObservabilityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -59,6 +61,16 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+# Connection reuse: DB_POOL=true uses psycopg's pool (Django 5.1 OPTIONS["pool"]);
+# otherwise connections persist for DB_CONN_MAX_AGE seconds with health checks.
+# DB_PGBOUNCER_TRANSACTION_MODE=true drops features that break behind PgBouncer
+# in transaction mode (server-side cursors and prepared statements).
+# Under APP_SERVER=asgi sync views run on executor threads that each keep their
+# own connection, so persistent connections are disabled there: use DB_POOL=true.
+DB_POOL = os.getenv('DB_POOL', 'False').lower() == 'true'
+DB_PGBOUNCER_TRANSACTION_MODE = os.getenv('DB_PGBOUNCER_TRANSACTION_MODE', 'False').lower() == 'true'
+APP_SERVER = os.getenv('APP_SERVER', 'wsgi').lower()
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -67,9 +79,40 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', 'root'),
         'HOST': os.getenv('DB_HOST', '127.0.0.1'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        'CONN_MAX_AGE': 0 if DB_POOL or APP_SERVER == 'asgi' else int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER_TRANSACTION_MODE,
+        'OPTIONS': {},
     }
 }
 
+if DB_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '1')),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '4')),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+    }
+
+if DB_PGBOUNCER_TRANSACTION_MODE:
+    DATABASES['default']['OPTIONS']['prepare_threshold'] = None
+
+# Auth, idempotency, rate-limit and stage-snapshot state sits on hot paths and
+# must be visible to every worker: Redis when REDIS_URL is set (required by
+# prod.py). Without it the cache is process-local, which only suits a single
+# process such as runserver or the test runner.
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'setlive',
+        }
+    }
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -90,40 +133,72 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'config.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'config.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
+AUTH_USER_CACHE_SECONDS = int(os.getenv('AUTH_USER_CACHE_SECONDS', '60'))
+TOKEN_REVOCATION_SYNC_SECONDS = float(os.getenv('TOKEN_REVOCATION_SYNC_SECONDS', '5'))
+TOKEN_REVOCATION_BLOOM_CAPACITY = int(os.getenv('TOKEN_REVOCATION_BLOOM_CAPACITY', '100000'))
+TOKEN_REVOCATION_BLOOM_ERROR_RATE = float(os.getenv('TOKEN_REVOCATION_BLOOM_ERROR_RATE', '0.001'))
+TOKEN_REVOCATION_REBUILD_SECONDS = float(os.getenv('TOKEN_REVOCATION_REBUILD_SECONDS', '3600'))
 
 raw_cors = os.getenv('CORS_ALLOWED_ORIGINS', '')
 CORS_ALLOWED_ORIGINS = [origin.strip() for origin in raw_cors.split(',') if origin.strip()]
+CORS_ALLOW_HEADERS = (*default_cors_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
 FRONTEND_PUBLIC_URL = os.getenv('FRONTEND_PUBLIC_URL', '').rstrip('/')
+AUDIENCE_COOKIE_NAME = os.getenv('AUDIENCE_COOKIE_NAME', 'setlive_audience')
+AUDIENCE_COOKIE_MAX_AGE = int(os.getenv('AUDIENCE_COOKIE_MAX_AGE', str(60 * 60 * 24 * 30)))
+QUERY_REPEAT_WARNING_THRESHOLD = int(os.getenv('QUERY_REPEAT_WARNING_THRESHOLD', '10'))
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '3600'))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '30'))
+STAGE_SNAPSHOT_CACHE_SECONDS = int(os.getenv('STAGE_SNAPSHOT_CACHE_SECONDS', str(60 * 60 * 24 * 7)))
 
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
     "formatters": {
-        "standard": {
-            "format": "%(asctime)s %(levelname)s %(name)s %(message)s",
+        "json": {
+            "()": "config.log.JsonFormatter",
+        },
+    },
+    "filters": {
+        "sample_request_ok": {
+            "()": "config.log.RequestOkSampler",
         },
     },
     "handlers": {
         "console": {
-            "class": "logging.StreamHandler",
-            "formatter": "standard",
+            "()": "config.log.NonBlockingStreamHandler",
+            "formatter": "json",
         },
     },
     "loggers": {
         "setlive.request": {
             "handlers": ["console"],
+            "filters": ["sample_request_ok"],
             "level": os.getenv("LOG_LEVEL", "INFO"),
             "propagate": False,
         },
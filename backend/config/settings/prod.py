@@ -1,6 +1,8 @@
 from .base import *
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 DEBUG = False
 
 SECURE_SSL_REDIRECT = os.getenv("SECURE_SSL_REDIRECT", "False").lower() == "true"
@@ -12,3 +14,7 @@ CSRF_TRUSTED_ORIGINS = [origin.strip() for origin in raw_csrf_origins.split(",")
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 USE_X_FORWARDED_HOST = True
 
+
+# Workers must share auth, idempotency and rate-limit state (see base.py).
+if not REDIS_URL:
+    raise ImproperlyConfigured("REDIS_URL is required in production.")
@@ -1,10 +1,11 @@
 from django.contrib import admin
 from django.urls import include, path
 
-from config.views import HealthcheckView
+from config.views import HealthcheckView, MetricsView
 
 urlpatterns = [
     path('healthz/', HealthcheckView.as_view(), name='healthz'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('admin/', admin.site.urls),
     path('api/auth/', include('apps.users.urls')),
     path('api/repertoire/', include('apps.repertoire.urls')),
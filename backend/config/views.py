@@ -1,9 +1,33 @@
+import os
+
 from django.db import connection
+from django.http import HttpResponse
 from django.utils.timezone import now
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from apps.spotify.client import breaker as spotify_breaker
+from config.metrics import render_latest
+
+
+def _database_connection_stats():
+    pool = getattr(connection, "pool", None)
+    if pool is None:
+        conn_max_age = connection.settings_dict.get("CONN_MAX_AGE") or 0
+        return {"mode": "persistent" if conn_max_age else "per_request", "conn_max_age": conn_max_age}
+
+    stats = pool.get_stats()
+    return {
+        "mode": "pool",
+        "min_size": pool.min_size,
+        "max_size": pool.max_size,
+        "size": stats.get("pool_size", 0),
+        "available": stats.get("pool_available", 0),
+        "requests_waiting": stats.get("requests_waiting", 0),
+        "requests_errors": stats.get("requests_errors", 0),
+    }
+
 
 class HealthcheckView(APIView):
     authentication_classes = []
@@ -20,6 +44,21 @@ class HealthcheckView(APIView):
         payload = {
             "status": "ok" if db_ok else "degraded",
             "database": "ok" if db_ok else "unreachable",
+            "database_connections": _database_connection_stats(),
+            "spotify": spotify_breaker.snapshot(),
             "timestamp": now().isoformat(),
         }
         return Response(payload, status=status.HTTP_200_OK if db_ok else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class MetricsView(APIView):
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        token = os.getenv("METRICS_TOKEN", "")
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            return Response({"detail": "Nao autorizado."}, status=status.HTTP_401_UNAUTHORIZED)
+
+        payload, content_type = render_latest()
+        return HttpResponse(payload, content_type=content_type)
@@ -31,5 +31,19 @@ PY
 python manage.py migrate --noinput
 python manage.py collectstatic --noinput
 
+# Per-worker metric files are aggregated by /metrics; start each boot clean.
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/setlive-metrics}"
+rm -rf "${PROMETHEUS_MULTIPROC_DIR}"
+mkdir -p "${PROMETHEUS_MULTIPROC_DIR}"
+
 APP_PORT="${PORT:-8000}"
+if [ "${APP_SERVER:-wsgi}" = "asgi" ]; then
+  # Event-loop workers: the async audience endpoints take the gig-night fan-in,
+  # sync DRF views still run on each worker's thread executor. Settings turn off
+  # persistent connections in this mode; set DB_POOL=true to reuse them.
+  if [ "$(printf %s "${DB_POOL:-false}" | tr "[:upper:]" "[:lower:]")" != "true" ]; then
+    echo "APP_SERVER=asgi without DB_POOL=true: opening one database connection per request."
+  fi
+  exec gunicorn config.asgi:application --worker-class uvicorn_worker.UvicornWorker --bind "0.0.0.0:${APP_PORT}" --workers "${GUNICORN_WORKERS:-2}" --timeout "${GUNICORN_TIMEOUT:-60}"
+fi
 exec gunicorn config.wsgi:application --bind "0.0.0.0:${APP_PORT}" --workers "${GUNICORN_WORKERS:-2}" --timeout "${GUNICORN_TIMEOUT:-60}"
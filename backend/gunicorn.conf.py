@@ -0,0 +1,9 @@
+import os
+
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    # Drop live gauges (in-flight requests) of workers that are gone.
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
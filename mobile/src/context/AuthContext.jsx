@@ -1,5 +1,5 @@
 import { createContext, useContext, useEffect, useMemo, useState } from 'react';
-import { login, me, register } from '../services/authApi';
+import { login, logout as revokeTokens, me, register } from '../services/authApi';
 import { clearTokens, readTokens, saveTokens } from '../services/tokenStorage';
 
 const AuthContext = createContext(null);
@@ -65,6 +65,11 @@ export function AuthProvider({ children }) {
   }
 
   function logout() {
+    const saved = readTokens();
+    if (saved) {
+      // Best effort: the local session ends even if the server is unreachable.
+      revokeTokens(saved).catch(() => {});
+    }
     clearTokens();
     setIsAuthenticated(false);
   }
@@ -7,12 +7,15 @@ import {
   createSong,
   deleteSetlist,
   deleteSetlistItem,
+  getBootstrap,
   getSetlist,
   getSetlistAudienceLink,
+  getStageSnapshot,
   listSetlistAudienceRequests,
   listSetlists,
   listSongs,
   reorderSetlist,
+  replayMutations,
   updateSong,
   updateSetlist,
 } from '../services/setlistApi';
@@ -26,8 +29,10 @@ import {
 import {
   loadOfflineSnapshot,
   loadPendingMutations,
+  loadStageSnapshot,
   saveOfflineSnapshot,
   savePendingMutations,
+  saveStageSnapshot,
 } from '../services/offlineStorage';
 import {
   filterSongsNotInSetlist,
@@ -47,9 +52,22 @@ function toCifraSlug(value) {
     .replace(/-+/g, '-');
 }
 
-function isNetworkError(error) {
-  const message = String(error?.message ?? '').toLowerCase();
-  return message.includes('failed to fetch') || message.includes('network') || message.includes('offline');
+const MAX_REPLAY_BATCH = 500;
+
+// Indexes of the mutations a 400 from the replay endpoint names as invalid.
+function rejectedMutationIndexes(body) {
+  const errors = body?.mutations;
+  if (Array.isArray(errors)) {
+    return errors.flatMap((entry, index) =>
+      entry && typeof entry === 'object' && Object.keys(entry).length > 0 ? [index] : []
+    );
+  }
+  if (errors && typeof errors === 'object') {
+    return Object.keys(errors)
+      .map(Number)
+      .filter((index) => Number.isInteger(index));
+  }
+  return [];
 }
 
 function createTempId() {
@@ -88,6 +106,7 @@ function HomePage() {
   const [queueConnectionStatus, setQueueConnectionStatus] = useState('polling');
   const [isStageMode, setIsStageMode] = useState(false);
   const [stageItemIndex, setStageItemIndex] = useState(0);
+  const [stageSnapshot, setStageSnapshot] = useState(null);
   const [isOnline, setIsOnline] = useState(() => window.navigator.onLine);
   const [isSyncingPending, setIsSyncingPending] = useState(false);
   const [pendingMutations, setPendingMutations] = useState(() => loadPendingMutations());
@@ -100,7 +119,7 @@ function HomePage() {
   const [expandedSetItemId, setExpandedSetItemId] = useState(null);
 
   const activeSetlistId = activeSetlist?.id ?? null;
-  const stageItems = activeSetlist?.items ?? [];
+  const stageItems = activeSetlist?.items?.length ? activeSetlist.items : stageSnapshot?.items ?? [];
   const currentStageItem = stageItems[stageItemIndex] ?? null;
   const spotifyRedirectUri = SPOTIFY_REDIRECT_URI || `${window.location.origin}/callback`;
   const pendingCount = pendingMutations.length;
@@ -123,11 +142,6 @@ function HomePage() {
     return `https://quickchart.io/qr?text=${encoded}&size=260&margin=1`;
   }, [audiencePublicUrl]);
 
-  function persistPendingMutations(nextPending) {
-    setPendingMutations(nextPending);
-    savePendingMutations(nextPending);
-  }
-
   function queueMutation(type, payload) {
     setPendingMutations((current) => {
       const nextPending = [
@@ -165,11 +179,12 @@ function HomePage() {
 
         await handleSpotifyCallback();
 
-        const [songsPayload, loadedSetlists, status] = await Promise.all([
-          listSongs({ search: '', page: 1, pageSize: songsPageSize }),
-          listSetlists(),
-          getSpotifyStatus(),
-        ]);
+        const {
+          songs: songsPayload,
+          setlists: loadedSetlists,
+          spotify: status,
+          active_setlist: firstDetail,
+        } = await getBootstrap({ setlistId: loadOfflineSnapshot()?.activeSetlistId, pageSize: songsPageSize });
 
         setSongs(songsPayload.items ?? []);
         setSongsTotal(songsPayload.total ?? (songsPayload.items ?? []).length);
@@ -179,21 +194,30 @@ function HomePage() {
         setSetlists(loadedSetlists);
         setSpotifyStatus(status);
 
-        if (loadedSetlists.length > 0) {
-          const detailEntries = await Promise.all(
-            loadedSetlists.map(async (setlist) => [setlist.id, await getSetlist(setlist.id)])
-          );
-          const detailById = Object.fromEntries(detailEntries);
-          const firstDetail = detailById[loadedSetlists[0].id];
+        if (firstDetail) {
           setActiveSetlist(firstDetail);
           setEditSetlistName(firstDetail.name);
           saveOfflineSnapshot({
             songs: songsPayload.items ?? [],
             setlists: loadedSetlists,
             activeSetlistId: firstDetail.id,
-            setlistDetailsById: detailById,
+            setlistDetailsById: { [firstDetail.id]: firstDetail },
             updatedAt: new Date().toISOString(),
           });
+          // The other setlists only matter offline; fetch them after the home screen is usable.
+          Promise.all(
+            loadedSetlists
+              .filter((setlist) => setlist.id !== firstDetail.id)
+              .map(async (setlist) => [setlist.id, await getSetlist(setlist.id)])
+          )
+            .then((detailEntries) => {
+              const snapshot = loadOfflineSnapshot();
+              saveOfflineSnapshot({
+                ...snapshot,
+                setlistDetailsById: { ...(snapshot?.setlistDetailsById ?? {}), ...Object.fromEntries(detailEntries) },
+              });
+            })
+            .catch(() => {});
         } else {
           setActiveSetlist(null);
           setEditSetlistName('');
@@ -409,6 +433,33 @@ function HomePage() {
     };
   }, [activeSetlistId, isOnline]);
 
+  useEffect(() => {
+    if (!activeSetlistId) {
+      setStageSnapshot(null);
+      return;
+    }
+    const stored = loadStageSnapshot(activeSetlistId);
+    setStageSnapshot(stored);
+    if (!isOnline) {
+      return;
+    }
+
+    let cancelled = false;
+    getStageSnapshot(activeSetlistId, stored?.digest)
+      .then((fresh) => {
+        if (fresh && !cancelled) {
+          saveStageSnapshot(activeSetlistId, fresh);
+          setStageSnapshot(fresh);
+        }
+      })
+      .catch(() => {
+        // Stage mode keeps the stored version until the next refresh.
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [activeSetlistId, activeSetlist?.updated_at, isOnline]);
+
   useEffect(() => {
     if (!isStageMode) {
       return;
@@ -545,106 +596,44 @@ function HomePage() {
     }
   }
 
-  async function applyPendingMutation(mutation, idMaps) {
-    const resolveId = (id, map) => {
-      if (id < 0 && map.has(id)) {
-        return map.get(id);
-      }
-      return id;
-    };
-
-    if (mutation.type === 'create_song') {
-      const { tempSongId, title, artist } = mutation.payload;
-      const created = await createSong({ title, artist });
-      idMaps.songId.set(tempSongId, created.id);
-      return;
-    }
-
-    if (mutation.type === 'create_setlist') {
-      const { tempSetlistId, name } = mutation.payload;
-      const created = await createSetlist({ name });
-      idMaps.setlistId.set(tempSetlistId, created.id);
-      return;
-    }
-
-    if (mutation.type === 'rename_setlist') {
-      const { setlistId, name } = mutation.payload;
-      const resolvedSetlistId = resolveId(setlistId, idMaps.setlistId);
-      if (resolvedSetlistId < 0) {
-        return;
-      }
-      await updateSetlist(resolvedSetlistId, { name });
-      return;
-    }
-
-    if (mutation.type === 'add_setlist_item') {
-      const { setlistId, songId, tempItemId } = mutation.payload;
-      const resolvedSetlistId = resolveId(setlistId, idMaps.setlistId);
-      const resolvedSongId = resolveId(songId, idMaps.songId);
-      if (resolvedSetlistId < 0 || resolvedSongId < 0) {
-        return;
-      }
-      const created = await addSetlistItem(resolvedSetlistId, resolvedSongId);
-      idMaps.itemId.set(tempItemId, created.id);
-      return;
-    }
-
-    if (mutation.type === 'delete_setlist_item') {
-      const { itemId } = mutation.payload;
-      const resolvedItemId = resolveId(itemId, idMaps.itemId);
-      if (resolvedItemId < 0) {
-        return;
-      }
-      await deleteSetlistItem(resolvedItemId);
-      return;
-    }
-
-    if (mutation.type === 'reorder_setlist') {
-      const { setlistId, itemIds } = mutation.payload;
-      const resolvedSetlistId = resolveId(setlistId, idMaps.setlistId);
-      if (resolvedSetlistId < 0) {
-        return;
-      }
-      const resolvedItemIds = itemIds.map((itemId) => resolveId(itemId, idMaps.itemId)).filter((itemId) => itemId > 0);
-      if (resolvedItemIds.length === 0) {
-        return;
-      }
-      await reorderSetlist(resolvedSetlistId, resolvedItemIds);
-    }
-  }
-
   async function flushPendingMutations() {
     if (!isOnline || pendingMutations.length === 0 || isSyncingPending) {
       return;
     }
 
     setIsSyncingPending(true);
-    let remaining = [...pendingMutations];
-    let hadProgress = false;
-
-    const idMaps = {
-      songId: new Map(),
-      setlistId: new Map(),
-      itemId: new Map(),
-    };
+    const batch = pendingMutations.slice(0, MAX_REPLAY_BATCH);
+    let settledIds = [];
+    let replayed = false;
 
-    while (remaining.length > 0) {
-      const current = remaining[0];
-      try {
-        await applyPendingMutation(current, idMaps);
-        remaining = remaining.slice(1);
-        hadProgress = true;
-      } catch (error) {
-        if (isNetworkError(error)) {
-          break;
-        }
-        remaining = remaining.slice(1);
+    try {
+      // One request for the whole queue; mutation ids make a retry after a dropped response safe.
+      await replayMutations(batch);
+      settledIds = batch.map((mutation) => mutation.id);
+      replayed = true;
+    } catch (error) {
+      // Network errors, 409 (replay in progress) and 5xx keep the whole queue for the
+      // next attempt; a 400 only drops the mutations it names as invalid.
+      if (error?.status === 400) {
+        settledIds = rejectedMutationIndexes(error.body)
+          .map((index) => batch[index]?.id)
+          .filter(Boolean);
+      }
+      if (settledIds.length > 0) {
+        setErrorMessage('Algumas alteracoes offline eram invalidas e foram descartadas.');
       }
     }
 
-    persistPendingMutations(remaining);
+    if (settledIds.length > 0) {
+      const settled = new Set(settledIds);
+      setPendingMutations((current) => {
+        const nextPending = current.filter((mutation) => !settled.has(mutation.id));
+        savePendingMutations(nextPending);
+        return nextPending;
+      });
+    }
 
-    if (hadProgress) {
+    if (replayed) {
       try {
         await Promise.all([refreshSongs(), refreshSetlists(activeSetlistId)]);
         setSuccessMessage('Alteracoes offline sincronizadas.');
@@ -66,3 +66,18 @@ export async function me(accessToken) {
     throw new Error('Sessao invalida.');
   }
 }
+
+export async function logout({ access, refresh }) {
+  const response = await fetch(`${AUTH_API_BASE_URL}/logout/`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Authorization: `Bearer ${access}`,
+    },
+    body: JSON.stringify({ refresh }),
+  });
+
+  if (!response.ok) {
+    throw new Error(await parseError(response, 'Falha ao sair.'));
+  }
+}
@@ -1,5 +1,7 @@
 const SNAPSHOT_KEY = 'setlive_offline_snapshot_v1';
 const PENDING_MUTATIONS_KEY = 'setlive_pending_mutations_v1';
+const BOOTSTRAP_KEY = 'setlive_bootstrap_v1';
+const STAGE_SNAPSHOTS_KEY = 'setlive_stage_snapshots_v1';
 
 function readJson(key, fallback) {
   try {
@@ -37,3 +39,19 @@ export function loadPendingMutations() {
 export function savePendingMutations(pending) {
   writeJson(PENDING_MUTATIONS_KEY, pending);
 }
+
+export function loadBootstrapCache() {
+  return readJson(BOOTSTRAP_KEY, null);
+}
+
+export function saveBootstrapCache(etag, payload) {
+  writeJson(BOOTSTRAP_KEY, { etag, payload });
+}
+
+export function loadStageSnapshot(setlistId) {
+  return readJson(STAGE_SNAPSHOTS_KEY, {})[setlistId] ?? null;
+}
+
+export function saveStageSnapshot(setlistId, snapshot) {
+  writeJson(STAGE_SNAPSHOTS_KEY, { ...readJson(STAGE_SNAPSHOTS_KEY, {}), [setlistId]: snapshot });
+}
@@ -1,4 +1,5 @@
 import { REPERTOIRE_API_BASE_URL } from '../config/api';
+import { loadBootstrapCache, saveBootstrapCache } from './offlineStorage';
 import { readTokens } from './tokenStorage';
 
 const audienceQueueCacheBySetlist = new Map();
@@ -12,30 +13,37 @@ function authHeaders() {
   };
 }
 
-async function parseError(response, fallback) {
+async function readErrorBody(response) {
   try {
-    const body = await response.json();
-    if (body?.detail) {
-      return body.detail;
-    }
+    return await response.json();
+  } catch {
+    return null;
+  }
+}
 
-    if (typeof body === 'object' && body !== null) {
-      const firstField = Object.keys(body)[0];
-      const firstValue = body[firstField];
-      if (Array.isArray(firstValue) && firstValue.length > 0) {
-        return String(firstValue[0]);
-      }
-      if (typeof firstValue === 'string') {
-        return firstValue;
-      }
+function errorDetail(body, fallback) {
+  if (body?.detail) {
+    return body.detail;
+  }
+
+  if (typeof body === 'object' && body !== null) {
+    const firstField = Object.keys(body)[0];
+    const firstValue = body[firstField];
+    if (Array.isArray(firstValue) && firstValue.length > 0) {
+      return String(firstValue[0]);
+    }
+    if (typeof firstValue === 'string') {
+      return firstValue;
     }
-  } catch {
-    // no-op
   }
 
   return fallback;
 }
 
+async function parseError(response, fallback) {
+  return errorDetail(await readErrorBody(response), fallback);
+}
+
 async function requestJson(url, options = {}, fallbackError = 'Erro na requisicao.') {
   const response = await fetch(url, {
     ...options,
@@ -46,7 +54,12 @@ async function requestJson(url, options = {}, fallbackError = 'Erro na requisica
   });
 
   if (!response.ok) {
-    throw new Error(await parseError(response, fallbackError));
+    // status and body let callers tell a rejected request from one worth retrying.
+    const body = await readErrorBody(response);
+    const error = new Error(errorDetail(body, fallbackError));
+    error.status = response.status;
+    error.body = body;
+    throw error;
   }
 
   if (response.status === 204) {
@@ -120,6 +133,33 @@ export function updateSong(songId, payload) {
   );
 }
 
+// operations: [{ op: 'create' | 'update' | 'delete', id?, data? }]; returns one result per operation.
+export function bulkSongOperations(operations) {
+  return requestJson(
+    `${REPERTOIRE_API_BASE_URL}/songs/bulk/`,
+    {
+      method: 'POST',
+      body: JSON.stringify({ operations }),
+    },
+    'Falha ao atualizar musicas em lote.'
+  );
+}
+
+export function listDuplicateSongs() {
+  return requestJson(`${REPERTOIRE_API_BASE_URL}/songs/duplicates/`, {}, 'Falha ao buscar musicas duplicadas.');
+}
+
+export function mergeSongs(targetId, sourceIds) {
+  return requestJson(
+    `${REPERTOIRE_API_BASE_URL}/songs/merge/`,
+    {
+      method: 'POST',
+      body: JSON.stringify({ target_id: targetId, source_ids: sourceIds }),
+    },
+    'Falha ao mesclar musicas.'
+  );
+}
+
 export function listSetlists() {
   return requestJson(`${REPERTOIRE_API_BASE_URL}/setlists/`, {}, 'Falha ao listar repertorios.');
 }
@@ -257,16 +297,138 @@ export function getPublicSetlist(token) {
   );
 }
 
-export function createPublicAudienceRequest(token, payload) {
-  return requestPublicJson(
-    `${REPERTOIRE_API_BASE_URL}/public/setlists/${token}/requests/`,
+function newIdempotencyKey() {
+  if (globalThis.crypto?.randomUUID) {
+    return globalThis.crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+const PUBLIC_REQUEST_NETWORK_RETRIES = 2;
+
+export async function createPublicAudienceRequest(token, payload) {
+  // The same key on every attempt lets the server replay a request that
+  // landed even though its response was lost, instead of creating it twice.
+  const idempotencyKey = newIdempotencyKey();
+  for (let attempt = 0; ; attempt += 1) {
+    try {
+      return await requestPublicJson(
+        `${REPERTOIRE_API_BASE_URL}/public/setlists/${token}/requests/`,
+        {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+            'Idempotency-Key': idempotencyKey,
+          },
+          body: JSON.stringify(payload),
+        },
+        'Falha ao enviar pedido.'
+      );
+    } catch (error) {
+      // fetch rejects with a TypeError only when no response arrived.
+      if (!(error instanceof TypeError) || attempt >= PUBLIC_REQUEST_NETWORK_RETRIES) {
+        throw error;
+      }
+    }
+  }
+}
+
+function expandStageSnapshot(digest, snapshot) {
+  const fields = snapshot.fields ?? [];
+  const items = (snapshot.items ?? []).map((row) => {
+    const record = Object.fromEntries(fields.map((field, index) => [field, row[index]]));
+    return {
+      id: record.item_id,
+      song: {
+        id: record.song_id,
+        title: record.title,
+        artist: record.artist,
+        chord_url: record.chord_url,
+        duration_ms: record.duration_ms,
+      },
+    };
+  });
+  return { digest, setlist: snapshot.setlist, items };
+}
+
+// Resolves to null when `knownDigest` is still current. Snapshot bodies are
+// immutable, so the browser cache serves any version fetched before.
+export async function getStageSnapshot(setlistId, knownDigest = '') {
+  const pointer = await requestJson(
+    `${REPERTOIRE_API_BASE_URL}/setlists/${setlistId}/stage/`,
+    {},
+    'Falha ao carregar modo palco.'
+  );
+  if (pointer.digest === knownDigest) {
+    return null;
+  }
+  const snapshot = await requestJson(
+    `${REPERTOIRE_API_BASE_URL}/setlists/${setlistId}/stage/${pointer.digest}/`,
+    {},
+    'Falha ao carregar modo palco.'
+  );
+  return expandStageSnapshot(pointer.digest, snapshot);
+}
+
+export function fetchSyncDelta(cursor = '') {
+  const params = new URLSearchParams();
+  if (cursor) {
+    params.set('since', cursor);
+  }
+  const query = params.toString();
+
+  return requestJson(
+    `${REPERTOIRE_API_BASE_URL}/sync/${query ? `?${query}` : ''}`,
+    {},
+    'Falha ao sincronizar repertorio.'
+  );
+}
+
+export function replayMutations(mutations) {
+  return requestJson(
+    `${REPERTOIRE_API_BASE_URL}/mutations/`,
     {
       method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify(payload),
+      body: JSON.stringify({
+        mutations: mutations.map(({ id, type, payload }) => ({ id, type, payload })),
+      }),
     },
-    'Falha ao enviar pedido.'
+    'Falha ao sincronizar alteracoes offline.'
   );
 }
+
+export async function getBootstrap({ setlistId = null, pageSize = 30 } = {}) {
+  const params = new URLSearchParams();
+  if (setlistId) {
+    params.set('setlist', String(setlistId));
+  }
+  params.set('page_size', String(pageSize));
+  const url = `${REPERTOIRE_API_BASE_URL}/bootstrap/?${params.toString()}`;
+  const cached = loadBootstrapCache();
+
+  const response = await fetch(url, {
+    headers: {
+      ...authHeaders(),
+      ...(cached?.etag ? { 'If-None-Match': cached.etag } : {}),
+    },
+  });
+
+  if (response.status === 304 && cached?.payload) {
+    return cached.payload;
+  }
+
+  if (!response.ok && response.status !== 304) {
+    throw new Error(await parseError(response, 'Falha ao carregar dados iniciais.'));
+  }
+
+  if (response.status === 304) {
+    return requestJson(url, {}, 'Falha ao carregar dados iniciais.');
+  }
+
+  const payload = await response.json();
+  const etag = response.headers.get('ETag');
+  if (etag) {
+    saveBootstrapCache(etag, payload);
+  }
+  return payload;
+}
@@ -2,6 +2,10 @@ import { API_ROOT } from '../config/api';
 import { readTokens } from './tokenStorage';
 
 const SPOTIFY_API_BASE = `${API_ROOT}/spotify`;
+const SEARCH_DEBOUNCE_MS = 300;
+const SEARCH_MAX_RETRIES = 2;
+
+let pendingSearch = null;
 
 function authHeaders() {
   const tokens = readTokens();
@@ -77,3 +81,58 @@ export function importSpotifyPlaylist(playlistId) {
     'Falha ao importar playlist do Spotify.'
   );
 }
+
+function wait(ms) {
+  return new Promise((resolve) => {
+    setTimeout(resolve, ms);
+  });
+}
+
+async function fetchSearch(query, attempt = 0) {
+  const params = new URLSearchParams({ q: query }).toString();
+  const response = await fetch(`${SPOTIFY_API_BASE}/search/?${params}`, { headers: authHeaders() });
+
+  // 429 means the same query is still being fetched: wait and ask again, the answer will be cached.
+  if (response.status === 429 && attempt < SEARCH_MAX_RETRIES) {
+    const retryAfter = Number(response.headers.get('Retry-After'));
+    await wait((retryAfter > 0 ? retryAfter : 1) * 1000);
+    return fetchSearch(query, attempt + 1);
+  }
+
+  if (!response.ok) {
+    throw new Error(await parseError(response, 'Falha ao buscar musicas no Spotify.'));
+  }
+
+  return response.json();
+}
+
+// Trailing debounce: only the last query typed within SEARCH_DEBOUNCE_MS is sent;
+// the promises of the superseded calls resolve to null.
+export function searchSpotifyTracks(query) {
+  if (pendingSearch) {
+    clearTimeout(pendingSearch.timer);
+    pendingSearch.resolve(null);
+  }
+
+  return new Promise((resolve, reject) => {
+    const search = { resolve };
+    search.timer = setTimeout(() => {
+      if (pendingSearch === search) {
+        pendingSearch = null;
+      }
+      fetchSearch(query).then(resolve, reject);
+    }, SEARCH_DEBOUNCE_MS);
+    pendingSearch = search;
+  });
+}
+
+export function addSpotifyTrack(spotifyTrackId) {
+  return requestJson(
+    `${SPOTIFY_API_BASE}/tracks/`,
+    {
+      method: 'POST',
+      body: JSON.stringify({ spotify_track_id: spotifyTrackId }),
+    },
+    'Falha ao adicionar musica do Spotify.'
+  );
+}